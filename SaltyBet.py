@@ -4,40 +4,200 @@ Salty Bet - A simple Python program for betting on fake wrestling matches.
 Each user starts with $1000 (WrestleBucks) and can bet on wrestling matches.
 """
 
+import heapq
 import json
+import numbers
 import os
+import random
+import sys
+import threading
+import weakref
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from contextlib import contextmanager
 from pathlib import Path
 
+from SaltyBetEvents import (EVENT_BAILOUT_GRANTED, EVENT_BALANCE_CHANGED,
+                            EVENT_BET_PLACED, EVENT_MATCH_OPENED,
+                            EVENT_MATCH_SETTLED, EVENT_USER_ADDED, EventBus)
+from SaltyBetHistory import MatchHistory
+from SaltyBetLeaderboard import BOARDS, LEADERBOARD_MIN_GAMES, Leaderboard
+from SaltyBetLedger import apply_change
+from SaltyBetPersistence import DURABILITY_MODES, DURABLE, SaveWorker
+from SaltyBetSearch import NameIndex
+from SaltyBetRatings import RatingModel
+from SaltyBetStorage import create_storage
+from SaltyBetWrestlers import WrestlerRegistry, canonical_name
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; settlement falls back to plain Python
+    np = None
+
+STARTING_WRESTLEBUCKS = 1000
+PAYOUT_MULTIPLIER = 2  # Winning bets pay back double the bet amount
+BAILOUT_MIN = 10  # Bankrupt users get a random bailout in this range
+BAILOUT_MAX = 1000
+MAX_BET = 2**63 - 1  # Bet books keep amounts in int64 columns
+# Bet books at least this large are settled with NumPy when it is available
+VECTORIZE_THRESHOLD = 1000
+
+# Number of wrestlers/teams in each match type
+MATCH_TYPES = {
+    "One on One": 2,
+    "Triple Threat": 3,
+    "Fatal 4 Way": 4,
+    "Five Way": 5,
+    "Six Way": 6,
+    "Seven Way": 7,
+    "Eight Way": 8
+}
+
+# Columns get_users_page() can sort users by
+USER_COLUMNS = ('name', 'wrestlebucks', 'wins', 'losses', 'win_rate')
+
+# Fields of a user each kind of change touches (see EVENT_BALANCE_CHANGED events)
+CHANGED_FIELDS = {
+    'bet': ('wrestlebucks', ),
+    'win': ('wrestlebucks', 'wins'),
+    'loss': ('losses', ),
+    'refund': ('wrestlebucks', ),
+    'bailout': ('wrestlebucks', )
+}
+
+
+class LockStripes:
+    """A fixed set of reentrant locks shared out among user names by hash.
+
+    Users on different stripes never wait for each other, and memory stays
+    constant however many users there are. Code that needs several stripes
+    takes them through holding(), which always locks in index order so two
+    threads can never deadlock.
+    """
+
+    def __init__(self, count=64):
+        self.locks = [threading.RLock() for _ in range(count)]
+
+    def lock_for(self, name):
+        """Get the lock guarding one user's balance and record."""
+        return self.locks[hash(name) % len(self.locks)]
+
+    def holding(self, names=None):
+        """Context manager that holds the stripes for `names` (all when None)."""
+        count = len(self.locks)
+        if names is None or len(names) >= count:
+            indexes = range(count)
+        else:
+            indexes = sorted({hash(name) % count for name in names})
+        return _HeldStripes([self.locks[i] for i in indexes])
+
+
+class _HeldStripes:
+    """Acquires a list of locks in order and releases them in reverse."""
+
+    __slots__ = ('locks', )
+
+    def __init__(self, locks):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        for lock in reversed(self.locks):
+            lock.release()
+
+
+# Guards every balance check-and-update; shared by all SaltyBet instances
+USER_LOCKS = LockStripes()
+
 
 class User:
     """Represents a user in the Salty Bet system."""
 
+    # __weakref__ lets StoredUsers find evicted users that are still in use
+    __slots__ = ('name', 'wrestlebucks', 'wins', 'losses', 'observer', '__weakref__')
+
     def __init__(self, name):
         self.name = name
-        self.wrestlebucks = 1000  # Starting amount
+        self.wrestlebucks = STARTING_WRESTLEBUCKS
         self.wins = 0
         self.losses = 0
+        self.observer = None  # Called as observer(user, op, amount) on changes
+
+    def _record(self, op, amount=None):
+        """Notify the observer (if any) about a change to this user."""
+        if self.observer is not None:
+            self.observer(self, op, amount)
 
     def place_bet(self, amount):
-        """Place a bet and deduct from WrestleBucks."""
-        if amount > self.wrestlebucks:
-            return False, "Insufficient WrestleBucks!"
+        """Place a bet and deduct from WrestleBucks.
+
+        The balance check and the debit happen under the user's lock, so two
+        threads can never both spend the same WrestleBucks.
+        """
         if amount <= 0:
             return False, "Bet amount must be positive!"
-
-        self.wrestlebucks -= amount
+        with USER_LOCKS.lock_for(self.name):
+            if amount > self.wrestlebucks:
+                return False, "Insufficient WrestleBucks!"
+            self.wrestlebucks -= amount
+            self._record('bet', amount)
         return True, f"Bet of {amount} WrestleBucks placed!"
 
-    def win_bet(self, amount):
-        """Process a winning bet (double the bet amount)."""
-        winnings = amount * 2
-        self.wrestlebucks += winnings
-        self.wins += 1
+    def win_bet(self, amount, payout=None):
+        """Process a winning bet (double the bet amount unless a payout is given)."""
+        winnings = amount * PAYOUT_MULTIPLIER if payout is None else payout
+        with USER_LOCKS.lock_for(self.name):
+            self.wrestlebucks += winnings
+            self.wins += 1
+            self._record('win', winnings)
         return winnings
 
     def lose_bet(self):
         """Process a losing bet (no payout)."""
-        self.losses += 1
+        with USER_LOCKS.lock_for(self.name):
+            self.losses += 1
+            self._record('loss')
+
+    def refund_bet(self, amount):
+        """Give a bet back without counting it as a win or a loss."""
+        with USER_LOCKS.lock_for(self.name):
+            self.wrestlebucks += amount
+            self._record('refund', amount)
+
+    def receive_bailout(self, amount):
+        """Give a broke user free WrestleBucks to keep them in the game."""
+        with USER_LOCKS.lock_for(self.name):
+            self.wrestlebucks += amount
+            self._record('bailout', amount)
+
+    def bail_out_if_broke(self, rng=random):
+        """Atomically check for bankruptcy and hand out a bailout.
+
+        Returns the bailout amount, or 0 if the user still has WrestleBucks.
+        """
+        with USER_LOCKS.lock_for(self.name):
+            if self.wrestlebucks > 0:
+                return 0
+            bailout = draw_bailout(rng)
+            self.receive_bailout(bailout)
+        return bailout
+
+    def apply_settlement(self, won, payout, bailout=0):
+        """Apply a payout and bailout that were already computed in a batch."""
+        with USER_LOCKS.lock_for(self.name):
+            if won:
+                self.wrestlebucks += payout
+                self.wins += 1
+                self._record('win', payout)
+            else:
+                self.lose_bet()
+            if bailout:
+                self.receive_bailout(bailout)
 
     def get_stats(self):
         """Get user statistics."""
@@ -70,13 +230,584 @@ class User:
         return user
 
 
+def draw_bailout(rng=random):
+    """Draw the random WrestleBucks handed to a bankrupt user."""
+    return rng.randint(BAILOUT_MIN, BAILOUT_MAX)
+
+
+def settle_arrays(amounts, won, balances, rng, payouts=None):
+    """Settle a batch of bets held in NumPy arrays.
+
+    `balances` are the bettors' balances after their bets were taken. Unless
+    `payouts` are given (e.g. by parimutuel_payouts) winners get the fixed
+    payout. Returns (payouts, new_balances, bailouts) arrays, applying the
+    same rules as User.win_bet/lose_bet and draw_bailout.
+    """
+    if payouts is None:
+        payouts = np.where(won, amounts * PAYOUT_MULTIPLIER, 0)
+    new_balances = balances + payouts
+    broke = new_balances <= 0
+    bailouts = np.zeros_like(new_balances)
+    bailouts[broke] = rng.integers(BAILOUT_MIN,
+                                   BAILOUT_MAX + 1,
+                                   size=int(np.count_nonzero(broke)))
+    new_balances += bailouts
+    return payouts, new_balances, bailouts
+
+
+def parimutuel_payouts(amounts, won, total_pool):
+    """Split the whole pool among winning bets in proportion to their amounts.
+
+    Uses exact integer arithmetic: every winner gets the floor of their share
+    and the WrestleBucks left over by rounding go one each to the winners with
+    the largest remainders (earliest bet first on ties), so the payouts always
+    add up to exactly `total_pool`. Works on lists or NumPy arrays; returns
+    the same kind. Raises ValueError if nobody backed the winner.
+    """
+    if np is not None and isinstance(amounts, np.ndarray):
+        winning = np.where(won, amounts, 0)
+        winning_pool = int(winning.sum())
+        if winning_pool == 0:
+            raise ValueError("Nobody bet on the winner!")
+        if int(winning.max()) * total_pool < 2**63:
+            shares = winning * total_pool
+            payouts = shares // winning_pool
+            remainders = shares % winning_pool
+            leftover = total_pool - int(payouts.sum())
+            if leftover:
+                # Stable sort keeps bet order among equal remainders
+                order = np.argsort(-remainders, kind='stable')[:leftover]
+                payouts[order] += 1
+            return payouts
+        # Too big for int64 arithmetic: fall back to Python integers
+        return np.array(
+            parimutuel_payouts(amounts.tolist(), won.tolist(), total_pool),
+            dtype=np.int64)
+
+    winning_pool = sum(amount for amount, did_win in zip(amounts, won) if did_win)
+    if winning_pool == 0:
+        raise ValueError("Nobody bet on the winner!")
+    payouts = []
+    remainders = []
+    for position, (amount, did_win) in enumerate(zip(amounts, won)):
+        share, remainder = divmod(amount * total_pool, winning_pool) if did_win else (0, 0)
+        payouts.append(share)
+        if did_win:
+            remainders.append((-remainder, position))
+    leftover = total_pool - sum(payouts)
+    for _, position in sorted(remainders)[:leftover]:
+        payouts[position] += 1
+    return payouts
+
+
+def _total(values):
+    """Sum a list or NumPy array as a plain int."""
+    return int(values.sum()) if hasattr(values, 'sum') else sum(values)
+
+
+PAYOUT_FIXED = 'fixed'  # Winners get PAYOUT_MULTIPLIER times their bet
+PAYOUT_PARIMUTUEL = 'parimutuel'  # Winners split everything that was bet
+
+MATCH_OPEN = 'open'  # Taking bets
+MATCH_LOCKED = 'locked'  # No more bets, waiting for the result
+MATCH_SETTLED = 'settled'  # Winner known and all bets paid out
+
+
+def check_match(match_type, wrestlers, payout_mode=PAYOUT_FIXED):
+    """Raise ValueError unless a match with these settings can be opened."""
+    if match_type not in MATCH_TYPES:
+        raise ValueError(f"Unknown match type '{match_type}'!")
+    if len(wrestlers) != MATCH_TYPES[match_type]:
+        raise ValueError(
+            f"{match_type} needs {MATCH_TYPES[match_type]} wrestlers!")
+    if not all(wrestlers):
+        raise ValueError("All wrestler names must be filled!")
+    if len(wrestlers) != len(set(canonical_name(w) for w in wrestlers)):
+        raise ValueError("Wrestler names must be unique!")
+    if payout_mode not in (PAYOUT_FIXED, PAYOUT_PARIMUTUEL):
+        raise ValueError(f"Unknown payout mode '{payout_mode}'!")
+
+
+def parse_card(text):
+    """Parse an event card written one match per line.
+
+    Each line is "Match Type: Wrestler, Wrestler, ..."; blank lines and
+    lines starting with # are skipped. Returns a list of (match type,
+    wrestlers). Raises ValueError for a line that is not in this form.
+    """
+    card = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        match_type, colon, wrestlers = line.partition(':')
+        if not colon:
+            raise ValueError(
+                f"Line {number}: expected 'Match Type: Wrestler, Wrestler'")
+        card.append((match_type.strip(),
+                     [wrestler.strip() for wrestler in wrestlers.split(',')]))
+    return card
+
+
+class BetBook(Mapping):
+    """Bets on one match as {user_name: {'wrestler': str, 'amount': int}}.
+
+    Bets are stored as parallel columns (bettor, wrestler index, amount and
+    UserTable row), so settlement can use them as arrays without a rescan.
+    """
+
+    def __init__(self, wrestlers):
+        self.wrestlers = wrestlers
+        self.index = {}  # {user_name: position}
+        self.names = []
+        self.picks = array('b')  # Index into wrestlers
+        self.amounts = array('q')
+        self.rows = array('q')  # UserTable row of each bettor (-1 if none)
+        self.pools = [0] * len(wrestlers)  # Running total bet on each wrestler
+        self.total_pool = 0
+
+    def __getitem__(self, user_name):
+        position = self.index[user_name]
+        return {
+            'wrestler': self.wrestlers[self.picks[position]],
+            'amount': self.amounts[position]
+        }
+
+    def __contains__(self, user_name):
+        return user_name in self.index
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, user_name, pick, amount, row=-1):
+        """Record a bet; `pick` is the index of the wrestler in the match."""
+        # The amount goes first: if the int64 column rejects it, nothing of
+        # the bet has been recorded and the columns stay in step
+        self.amounts.append(amount)
+        self.index[user_name] = len(self.names)
+        self.names.append(user_name)
+        self.picks.append(pick)
+        self.rows.append(row)
+        self.pools[pick] += amount
+        self.total_pool += amount
+
+
+class Match:
+    """A match with its own bet book, open for bets until it is settled."""
+
+    def __init__(self, match_id, match_type, wrestlers, payout_mode=PAYOUT_FIXED,
+                 wrestler_ids=None):
+        self.id = match_id
+        self.type = match_type
+        self.payout_mode = payout_mode
+        self.wrestlers = list(wrestlers)
+        # WrestlerRegistry IDs in the same order as wrestlers (if registered)
+        self.wrestler_ids = list(wrestler_ids) if wrestler_ids else []
+        # {wrestler: position}, doubles as an O(1) set of valid wrestlers
+        self.wrestler_index = {w: i for i, w in enumerate(self.wrestlers)}
+        self.state = MATCH_OPEN
+        self.winner = None
+        self.bets = BetBook(self.wrestlers)
+        # Serializes changes to the bet book and state; taken before any
+        # USER_LOCKS stripes
+        self.lock = threading.Lock()
+
+    def describe(self):
+        """Get a one-line description such as '#3 Triple Threat: A vs B vs C'."""
+        description = f"#{self.id} {self.type}: {' vs '.join(self.wrestlers)}"
+        if self.payout_mode == PAYOUT_PARIMUTUEL:
+            description += " (parimutuel)"
+        return description
+
+    def odds(self):
+        """Get live {wrestler: decimal odds} from the running pool totals.
+
+        Decimal odds are what one WrestleBuck returns if that wrestler wins
+        (None while nobody has bet on them). In fixed payout mode they are
+        always PAYOUT_MULTIPLIER.
+        """
+        if self.payout_mode == PAYOUT_FIXED:
+            return {wrestler: PAYOUT_MULTIPLIER for wrestler in self.wrestlers}
+        total = self.bets.total_pool
+        return {
+            wrestler: (total / pool if pool else None)
+            for wrestler, pool in zip(self.wrestlers, self.bets.pools)
+        }
+
+
+class MatchResult:
+    """Outcome of settling a match: one entry per bet, in bet book order.
+
+    The per-bet columns are lists, or NumPy arrays when the book was settled
+    in vectorized mode.
+    """
+
+    def __init__(self, match, winner, names, amounts, won, payouts, balances,
+                 bailouts):
+        self.match = match
+        self.winner = winner
+        self.names = names
+        self.amounts = amounts
+        self.won = won
+        self.payouts = payouts
+        self.balances = balances  # Balances after payouts and bailouts
+        self.bailouts = bailouts  # 0 for users who did not go broke
+        self.total_wagered = _total(amounts)
+        self.total_paid = _total(payouts)
+        self.total_bailouts = _total(bailouts)
+        self.refunded = False  # True if every bet was given back
+        self.saved = False  # None when the save was queued in the background
+
+    def __len__(self):
+        return len(self.names)
+
+    def outcomes(self):
+        """Yield (name, won, amount, payout, balance, bailout) for each bet."""
+        columns = [self.amounts, self.won, self.payouts, self.balances, self.bailouts]
+        columns = [c.tolist() if hasattr(c, 'tolist') else c for c in columns]
+        amounts, won, payouts, balances, bailouts = columns
+        for i, name in enumerate(self.names):
+            yield name, won[i], amounts[i], payouts[i], balances[i], bailouts[i]
+
+    def bankruptcies(self):
+        """Get (name, bailout, balance) for every user who went broke."""
+        return [(name, bailout, balance)
+                for name, _, _, _, balance, bailout in self.outcomes() if bailout]
+
+
+class UserRow(User):
+    """Lightweight User view onto one row of a UserTable.
+
+    Reads and writes go straight to the table's columns, so all User methods
+    (place_bet, win_bet, ...) work unchanged on top of it.
+    """
+
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    @property
+    def name(self):
+        return self._table.names[self._row]
+
+    @property
+    def wrestlebucks(self):
+        return self._table.wrestlebucks[self._row]
+
+    @wrestlebucks.setter
+    def wrestlebucks(self, value):
+        self._table.wrestlebucks[self._row] = value
+
+    @property
+    def wins(self):
+        return self._table.wins[self._row]
+
+    @wins.setter
+    def wins(self, value):
+        self._table.wins[self._row] = value
+
+    @property
+    def losses(self):
+        return self._table.losses[self._row]
+
+    @losses.setter
+    def losses(self, value):
+        self._table.losses[self._row] = value
+
+    @property
+    def observer(self):
+        return self._table.observer
+
+    @observer.setter
+    def observer(self, value):
+        self._table.observer = value
+
+
+class UserTable(Mapping):
+    """Column-oriented user store: {name: UserRow} backed by typed arrays.
+
+    Names are interned and indexed by row; balances, wins and losses live in
+    one array per column, so there is no per-user object or dict.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.index = {}  # {name: row}
+        self.wrestlebucks = array('q')
+        self.wins = array('q')
+        self.losses = array('q')
+        self.observer = None  # Shared by every row view
+
+    def __getitem__(self, name):
+        return UserRow(self, self.index[name])
+
+    def __setitem__(self, name, user):
+        """Add a user, copying its values into a new row."""
+        self.append(name, user.wrestlebucks, user.wins, user.losses)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def append(self, name, wrestlebucks, wins, losses):
+        """Add a row for a new user and return its row number."""
+        row = self.index.get(name)
+        if row is not None:
+            self.wrestlebucks[row] = wrestlebucks
+            self.wins[row] = wins
+            self.losses[row] = losses
+            return row
+
+        name = sys.intern(name)
+        row = len(self.names)
+        self.names.append(name)
+        self.index[name] = row
+        self.wrestlebucks.append(wrestlebucks)
+        self.wins.append(wins)
+        self.losses.append(losses)
+        return row
+
+    def extend(self, records):
+        """Add users from user records (dictionaries from User.to_dict())."""
+        for record in records:
+            self.append(record['name'], record['wrestlebucks'], record['wins'],
+                        record['losses'])
+
+    def extend_columns(self, names, wrestlebucks, wins, losses):
+        """Add users from whole columns, e.g. from StorageBackend.load_columns().
+
+        Filling an empty table copies the columns in one go instead of
+        appending a row at a time.
+        """
+        if self.names:
+            for record in zip(names, wrestlebucks, wins, losses):
+                self.append(*record)
+            return
+        names = list(names)
+        index = dict(zip(names, range(len(names))))
+        if len(index) != len(names):
+            raise ValueError("Duplicate user names in the stored users")
+        self.names = names
+        self.index = index
+        self.wrestlebucks = array('q', wrestlebucks)
+        self.wins = array('q', wins)
+        self.losses = array('q', losses)
+
+    def columns(self):
+        """Copy out (names, wrestlebucks, wins, losses) columns."""
+        return (list(self.names), array('q', self.wrestlebucks),
+                array('q', self.wins), array('q', self.losses))
+
+    def records(self):
+        """Yield (name, wrestlebucks, wins, losses) for every row."""
+        return zip(self.names, self.wrestlebucks, self.wins, self.losses)
+
+    def rows(self, names):
+        """Get the row numbers for a sequence of user names."""
+        index = self.index
+        return [index[name] for name in names]
+
+    def aggregate_stats(self):
+        """Compute totals, win rate and balance percentiles over the columns."""
+        return aggregate_stats(self.wrestlebucks, self.wins, self.losses)
+
+
+def _percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted sequence."""
+    rank = max(0, min(len(sorted_values) - 1,
+                      int(round(percent / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[rank]
+
+
+def aggregate_stats(wrestlebucks, wins, losses):
+    """Compute aggregate stats over whole balance/wins/losses columns."""
+    count = len(wrestlebucks)
+    if count == 0:
+        return {'users': 0}
+
+    if np is not None:
+        balances = np.frombuffer(wrestlebucks, dtype=np.int64) if isinstance(
+            wrestlebucks, array) else np.asarray(wrestlebucks, dtype=np.int64)
+        total_wrestlebucks = int(balances.sum())
+        total_wins = int(np.asarray(wins, dtype=np.int64).sum())
+        total_losses = int(np.asarray(losses, dtype=np.int64).sum())
+        p50, p90, p99 = (int(v) for v in np.percentile(
+            balances, [50, 90, 99], method='nearest'))
+        min_balance, max_balance = int(balances.min()), int(balances.max())
+    else:
+        balances = sorted(wrestlebucks)
+        total_wrestlebucks = sum(balances)
+        total_wins = sum(wins)
+        total_losses = sum(losses)
+        p50, p90, p99 = (_percentile(balances, p) for p in (50, 90, 99))
+        min_balance, max_balance = balances[0], balances[-1]
+
+    total_games = total_wins + total_losses
+    return {
+        'users': count,
+        'total_wrestlebucks': total_wrestlebucks,
+        'mean_wrestlebucks': total_wrestlebucks / count,
+        'min_wrestlebucks': min_balance,
+        'max_wrestlebucks': max_balance,
+        'p50_wrestlebucks': p50,
+        'p90_wrestlebucks': p90,
+        'p99_wrestlebucks': p99,
+        'total_wins': total_wins,
+        'total_losses': total_losses,
+        'win_rate': (total_wins / total_games * 100) if total_games > 0 else 0
+    }
+
+
+class StoredUsers(Mapping):
+    """Dictionary-like view of users that live in a lazy storage backend.
+
+    Users are fetched from the backend the first time they are looked up.
+    With a `cache_size` only that many stay in memory: the least recently
+    used are evicted, and changed ones are written back to the backend
+    first, so memory follows the active bettors rather than every account.
+    An evicted user that some caller still holds is handed back instead of
+    being fetched again, so there is never more than one copy of a user.
+    """
+
+    def __init__(self, storage, attach, cache_size=None):
+        self.storage = storage
+        self._attach = attach
+        self.cache_size = cache_size
+        self._lock = threading.Lock()  # Guards the cache and its counters
+        self._hydrated = OrderedDict()  # {name: User}, least recently used first
+        self._evicted = weakref.WeakValueDictionary()  # Evicted, still in use
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _cached(self, name):
+        """Get a user that is in memory, or None (call with the lock held)."""
+        user = self._hydrated.get(name)
+        if user is not None:
+            self._hydrated.move_to_end(name)
+        else:
+            user = self._evicted.pop(name, None)
+            if user is None:
+                return None
+            self._keep(name, user)
+        self.hits += 1
+        return user
+
+    def _keep(self, name, user):
+        """Cache a user as the most recently used, evicting the least
+        recently used beyond cache_size (call with the lock held)."""
+        self._hydrated[name] = user
+        if self.cache_size is None or len(self._hydrated) <= self.cache_size:
+            return
+        evicted = []
+        while len(self._hydrated) > self.cache_size:
+            old_name, old_user = self._hydrated.popitem(last=False)
+            self._evicted[old_name] = old_user
+            evicted.append(old_user)
+        self.evictions += len(evicted)
+        self.storage.write_back(evicted)
+
+    def __getitem__(self, name):
+        with self._lock:
+            user = self._cached(name)
+        if user is None:
+            # Hydrate under the user's lock so two threads cannot each build
+            # their own copy of the same user
+            with USER_LOCKS.lock_for(name):
+                with self._lock:
+                    user = self._cached(name)
+                if user is None:
+                    record = self.storage.get(name)
+                    if record is None:
+                        raise KeyError(name)
+                    user = User.from_dict(record)
+                    self._attach(user)
+                    with self._lock:
+                        self.misses += 1
+                        self._keep(name, user)
+        return user
+
+    def __setitem__(self, name, user):
+        with self._lock:
+            self._keep(name, user)
+
+    def __contains__(self, name):
+        return (name in self._hydrated or name in self._evicted
+                or self.storage.contains(name))
+
+    def __iter__(self):
+        return iter(self.storage.names())
+
+    def __len__(self):
+        return self.storage.count()
+
+    def cache_stats(self):
+        """Get the cache hit, miss and eviction counts and its current size."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'cached': len(self._hydrated),
+                'cache_size': self.cache_size
+            }
+
+
+class CommitBatch:
+    """Changes held back by SaltyBet.defer_commits()."""
+
+    __slots__ = ('needed', 'saved')
+
+    def __init__(self):
+        self.needed = False  # Something changed and must be saved
+        # Whether the final save succeeded (None if it was queued or
+        # nothing changed)
+        self.saved = None
+
+
 class SaltyBet:
     """Main Salty Bet application."""
 
-    def __init__(self, data_file=None):
-        self.users = {}
-        self.current_match = None
-        self.bets = {}  # {user_name: {'wrestler': str, 'amount': int}}
+    def __init__(self, data_file=None, storage=None, columnar=False,
+                 history=True, verbose=True, durability=DURABLE, cache_size=None,
+                 shared=False):
+        # verbose=False keeps routine messages (users added, data saved)
+        # quiet; errors are always printed
+        self.verbose = verbose
+        # DURABLE saves are fsynced before they count as done; FAST ones
+        # leave that to the operating system (see SaltyBetPersistence)
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode '{durability}'")
+        self.durability = durability
+        # With columnar=True users live in a UserTable of typed arrays and
+        # self.users hands out lightweight UserRow views
+        self.columnar = columnar
+        self.users = UserTable() if columnar else {}
+        self.matches = {}  # {match_id: Match} for matches not settled yet
+        self._next_match_id = 1
+        self._matches_lock = threading.Lock()  # Guards matches and the next ID
+        self.load_timings = {}  # {phase: seconds} for the last startup
+        # Ranked index of in-memory users (lazy backends rank with queries)
+        self.leaderboard = None
+        self._np_rng = None  # Created on first vectorized settlement
+        self._save_lock = threading.Lock()  # One save at a time
+        self.saver = None  # SaveWorker once background saves are started
+        self._wait_for_saves = False  # Whether changes wait for their save
+        self._deferred = threading.local()  # This thread's defer_commits() batch
+        self.events = EventBus()  # Publishes every change (see SaltyBetEvents)
+        self._roster_version = 0  # Bumped when users are added
+        self._name_order = {}  # {descending: (roster version, sorted names)}
+        self._name_index = None  # NameIndex, built on the first search
 
         # Set up data file path with proper permissions handling
         if data_file is None:
@@ -84,9 +815,43 @@ class SaltyBet:
         else:
             self.data_file = data_file
 
+        # 'json', 'ledger', 'sqlite', 'binary' or a StorageBackend instance;
+        # by default the backend is picked from the data file extension.
+        # shared=True lets several processes use one ledger (see sync())
+        self.storage = create_storage(storage, self.data_file, shared, verbose)
+        self.storage.set_durable(durability == DURABLE)
+        if columnar and self.storage.lazy:
+            raise ValueError("The columnar user table needs a storage backend "
+                             "that loads all users up front")
+        # With a lazy backend, keep at most this many users in memory
+        # (None keeps every user that was looked up)
+        if cache_size is not None and (not self.storage.lazy or cache_size < 1):
+            raise ValueError("A user cache needs a positive size and a storage "
+                             "backend that serves users on demand")
+        self.cache_size = cache_size
+
         self.load_users_from_file()
 
-    def _get_safe_data_file_path(self):
+        # Every settled match is appended to binary history files next to
+        # the data file (see SaltyBetHistory)
+        self.history = None
+        # Wrestler records, rebuilt from the history and kept up to date as
+        # matches settle
+        self.wrestlers = WrestlerRegistry()
+        self.ratings = RatingModel(self.wrestlers)
+        # The history files, match IDs and their name table are not
+        # coordinated between processes, so a shared ledger keeps no history
+        if history and not self.storage.shared:
+            try:
+                self.history = MatchHistory(self.data_file)
+                self._next_match_id = self.history.last_match_id + 1
+                self.wrestlers.load_history(self.history)
+                self.ratings.load_history(self.history)
+            except (OSError, ValueError) as e:
+                print(f"Match history disabled: {e}")
+
+    @staticmethod
+    def _get_safe_data_file_path():
         """Get a safe path for the data file with proper permissions."""
         # Get the directory where the script is located
         script_dir = Path(__file__).parent
@@ -117,23 +882,53 @@ class SaltyBet:
         # If all else fails, use script directory (will show error later)
         return str(script_dir / "saltybet_users.json")
 
+    def _attach_user(self, user):
+        """Start passing changes to a user on to the storage backend."""
+        user.observer = self._record_user_change
+
+    def _record_user_change(self, user, op, amount):
+        """Tell the storage backend, the indexes and subscribers about a change."""
+        self.storage.record_change(user, op, amount)
+        self._users_changed((user.name, ))
+        events = self.events
+        if events.wants(EVENT_BALANCE_CHANGED):
+            events.publish(EVENT_BALANCE_CHANGED, name=user.name,
+                           **{field: getattr(user, field) for field in CHANGED_FIELDS[op]})
+        if op == 'bailout':
+            events.publish(EVENT_BAILOUT_GRANTED, name=user.name, amount=amount,
+                           wrestlebucks=user.wrestlebucks)
+
+    def _users_changed(self, names, added=False):
+        """Mark users as changed for the leaderboard and sorted pages."""
+        if added:
+            self._roster_version += 1
+            if self._name_index is not None:
+                self._name_index.add_many(names)
+        if self.leaderboard is not None:
+            self.leaderboard.mark_many(names)
+
     def save_users_to_file(self):
-        """Save all users to JSON file."""
+        """Save all users through the storage backend."""
         try:
-            users_data = {}
-            for name, user in self.users.items():
-                users_data[name] = user.to_dict()
-
             # Ensure directory exists
-            data_path = Path(self.data_file)
+            data_path = Path(self.storage.path)
             data_path.parent.mkdir(parents=True, exist_ok=True)
 
-            with open(self.data_file, 'w') as f:
-                json.dump(users_data, f, indent=2)
-            print(f"User data saved to {self.data_file}")
+            with self._save_lock:
+                # Hold every user stripe so the save sees a consistent
+                # snapshot, but write it out after they are released
+                with USER_LOCKS.holding():
+                    finish = self.storage.begin_commit(self.users)
+                    if self.storage.shared:
+                        # The commit read what other processes saved first
+                        self._apply_remote_changes()
+                if finish is not None:
+                    finish()
+            if self.verbose:
+                print(f"User data saved to {self.storage.path}")
             return True
         except PermissionError:
-            print(f"Permission denied: Cannot write to {self.data_file}")
+            print(f"Permission denied: Cannot write to {self.storage.path}")
             print(
                 "Try running the application with appropriate permissions or choose a different location."
             )
@@ -146,44 +941,753 @@ class SaltyBet:
             return False
 
     def load_users_from_file(self):
-        """Load users from JSON file."""
+        """Load users through the storage backend."""
+        if self.storage.lazy:
+            self.users = StoredUsers(self.storage, self._attach_user, self.cache_size)
+            if self.verbose:
+                print(f"Using {len(self.users)} users stored in {self.storage.path}")
+            return
+
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    users_data = json.load(f)
+            if self.columnar or self.storage.stores_columns:
+                columns = self.storage.load_columns()
+                loaded = columns is not None
+            else:
+                users_data = self.storage.load()
+                loaded = users_data is not None
 
+            if loaded and self.columnar:
+                self.users.extend_columns(*columns)
+            elif loaded and self.storage.stores_columns:
+                names, wrestlebucks, wins, losses = columns
+                users = self.users
+                for name, balance, won, lost in zip(names, wrestlebucks, wins, losses):
+                    user = users[name] = User(name)
+                    user.wrestlebucks = balance
+                    user.wins = won
+                    user.losses = lost
+            elif loaded:
                 for name, user_data in users_data.items():
                     self.users[name] = User.from_dict(user_data)
 
-                print(f"Loaded {len(self.users)} users from {self.data_file}")
-            else:
+            if loaded:
+                if self.verbose:
+                    print(f"Loaded {len(self.users)} users from {self.storage.path}")
+            elif self.verbose:
                 print(
-                    f"No existing user data found at {self.data_file}. Starting fresh!"
+                    f"No existing user data found at {self.storage.path}. Starting fresh!"
                 )
         except PermissionError:
-            print(f"Permission denied: Cannot read from {self.data_file}")
+            print(f"Permission denied: Cannot read from {self.storage.path}")
             print("Starting with empty user list.")
         except FileNotFoundError:
-            print(f"Data file not found: {self.data_file}")
+            print(f"Data file not found: {self.storage.path}")
             print("Starting with empty user list.")
         except json.JSONDecodeError as e:
-            print(f"Invalid JSON format in {self.data_file}: {e}")
+            print(f"Invalid JSON format in {self.storage.path}: {e}")
             print("Starting with empty user list.")
         except Exception as e:
             print(f"Error loading user data: {e}")
             print("Starting with empty user list.")
 
+        self.load_timings = self.storage.load_timings
+        self.leaderboard = Leaderboard(self.users)
+        if self.columnar:
+            self.users.observer = self._record_user_change
+        else:
+            for user in self.users.values():
+                self._attach_user(user)
+
+    def sync(self):
+        """Pick up the changes other processes sharing the data file have
+        saved, reading only what they appended since the last sync.
+
+        Returns the number of changes applied. Changes are also picked up
+        by every save, just before this process appends its own.
+        """
+        if not self.storage.shared:
+            return 0
+        with USER_LOCKS.holding():
+            return self._apply_remote_changes()
+
+    def _apply_remote_changes(self):
+        """Apply changes read from other processes (hold every user stripe)."""
+        users_data, records = self.storage.catch_up()
+        if users_data is None and not records:
+            return 0
+        users = self.users
+        added, changed = [], {}  # changed: {name: user}
+        for record in (users_data or {}).values():
+            # Loaded again from scratch: set everyone's values
+            name = record['name']
+            user = users.get(name)
+            if user is None:
+                user = self._add_remote_user(name, record['wrestlebucks'])
+                added.append(name)
+            user.wrestlebucks = record['wrestlebucks']
+            user.wins = record['wins']
+            user.losses = record['losses']
+            changed[name] = user
+        for record in records:
+            op, name = record[0], record[1]
+            amount = record[2] if len(record) > 2 else None
+            user = users.get(name)
+            if op == 'add':
+                if user is None:
+                    self._add_remote_user(name, amount)
+                    added.append(name)
+                continue
+            if user is None:
+                print(f"Ledger references unknown user '{name}', skipping.")
+                continue
+            apply_change(user, op, amount)
+            changed[name] = user
+
+        if added:
+            self._users_changed(added, added=True)
+        self._users_changed(list(changed))
+        events = self.events
+        with events.batch():
+            for name in added:
+                events.publish(EVENT_USER_ADDED, name=name,
+                               wrestlebucks=users[name].wrestlebucks)
+            if events.wants(EVENT_BALANCE_CHANGED):
+                for name, user in changed.items():
+                    events.publish(EVENT_BALANCE_CHANGED, name=name,
+                                   wrestlebucks=user.wrestlebucks, wins=user.wins,
+                                   losses=user.losses)
+        return len(records) + len(users_data or ())
+
+    def _add_remote_user(self, name, wrestlebucks):
+        """Add a user another process created, without recording it again."""
+        user = User(name)
+        user.wrestlebucks = wrestlebucks
+        self.users[name] = user
+        user = self.users[name]  # A row view in the columnar table
+        self._attach_user(user)
+        return user
+
+    def start_background_saves(self, on_done=None, window=0.0, wait=False):
+        """Hand every later save to a SaveWorker thread and return it.
+
+        Changes then return without waiting for the disk, and a
+        MatchResult's `saved` is None; `on_done(success)` is called on the
+        worker thread after each save. Changes made within `window` seconds
+        of each other share one save (group commit).
+
+        With wait=True each change instead blocks until the save covering
+        it is done and reports whether it succeeded, so many threads get
+        saved changes for the price of one write and fsync between them.
+        """
+        if self.saver is None:
+            self.saver = SaveWorker(self.save_users_to_file, on_done, window)
+            self._wait_for_saves = wait
+        return self.saver
+
+    def wait_for_saves(self, timeout=None):
+        """Wait until every change so far is saved; returns whether it is."""
+        if self.saver is None:
+            return True
+        return self.saver.flush(timeout)
+
+    def _commit(self):
+        """Persist changes: save now, or queue a save on the background worker.
+
+        Returns whether the save succeeded, or None if it was queued or
+        deferred to the end of a defer_commits() block.
+        """
+        batch = getattr(self._deferred, 'batch', None)
+        if batch is not None:
+            batch.needed = True
+            return None
+        if self.saver is not None:
+            ticket = self.saver.request()
+            return self.saver.wait(ticket) if self._wait_for_saves else None
+        return self.save_users_to_file()
+
+    @contextmanager
+    def defer_commits(self):
+        """Save the changes this thread makes in the block once, at its end.
+
+        Yields a CommitBatch whose `saved` is set when the block ends.
+        Blocks nest; only the outermost one saves. Changes made by other
+        threads are saved as usual.
+        """
+        batch = getattr(self._deferred, 'batch', None)
+        if batch is not None:
+            yield batch
+            return
+        batch = self._deferred.batch = CommitBatch()
+        try:
+            yield batch
+        finally:
+            self._deferred.batch = None
+            if batch.needed:
+                batch.saved = self._commit()
+
+    def close(self):
+        """Finish pending saves and release files and connections."""
+        if self.saver is not None:
+            self.saver.close()
+            self.saver = None
+        self.storage.close()
+        if self.history is not None:
+            self.history.close()
+
+    def compact_storage(self, wait=False):
+        """Ask the storage backend to compact itself (e.g. fold the ledger)."""
+        return self.storage.compact(wait)
+
+    def get_leaderboard(self, column='wrestlebucks', limit=10):
+        """Get stats for the users with the highest values in a column.
+
+        'wrestlebucks', 'wins' and 'win_rate' (users with at least
+        LEADERBOARD_MIN_GAMES settled bets) come from the leaderboard index.
+        """
+        if self.storage.lazy:
+            records = self.storage.top(column, limit, LEADERBOARD_MIN_GAMES)
+            return [self.users[record['name']].get_stats() for record in records]
+
+        if column in BOARDS:
+            names = self.leaderboard.top(column, limit)
+            return [self.users[name].get_stats() for name in names]
+
+        with USER_LOCKS.holding():
+            top_users = heapq.nlargest(limit,
+                                       self.users.values(),
+                                       key=lambda user: getattr(user, column))
+            return [user.get_stats() for user in top_users]
+
+    def get_rank(self, user_name, column='wrestlebucks'):
+        """Get a user's 1-based rank on a leaderboard, or None if unranked."""
+        if self.storage.lazy:
+            return self.storage.rank(column, user_name, LEADERBOARD_MIN_GAMES)
+        if column not in BOARDS:
+            raise ValueError(f"Cannot rank users by '{column}'")
+        return self.leaderboard.rank(column, user_name)
+
+    def get_users_page(self, column='name', offset=0, limit=100, descending=False):
+        """Get (user count, [stats]) for one page of users sorted by a column.
+
+        Ties are broken by name. Pages come from SQL with a lazy backend and
+        otherwise from the leaderboard index, which keeps every order sorted
+        as users change; names are sorted once and reused until users join.
+        """
+        if column not in USER_COLUMNS:
+            raise ValueError(f"Cannot sort users by '{column}'")
+        if self.storage.lazy:
+            total, records = self.storage.page(column, offset, limit, descending)
+            return total, [self.users[record['name']].get_stats() for record in records]
+
+        if column == 'name':
+            names = self._sorted_user_names(descending)[offset:offset + limit]
+        elif column in ('wrestlebucks', 'wins') and descending:
+            names = self.leaderboard.page(column, offset, limit)
+        else:
+            names = self.leaderboard.sorted_page(column, descending, offset, limit)
+        return len(self.users), [self.users[name].get_stats() for name in names]
+
+    def _sorted_user_names(self, descending):
+        """Get every user name in order, cached until users are added."""
+        version = self._roster_version
+        cached = self._name_order.get(descending)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with USER_LOCKS.holding():
+            names = sorted(self.users, reverse=descending)
+        self._name_order[descending] = (version, names)
+        return names
+
+    def search_users(self, query, limit=10, fuzzy=True):
+        """Get up to `limit` user names matching what was typed so far.
+
+        Matching ignores case: names starting with the query come first,
+        then names with a later word starting with it, then (if fuzzy) names
+        one typo away. The name index is built on the first search.
+        """
+        if self._name_index is None:
+            with USER_LOCKS.holding():
+                if self._name_index is None:
+                    self._name_index = NameIndex(self.users)
+        return self._name_index.search(query, limit, fuzzy)
+
+    def get_wrestler_stats(self, name):
+        """Get a wrestler's wins, losses and betting totals (None if unknown)."""
+        return self.wrestlers.get_stats(name)
+
+    def get_head_to_head(self, first, second):
+        """Get {wrestler: wins over the other} for two wrestlers."""
+        return self.wrestlers.get_head_to_head(first, second)
+
+    def get_win_probabilities(self, match_id=None):
+        """Get {wrestler: chance of winning} for a match from the ratings."""
+        match = self.get_match(match_id)
+        if match is None:
+            return {}
+        return self.ratings.probabilities(match.wrestlers)
+
+    def get_card_probabilities(self):
+        """Get {match_id: {wrestler: chance of winning}} for every open match."""
+        with self._matches_lock:
+            matches = list(self.matches.values())
+        chances = self.ratings.card_probabilities(
+            [match.wrestlers for match in matches])
+        return {match.id: match_chances
+                for match, match_chances in zip(matches, chances)}
+
+    def get_aggregate_stats(self):
+        """Get totals, overall win rate and balance percentiles for all users."""
+        with USER_LOCKS.holding():
+            if self.columnar:
+                return self.users.aggregate_stats()
+            users = list(self.users.values())
+            return aggregate_stats([user.wrestlebucks for user in users],
+                                   [user.wins for user in users],
+                                   [user.losses for user in users])
+
     def get_data_file_location(self):
         """Get the current data file location."""
-        return self.data_file
+        return self.storage.path
 
     def add_user(self, name):
         """Add a new user to the system."""
-        if name in self.users:
-            print(f"User '{name}' already exists!")
-            return False
+        with USER_LOCKS.lock_for(name):
+            if name in self.users:
+                print(f"User '{name}' already exists!")
+                return False
 
-        self.users[name] = User(name)
-        print(f"User '{name}' added with 1000 WrestleBucks!")
-        self.save_users_to_file()
+            self.users[name] = User(name)
+            user = self.users[name]
+            self._attach_user(user)
+            self.storage.add(user)
+        self._users_changed((name, ), added=True)
+        self.events.publish(EVENT_USER_ADDED, name=name, wrestlebucks=STARTING_WRESTLEBUCKS)
+        if self.verbose:
+            print(f"User '{name}' added with {STARTING_WRESTLEBUCKS} WrestleBucks!")
+        self._commit()
         return True
+
+    def add_users(self, names):
+        """Add many new users with a single save; return how many were added."""
+        added = []
+        for name in names:
+            with USER_LOCKS.lock_for(name):
+                if name in self.users:
+                    continue
+                self.users[name] = User(name)
+                user = self.users[name]
+                self._attach_user(user)
+                self.storage.add(user)
+            added.append(name)
+        if not added:
+            return 0
+        self._users_changed(added, added=True)
+        if self.events.wants(EVENT_USER_ADDED):
+            with self.events.batch():
+                for name in added:
+                    self.events.publish(EVENT_USER_ADDED, name=name,
+                                        wrestlebucks=STARTING_WRESTLEBUCKS)
+        if self.verbose:
+            print(f"Added {len(added)} users with {STARTING_WRESTLEBUCKS} WrestleBucks each!")
+        self._commit()
+        return len(added)
+
+    def open_match(self, match_type, wrestlers, payout_mode=PAYOUT_FIXED,
+                   match_id=None):
+        """Open a new match for betting alongside any other open matches.
+
+        `match_id` reuses an ID assigned elsewhere (e.g. by a shard
+        coordinator). Returns the new Match. Raises ValueError for an
+        invalid match.
+        """
+        check_match(match_type, wrestlers, payout_mode)
+        wrestler_ids = [self.wrestlers.intern(w) for w in wrestlers]
+        with self._matches_lock:
+            if match_id is None:
+                match_id = self._next_match_id
+            elif match_id in self.matches:
+                raise ValueError(f"Match #{match_id} is already open!")
+            match = Match(match_id, match_type, wrestlers, payout_mode, wrestler_ids)
+            self._next_match_id = max(self._next_match_id, match_id + 1)
+            self.matches[match.id] = match
+        self.events.publish(EVENT_MATCH_OPENED, match_id=match.id, type=match_type,
+                            wrestlers=list(wrestlers), payout_mode=payout_mode)
+        return match
+
+    def open_card(self, card, payout_mode=PAYOUT_FIXED):
+        """Open every match of an event card at once.
+
+        `card` is a list of (match type, wrestlers), e.g. from parse_card().
+        The whole card is checked before any match opens. Returns the new
+        Matches in card order. Raises ValueError for an invalid match.
+        """
+        for position, (match_type, wrestlers) in enumerate(card, 1):
+            try:
+                check_match(match_type, wrestlers, payout_mode)
+            except ValueError as e:
+                raise ValueError(f"Match {position} on the card: {e}") from None
+        return [self.open_match(match_type, wrestlers, payout_mode)
+                for match_type, wrestlers in card]
+
+    def setup_match(self, match_type, wrestlers, payout_mode=PAYOUT_FIXED):
+        """Open a new match and report (success, message)."""
+        try:
+            match = self.open_match(match_type, wrestlers, payout_mode)
+        except ValueError as e:
+            return False, str(e)
+        return True, f"Match #{match.id} setup successfully!"
+
+    @property
+    def current_match(self):
+        """The most recently opened match that has not been settled yet."""
+        with self._matches_lock:
+            return next(reversed(self.matches.values()), None)
+
+    @property
+    def bets(self):
+        """Bet book of the current match ({} when there is none)."""
+        match = self.current_match
+        return match.bets if match is not None else {}
+
+    def get_match(self, match_id=None):
+        """Get an unsettled match by ID (the current one if match_id is None)."""
+        if match_id is None:
+            return self.current_match
+        with self._matches_lock:
+            return self.matches.get(match_id)
+
+    def lock_match(self, match_id=None):
+        """Stop taking bets on a match before its result is known."""
+        match = self.get_match(match_id)
+        if match is None:
+            return False, "No such match is open!"
+        with match.lock:
+            if match.state != MATCH_OPEN:
+                return False, f"Match #{match.id} is already {match.state}!"
+            match.state = MATCH_LOCKED
+        return True, f"Betting on match #{match.id} is locked!"
+
+    def place_bet(self, user_name, wrestler, amount, match_id=None):
+        """Place a user's bet on a wrestler in a match (the current one by default)."""
+        try:
+            rejected = self.place_bets([(user_name, wrestler, amount)], match_id)
+        except ValueError as e:
+            return False, str(e)
+        if rejected:
+            return False, rejected[0][1]
+        return True, f"Bet of {amount} WrestleBucks placed on {wrestler}!"
+
+    def place_bets(self, bets, match_id=None):
+        """Place many (user name, wrestler, amount) bets on one match.
+
+        Each bet is checked on its own; returns [(position, message)] for
+        the bets that were rejected. Raises ValueError if the match is not
+        open for bets.
+        """
+        match = self.get_match(match_id)
+        if match is None:
+            raise ValueError("No match is currently set up!")
+        users = self.users
+        book = match.bets
+        wrestler_index = match.wrestler_index
+        rows = users.index if self.columnar else None
+        publish = self.events.wants(EVENT_BET_PLACED)
+        rejected = []
+
+        with match.lock, self._checked_against_shared_ledger():
+            if match.state != MATCH_OPEN:
+                raise ValueError(f"Betting on match #{match.id} is closed!")
+            for position, (user_name, wrestler, amount) in enumerate(bets):
+                pick = wrestler_index.get(wrestler)
+                if pick is None:
+                    rejected.append((position, f"Wrestler '{wrestler}' is not in this match!"))
+                    continue
+                if user_name in book:
+                    rejected.append((position, f"User '{user_name}' has already "
+                                     "placed a bet for this match!"))
+                    continue
+                try:
+                    user = users[user_name]
+                except KeyError:
+                    rejected.append((position, f"User '{user_name}' not found!"))
+                    continue
+                if (not isinstance(amount, numbers.Integral)
+                        or isinstance(amount, bool)):
+                    rejected.append((position, "Bet amount must be a whole number!"))
+                    continue
+                amount = int(amount)
+                if amount > MAX_BET:
+                    rejected.append((position, "Bet amount is too large!"))
+                    continue
+
+                success, message = user.place_bet(amount)
+                if not success:
+                    rejected.append((position, message))
+                    continue
+                book.add(user_name, pick, amount,
+                         rows[user_name] if rows is not None else -1)
+                if publish:
+                    self.events.publish(EVENT_BET_PLACED, match_id=match.id,
+                                        name=user_name, wrestler=wrestler,
+                                        amount=amount)
+        return rejected
+
+    @contextmanager
+    def _checked_against_shared_ledger(self):
+        """Make balance checks see what every process has saved (a shared
+        ledger only).
+
+        Holds the ledger lock with every user stripe, applies the other
+        processes' changes first and writes this process's changes before
+        the lock is released, so two processes can never both spend the
+        same WrestleBucks.
+        """
+        if not self.storage.shared:
+            yield
+            return
+        with USER_LOCKS.holding(), self.storage.transaction():
+            self._apply_remote_changes()
+            yield
+
+    def resolve_match(self, winner, match_id=None, pool_payouts=None, refund=False):
+        """Settle every bet on a match and return a MatchResult.
+
+        Large bet books are settled in one vectorized pass when NumPy is
+        available. `pool_payouts` (a payout per bet, in bet book order) and
+        `refund` let a caller whose pool spans several processes decide the
+        parimutuel payouts itself. Raises ValueError if the match cannot be
+        resolved.
+        """
+        match = self._match_to_resolve(winner, match_id)
+        # Batched subscribers get the whole settlement as one list
+        with self.events.batch():
+            result = self._settle_match(match, winner, pool_payouts, refund)
+        result.saved = self._commit()
+        return result
+
+    def resolve_card(self, results):
+        """Settle a batch of matches in order with a single save at the end.
+
+        `results` is a list of (match_id, winner) pairs or a {match_id:
+        winner} dict. Every result is checked before anything is settled,
+        and matches nobody bet on are closed too, so a whole event card can
+        be entered in one go. Returns the MatchResults in order; raises
+        ValueError if any result is invalid.
+        """
+        if isinstance(results, Mapping):
+            results = list(results.items())
+        if len({match_id for match_id, _ in results}) != len(results):
+            raise ValueError("Each match can only have one result!")
+        matches = [self._match_to_resolve(winner, match_id)
+                   for match_id, winner in results]
+
+        settled = []
+        try:
+            with self.events.batch():
+                for match, (_, winner) in zip(matches, results):
+                    settled.append(
+                        self._settle_match(match, winner, require_bets=False))
+        finally:
+            # Whatever was settled is saved, even if a later match failed
+            saved = self._commit() if settled else False
+            for result in settled:
+                result.saved = saved
+        return settled
+
+    def _match_to_resolve(self, winner, match_id):
+        """Get a match that can be resolved with this winner or raise ValueError."""
+        match = self.get_match(match_id)
+        if match is None:
+            raise ValueError("No match to resolve!" if match_id is None
+                             else f"Match #{match_id} is not open!")
+        if winner not in match.wrestler_index:
+            raise ValueError(f"Wrestler '{winner}' is not in match #{match.id}!")
+        return match
+
+    def _settle_match(self, match, winner, pool_payouts=None, refund=False,
+                      require_bets=True):
+        """Settle a match and record the result everywhere except on disk."""
+        with match.lock:
+            if match.state == MATCH_SETTLED:
+                raise ValueError(f"Match #{match.id} is already settled!")
+            if require_bets and not match.bets:
+                raise ValueError("No bets placed for this match!")
+
+            winner_pick = match.wrestler_index[winner]
+            vectorize = np is not None and len(match.bets) >= VECTORIZE_THRESHOLD
+            # Settling on the columns directly needs every stripe, since it
+            # pins the UserTable arrays that add_user appends to
+            held = None if vectorize and self.columnar else match.bets.names
+            with USER_LOCKS.holding(held):
+                if refund or (pool_payouts is None
+                              and match.payout_mode == PAYOUT_PARIMUTUEL
+                              and match.bets.pools[winner_pick] == 0):
+                    # Nobody backed the winner, so there is nobody to pay the pool to
+                    result = self._refund_all(match, winner)
+                elif vectorize:
+                    result = self._settle_vectorized(match, winner, pool_payouts)
+                else:
+                    result = self._settle_loop(match, winner, pool_payouts)
+
+            match.state = MATCH_SETTLED
+            match.winner = winner
+            self.wrestlers.record_result(result)
+            self.ratings.record_result(result)
+            self._record_history(result)
+            self.events.publish(EVENT_MATCH_SETTLED, match_id=match.id, winner=winner,
+                                bets=len(result), total_wagered=result.total_wagered,
+                                total_paid=result.total_paid,
+                                total_bailouts=result.total_bailouts,
+                                refunded=result.refunded)
+        with self._matches_lock:
+            del self.matches[match.id]
+        return result
+
+    def _record_history(self, result):
+        """Append a settled match to the match history (if enabled)."""
+        if self.history is None:
+            return
+        try:
+            self.history.record(result)
+        except (OSError, ValueError) as e:
+            print(f"Error recording match #{result.match.id} in history: {e}")
+
+    def _refund_all(self, match, winner):
+        """Give every bet on a match back (parimutuel match nobody won)."""
+        names = list(match.bets.names)
+        amounts = match.bets.amounts.tolist()
+        balances = []
+        for user_name, amount in zip(names, amounts):
+            user = self.users[user_name]
+            user.refund_bet(amount)
+            balances.append(user.wrestlebucks)
+
+        result = MatchResult(match, winner, names, amounts, [False] * len(names),
+                             amounts, balances, [0] * len(names))
+        result.refunded = True
+        return result
+
+    def _settle_loop(self, match, winner, pool_payouts=None):
+        """Settle a bet book one user at a time."""
+        names, amounts, won, payouts, balances, bailouts = [], [], [], [], [], []
+        if hasattr(pool_payouts, 'tolist'):
+            pool_payouts = pool_payouts.tolist()  # Plain ints for the users
+        elif pool_payouts is None and match.payout_mode == PAYOUT_PARIMUTUEL:
+            winner_pick = match.wrestler_index[winner]
+            pool_payouts = parimutuel_payouts(
+                match.bets.amounts.tolist(),
+                [pick == winner_pick for pick in match.bets.picks],
+                match.bets.total_pool)
+
+        for position, (user_name, bet_info) in enumerate(match.bets.items()):
+            user = self.users[user_name]
+            did_win = bet_info['wrestler'] == winner
+            if did_win:
+                payout = user.win_bet(
+                    bet_info['amount'],
+                    pool_payouts[position] if pool_payouts is not None else None)
+            else:
+                user.lose_bet()
+                payout = 0
+
+            bailout = user.bail_out_if_broke()
+
+            names.append(user_name)
+            amounts.append(bet_info['amount'])
+            won.append(did_win)
+            payouts.append(payout)
+            balances.append(user.wrestlebucks)
+            bailouts.append(bailout)
+
+        return MatchResult(match, winner, names, amounts, won, payouts,
+                           balances, bailouts)
+
+    def _settle_vectorized(self, match, winner, pool_payouts=None):
+        """Settle a bet book as NumPy arrays, then write balances back."""
+        if self._np_rng is None:
+            self._np_rng = np.random.default_rng()
+        book = match.bets
+        names = book.names
+        # Copy the columns so the bet book arrays are not pinned by NumPy views
+        amounts = np.frombuffer(book.amounts, dtype=np.int64).copy()
+        picks = np.frombuffer(book.picks, dtype=np.int8)
+        won = picks == match.wrestler_index[winner]
+        del picks
+        if pool_payouts is not None:
+            pool_payouts = np.asarray(pool_payouts, dtype=np.int64)
+        elif match.payout_mode == PAYOUT_PARIMUTUEL:
+            pool_payouts = parimutuel_payouts(amounts, won, book.total_pool)
+
+        if self.columnar:
+            rows = np.frombuffer(book.rows, dtype=np.int64).copy()
+            payouts, new_balances, bailouts = self._settle_table(
+                names, rows, amounts, won, pool_payouts)
+        else:
+            users = [self.users[name] for name in names]
+            balances = np.fromiter((user.wrestlebucks for user in users),
+                                   np.int64, len(users))
+            payouts, new_balances, bailouts = settle_arrays(
+                amounts, won, balances, self._np_rng, pool_payouts)
+
+            for user, did_win, payout, bailout in zip(users, won.tolist(),
+                                                      payouts.tolist(),
+                                                      bailouts.tolist()):
+                user.apply_settlement(did_win, payout, bailout)
+
+        return MatchResult(match, winner, names, amounts, won, payouts,
+                           new_balances, bailouts)
+
+    def _settle_table(self, names, rows, amounts, won, pool_payouts=None):
+        """Settle directly on the UserTable columns with fancy indexing."""
+        table = self.users
+        balance_column = np.frombuffer(table.wrestlebucks, dtype=np.int64)
+        wins_column = np.frombuffer(table.wins, dtype=np.int64)
+        losses_column = np.frombuffer(table.losses, dtype=np.int64)
+
+        payouts, new_balances, bailouts = settle_arrays(
+            amounts, won, balance_column[rows], self._np_rng, pool_payouts)
+        # Each user has at most one bet per match, so rows are unique
+        balance_column[rows] = new_balances
+        wins_column[rows] += won
+        losses_column[rows] += ~won
+        # Release the buffer views so the arrays can grow again
+        del balance_column, wins_column, losses_column
+
+        if self.storage.wants_changes:
+            self.storage.record_settlement(table, names, won.tolist(),
+                                           payouts.tolist(), bailouts.tolist())
+        self._users_changed(names)
+        self._publish_settlement(table, names, rows, won, bailouts)
+        return payouts, new_balances, bailouts
+
+    def _publish_settlement(self, table, names, rows, won, bailouts):
+        """Publish the user events of a settlement made on the columns."""
+        events = self.events
+        if not (events.wants(EVENT_BALANCE_CHANGED) or events.wants(EVENT_BAILOUT_GRANTED)):
+            return
+        rows, won, bailouts = rows.tolist(), won.tolist(), bailouts.tolist()
+        balances, wins, losses = table.wrestlebucks, table.wins, table.losses
+        for name, row, did_win, bailout in zip(names, rows, won, bailouts):
+            if did_win:
+                events.publish(EVENT_BALANCE_CHANGED, name=name,
+                               wrestlebucks=balances[row], wins=wins[row])
+            elif bailout:
+                events.publish(EVENT_BALANCE_CHANGED, name=name,
+                               wrestlebucks=balances[row], losses=losses[row])
+            else:
+                events.publish(EVENT_BALANCE_CHANGED, name=name, losses=losses[row])
+            if bailout:
+                events.publish(EVENT_BAILOUT_GRANTED, name=name, amount=bailout,
+                               wrestlebucks=balances[row])
+
+
+def main():
+    """Replay a command file or stdin without the GUI (see SaltyBetBatch)."""
+    # Imported here because SaltyBetBatch itself imports this module
+    from SaltyBetBatch import main as run_batch
+    return run_batch()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Salty Bet Batch - Replay a stream of commands without the GUI.
+
+Each line is one command, as NDJSON or CSV:
+
+    {"cmd": "add", "name": "Hulk"}                               add,Hulk
+    {"cmd": "open", "match": "m1", "type": "One on One",
+     "payout": "fixed", "wrestlers": ["Andre", "Hogan"]}         open,m1,One on One,fixed,Andre,Hogan
+    {"cmd": "bet", "match": "m1", "user": "Hulk",
+     "wrestler": "Hogan", "amount": 100}                         bet,m1,Hulk,Hogan,100
+    {"cmd": "resolve", "match": "m1", "winner": "Hogan"}         resolve,m1,Hogan
+
+`match` is a label chosen by the file, so replays do not depend on the
+match IDs already in the history; bets and results may leave it out to
+use the match opened last. The payout mode may be left empty for fixed
+payouts. Blank lines and CSV rows starting with '#' are skipped.
+
+Commands run in batches that share one save (see SaltyBet.defer_commits),
+and a failing line is reported on stderr without stopping the replay.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+
+from SaltyBet import PAYOUT_FIXED, SaltyBet
+from SaltyBetPersistence import DURABILITY_MODES, DURABLE
+from SaltyBetStorage import STORAGE_BY_SUFFIX
+
+try:
+    import numpy as np
+except ImportError:  # Replays still work, just without columnar settlement
+    np = None
+
+FORMATS = ('ndjson', 'csv')
+COMMANDS = ('add', 'open', 'bet', 'resolve')
+
+# Lines per batch: every batch ends with one save
+DEFAULT_BATCH_SIZE = 100000
+
+# Fields of each command, in CSV column order; a '*' field takes the rest
+CSV_FIELDS = {
+    'add': ('name', ),
+    'open': ('match', 'type', 'payout', '*wrestlers'),
+    'bet': ('match', 'user', 'wrestler', 'amount'),
+    'resolve': ('match', 'winner')
+}
+
+
+def read_ndjson(lines):
+    """Yield (line number, command record) for each NDJSON line."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, ValueError(f"invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            record = ValueError("expected a JSON object")
+        yield number, record
+
+
+def read_csv(lines):
+    """Yield (line number, command record) for each CSV row."""
+    reader = csv.reader(lines)
+    for row in reader:
+        number = reader.line_num
+        if not row or not ''.join(row).strip() or row[0].startswith('#'):
+            continue
+        command, values = row[0].strip(), row[1:]
+        fields = CSV_FIELDS.get(command)
+        if fields is None:
+            yield number, {'cmd': command}
+            continue
+        record = {'cmd': command}
+        for position, field in enumerate(fields):
+            if field.startswith('*'):
+                record[field[1:]] = values[position:]
+            elif position < len(values):
+                record[field] = values[position]
+        if len(values) > len(fields) and not fields[-1].startswith('*'):
+            record = ValueError(f"too many fields for '{command}'")
+        yield number, record
+
+
+READERS = {'ndjson': read_ndjson, 'csv': read_csv}
+
+
+class BatchRunner:
+    """Runs command records through a SaltyBet game in batches."""
+
+    def __init__(self, salty_bet, batch_size=DEFAULT_BATCH_SIZE, errors=None):
+        self.salty_bet = salty_bet
+        self.batch_size = max(1, batch_size)
+        self.errors = errors if errors is not None else sys.stderr
+        self.matches = {}  # {label: Match} opened by this run, not settled yet
+        self.last_label = None  # Label of the match opened last
+        self.counts = dict.fromkeys(COMMANDS, 0)  # Commands that succeeded
+        self.failed = 0
+        self.saves = 0
+        self.failed_saves = 0
+        self._handlers = {'add': self.add, 'open': self.open, 'resolve': self.resolve}
+        # Bets waiting for flush_bets(), the lines they came from and their match
+        self._bets = []
+        self._bet_lines = []
+        self._bets_match = None
+
+    def run(self, records):
+        """Run (line number, record) pairs, saving once per batch."""
+        records = iter(records)
+        last_number = 0
+        while True:
+            done = 0
+            with self.salty_bet.defer_commits() as commit:
+                # Batched event subscribers also get one list per batch
+                with self.salty_bet.events.batch():
+                    for number, record in records:
+                        last_number = number
+                        if type(record) is dict and record.get('cmd') == 'bet':
+                            self.queue_bet(number, record)
+                        else:
+                            self.flush_bets()
+                            self.run_one(number, record)
+                        done += 1
+                        if done == self.batch_size:
+                            break
+                    self.flush_bets()
+            if commit.needed:
+                self.saves += 1
+                if commit.saved is False:
+                    self.failed_saves += 1
+                    self.report(last_number, "saving the batch ending here failed")
+            if done < self.batch_size:
+                return
+
+    def run_one(self, number, record):
+        """Run one command, reporting it if it fails."""
+        try:
+            if isinstance(record, Exception):
+                raise record
+            command = record.get('cmd')
+            handler = self._handlers.get(command)
+            if handler is None:
+                raise ValueError(f"unknown command {command!r}")
+            handler(record)
+        except (ValueError, TypeError, KeyError) as e:
+            self.fail(number, e)
+        else:
+            self.counts[command] += 1
+
+    def fail(self, number, error):
+        self.failed += 1
+        self.report(number, error.args[0] if error.args else str(error))
+
+    def report(self, number, message):
+        print(f"Line {number}: {message}", file=self.errors)
+
+    @staticmethod
+    def _field(record, name):
+        value = record.get(name)
+        if value is None or value == '':
+            raise ValueError(f"missing '{name}'")
+        return value
+
+    def _match(self, record):
+        """Get the open match a record refers to."""
+        label = record.get('match')
+        if label is None or label == '':
+            label = self.last_label
+        match = self.matches.get(str(label))
+        if match is None:
+            raise ValueError(f"no open match '{label}'" if label is not None
+                             else "no match is open")
+        return str(label), match
+
+    def add(self, record):
+        name = self._field(record, 'name')
+        if not isinstance(name, str):
+            raise ValueError(f"invalid name {name!r}")
+        if name in self.salty_bet.users:
+            raise ValueError(f"User '{name}' already exists!")
+        self.salty_bet.add_user(name)
+
+    def open(self, record):
+        label = str(self._field(record, 'match'))
+        if label in self.matches:
+            raise ValueError(f"match '{label}' is already open")
+        match_type = self._field(record, 'type')
+        if not isinstance(match_type, str):
+            raise ValueError(f"invalid type {match_type!r}")
+        payout = record.get('payout') or PAYOUT_FIXED
+        if not isinstance(payout, str):
+            raise ValueError(f"invalid payout {payout!r}")
+        wrestlers = record.get('wrestlers')
+        if not isinstance(wrestlers, list) or not all(
+                isinstance(w, str) for w in wrestlers):
+            raise ValueError("'wrestlers' must be a list of names")
+        match = self.salty_bet.open_match(match_type, wrestlers, payout)
+        self.matches[label] = match
+        self.last_label = label
+
+    def queue_bet(self, number, record):
+        """Check a bet and queue it; consecutive bets on a match are placed
+        together by flush_bets()."""
+        # The hot path: most lines of a replay are bets
+        user = record.get('user')
+        wrestler = record.get('wrestler')
+        amount = record.get('amount')
+        try:
+            label, match = self._match(record)
+            if type(amount) is not int:
+                if amount is None or amount == '':
+                    raise ValueError("missing 'amount'")
+                try:
+                    amount = int(amount) if isinstance(amount, str) else None
+                except ValueError:
+                    amount = None
+                if amount is None:
+                    raise ValueError(f"invalid amount {record.get('amount')!r}")
+            if not user or not wrestler:
+                raise ValueError(f"missing '{'wrestler' if user else 'user'}'")
+            if type(user) is not str or type(wrestler) is not str:
+                raise ValueError("'user' and 'wrestler' must be strings")
+        except ValueError as e:
+            # Report queued bets first so errors come out in line order
+            self.flush_bets()
+            self.fail(number, e)
+            return
+        if match is not self._bets_match:
+            self.flush_bets()
+            self._bets_match = match
+        self._bets.append((user, wrestler, amount))
+        self._bet_lines.append(number)
+
+    def flush_bets(self):
+        """Place the queued bets in one call."""
+        if not self._bets:
+            return
+        bets, lines, match = self._bets, self._bet_lines, self._bets_match
+        self._bets, self._bet_lines, self._bets_match = [], [], None
+        try:
+            rejected = self.salty_bet.place_bets(bets, match.id)
+        except ValueError as e:
+            rejected = [(position, str(e)) for position in range(len(bets))]
+        for position, message in rejected:
+            self.fail(lines[position], ValueError(message))
+        self.counts['bet'] += len(bets) - len(rejected)
+
+    def resolve(self, record):
+        label, match = self._match(record)
+        winner = self._field(record, 'winner')
+        if not isinstance(winner, str):
+            raise ValueError(f"invalid winner {winner!r}")
+        self.salty_bet.resolve_match(winner, match.id)
+        del self.matches[label]
+
+    def summary(self):
+        """Describe what the run did in one line."""
+        counts = ", ".join(f"{command} {count}" for command, count in self.counts.items())
+        return (f"{counts}; {self.failed} failed; {self.saves} saves"
+                + (f" ({self.failed_saves} failed)" if self.failed_saves else ""))
+
+
+def detect_format(path):
+    """Guess the command format from a file name (stdin is NDJSON)."""
+    return 'csv' if path != '-' and Path(path).suffix.lower() == '.csv' else 'ndjson'
+
+
+def main(argv=None):
+    """Replay a command file (or stdin) from the command line."""
+    parser = argparse.ArgumentParser(description="Replay Salty Bet commands")
+    parser.add_argument('commands', nargs='?', default='-',
+                        help="NDJSON or CSV command file, or - for stdin")
+    parser.add_argument('--format', choices=FORMATS, default=None,
+                        help="Defaults to csv for .csv files, else ndjson")
+    parser.add_argument('--data-file', default=None)
+    parser.add_argument('--storage', default=None,
+                        choices=['json', 'ledger', 'sqlite', 'binary'])
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Lines per batch; each batch is saved once")
+    parser.add_argument('--durability', choices=DURABILITY_MODES, default=DURABLE,
+                        help="durable: fsync every save; fast: let the OS flush")
+    parser.add_argument('--cache-size', type=int, default=None, metavar='USERS',
+                        help="Keep at most this many users in memory (sqlite storage)")
+    parser.add_argument('--shared', action='store_true',
+                        help="Share the ledger with other processes (ledger storage)")
+    args = parser.parse_args(argv)
+
+    command_format = args.format or detect_format(args.commands)
+    # Settle on the columnar user table unless users live in SQLite
+    kind = args.storage or STORAGE_BY_SUFFIX.get(
+        Path(args.data_file or '').suffix.lower())
+    try:
+        salty_bet = SaltyBet(args.data_file, args.storage,
+                             columnar=np is not None and kind != 'sqlite',
+                             verbose=False, durability=args.durability,
+                             cache_size=args.cache_size, shared=args.shared)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    runner = BatchRunner(salty_bet, args.batch_size)
+    started = time.perf_counter()
+    try:
+        if args.commands == '-':
+            runner.run(READERS[command_format](sys.stdin))
+        else:
+            with open(args.commands, newline='', encoding='utf-8') as f:
+                runner.run(READERS[command_format](f))
+    except OSError as e:
+        print(f"Error reading {args.commands}: {e}")
+        return 1
+    finally:
+        salty_bet.close()
+    elapsed = time.perf_counter() - started
+
+    lines = sum(runner.counts.values()) + runner.failed
+    print(f"Ran {lines} commands in {elapsed:.2f} s "
+          f"({lines / elapsed if elapsed else 0:.0f}/s): {runner.summary()}")
+    return 1 if runner.failed or runner.failed_saves else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Salty Bet Binary - A compact, versioned binary user file (.sbu).
+
+Layout (all integers little-endian):
+
+    header   32 bytes: magic b'SBUF', format version (u16), flags (u16),
+             user count (u64), name table size in bytes (u64), CRC-32 of
+             everything after the header (u32), then the width in bytes
+             (1, 2, 4 or 8) of each of the three columns and a zero byte
+    names    UTF-8 user names separated by NUL bytes
+    columns  wrestlebucks, wins and losses, each `count` signed ints of
+             its width; every column is stored as narrow as its values allow
+
+The name table and every column are zero-padded to a multiple of 8 bytes,
+so each column starts on an 8-byte boundary and can be read with
+array.frombytes or numpy.frombuffer(data, '<i2', count, offset) without
+parsing a record at a time.
+"""
+
+import argparse
+import json
+import struct
+import sys
+import zlib
+from array import array
+
+from SaltyBetPersistence import atomic_write
+
+MAGIC = b'SBUF'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHQQI3Bx')
+COLUMNS = ('wrestlebucks', 'wins', 'losses')
+
+# array typecode for signed ints of each width on this platform
+TYPECODES = {array(code).itemsize: code for code in 'qlihb'}
+WIDTHS = (1, 2, 4, 8)
+
+
+def _padded(size):
+    """Round a byte count up to the next multiple of 8."""
+    return (size + 7) & ~7
+
+
+def _width(column):
+    """Get the fewest bytes that hold every value of a column."""
+    if not len(column):
+        return 1
+    low, high = min(column), max(column)
+    for width in WIDTHS:
+        limit = 1 << (8 * width - 1)
+        if -limit <= low and high < limit:
+            return width
+    raise ValueError("User values must fit in 64 bits")
+
+
+def columns_from_records(records):
+    """Turn user records (from User.to_dict()) into (names, wrestlebucks,
+    wins, losses) columns."""
+    names = []
+    wrestlebucks, wins, losses = array('q'), array('q'), array('q')
+    for record in records:
+        names.append(record['name'])
+        wrestlebucks.append(record['wrestlebucks'])
+        wins.append(record['wins'])
+        losses.append(record['losses'])
+    return names, wrestlebucks, wins, losses
+
+
+def records_from_columns(names, wrestlebucks, wins, losses):
+    """Turn columns back into {name: record}, the shape JSON files use."""
+    return {
+        name: {'name': name, 'wrestlebucks': balance, 'wins': won, 'losses': lost}
+        for name, balance, won, lost in zip(names, wrestlebucks.tolist(),
+                                            wins.tolist(), losses.tolist())
+    }
+
+
+def encode_user_file(names, wrestlebucks, wins, losses):
+    """Encode user columns as the bytes of a user file."""
+    count = len(names)
+    text = '\0'.join(names)
+    if text.count('\0') != max(count - 1, 0):
+        raise ValueError("User names cannot contain NUL characters")
+    name_table = text.encode('utf-8')
+
+    parts = [name_table, bytes(_padded(len(name_table)) - len(name_table))]
+    widths = []
+    for column in (wrestlebucks, wins, losses):
+        if len(column) != count:
+            raise ValueError("User columns must all have one value per name")
+        width = _width(column)
+        packed = array(TYPECODES[width], column)
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        packed = packed.tobytes()
+        parts.append(packed + bytes(_padded(len(packed)) - len(packed)))
+        widths.append(width)
+    body = b''.join(parts)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, count, len(name_table),
+                         zlib.crc32(body), *widths)
+    return header + body
+
+
+def decode_user_file(data):
+    """Decode the bytes of a user file into (names, wrestlebucks, wins,
+    losses), with each number column an array('q').
+
+    Raises ValueError if the data is not a user file this version reads.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("User file is truncated")
+    magic, version, _, count, names_size, checksum, *widths = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a Salty Bet user file")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unsupported user file version {version} "
+                         f"(this version reads up to {FORMAT_VERSION})")
+    if any(width not in WIDTHS for width in widths):
+        raise ValueError("User file has an invalid column width")
+    starts = [HEADER.size + _padded(names_size)]
+    for width in widths:
+        starts.append(starts[-1] + _padded(width * count))
+    if len(data) != starts[-1]:
+        raise ValueError("User file is truncated or has trailing data")
+    body = memoryview(data)[HEADER.size:]
+    if zlib.crc32(body) != checksum:
+        raise ValueError("User file checksum does not match")
+
+    names = (bytes(body[:names_size]).decode('utf-8').split('\0')
+             if count else [])
+    if len(names) != count:
+        raise ValueError("User file name table does not match the user count")
+    columns = []
+    for width, start in zip(widths, starts):
+        column = array(TYPECODES[width])
+        column.frombytes(data[start:start + width * count])
+        if sys.byteorder == 'big':
+            column.byteswap()
+        # Widen to 64 bits so values can grow once they are loaded
+        columns.append(column if width == 8 else array('q', column))
+    return (names, *columns)
+
+
+def write_user_file(path, names, wrestlebucks, wins, losses, durable=True):
+    """Write a user file through a temp file swapped in with os.replace, so
+    a crash never leaves a half-written file behind."""
+    data = encode_user_file(names, wrestlebucks, wins, losses)
+    atomic_write(path, lambda f: f.write(data), binary=True, durable=durable)
+
+
+def read_user_file(path):
+    """Read a user file as (names, wrestlebucks, wins, losses)."""
+    with open(path, 'rb') as f:
+        return decode_user_file(f.read())
+
+
+def json_to_binary(json_path, binary_path):
+    """Convert a JSON user file into a binary one; returns the user count."""
+    with open(json_path, 'r') as f:
+        users_data = json.load(f)
+    write_user_file(binary_path, *columns_from_records(users_data.values()))
+    return len(users_data)
+
+
+def binary_to_json(binary_path, json_path):
+    """Export a binary user file as JSON in the usual layout; returns the
+    user count."""
+    users_data = records_from_columns(*read_user_file(binary_path))
+    atomic_write(json_path, lambda f: json.dump(users_data, f, indent=2))
+    return len(users_data)
+
+
+def main():
+    """Convert user files between JSON and binary from the command line."""
+    parser = argparse.ArgumentParser(description="Convert Salty Bet user files")
+    parser.add_argument('direction', choices=['import', 'export'],
+                        help="import: JSON to binary; export: binary to JSON")
+    parser.add_argument('source')
+    parser.add_argument('target')
+    args = parser.parse_args()
+
+    convert = json_to_binary if args.direction == 'import' else binary_to_json
+    try:
+        count = convert(args.source, args.target)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    print(f"Wrote {count} users to {args.target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Salty Bet Events - A small publish/subscribe bus for changes to the game.
+
+SaltyBet publishes an Event for every change, carrying only the fields that
+changed, so views can keep their own state current in O(changes) instead
+of re-reading every user. Subscribers get events one at a time as they
+happen (synchronous) or as lists when a batch such as a whole match
+settlement ends (batched).
+"""
+
+import threading
+from contextlib import contextmanager
+
+EVENT_USER_ADDED = 'user_added'  # name, wrestlebucks
+EVENT_BET_PLACED = 'bet_placed'  # match_id, name, wrestler, amount
+EVENT_MATCH_OPENED = 'match_opened'  # match_id, type, wrestlers, payout_mode
+# match_id, winner, bets, total_wagered, total_paid, total_bailouts, refunded
+EVENT_MATCH_SETTLED = 'match_settled'
+EVENT_BALANCE_CHANGED = 'balance_changed'  # name plus the changed wrestlebucks/wins/losses
+EVENT_BAILOUT_GRANTED = 'bailout_granted'  # name, amount, wrestlebucks
+
+EVENT_TYPES = (EVENT_USER_ADDED, EVENT_BET_PLACED, EVENT_MATCH_OPENED, EVENT_MATCH_SETTLED,
+               EVENT_BALANCE_CHANGED, EVENT_BAILOUT_GRANTED)
+
+
+class Event:
+    """One change: its type and a dict of the fields that changed."""
+
+    __slots__ = ('type', 'fields')
+
+    def __init__(self, event_type, fields):
+        self.type = event_type
+        self.fields = fields
+
+    def __repr__(self):
+        return f"Event({self.type!r}, {self.fields!r})"
+
+
+class Subscription:
+    """A subscriber registered with EventBus.subscribe()."""
+
+    __slots__ = ('bus', 'callback', 'types', 'batched')
+
+    def __init__(self, bus, callback, types, batched):
+        self.bus = bus
+        self.callback = callback
+        self.types = types  # frozenset of event types, or None for all
+        self.batched = batched
+
+    def wants(self, event_type):
+        return self.types is None or event_type in self.types
+
+    def cancel(self):
+        """Stop receiving events."""
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """Delivers published events to synchronous and batched subscribers.
+
+    Synchronous subscribers are called on the publishing thread, possibly
+    while SaltyBet holds user locks, so they should be quick and must not
+    call back into SaltyBet. Batched subscribers get a list of events when
+    the outermost batch() on the publishing thread ends, or a list of one
+    event when nothing is being batched.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = []
+        self._by_type = {}  # {event type: (sync subscriptions, batched ones)}
+        self._local = threading.local()  # Events held by this thread's batch
+
+    def subscribe(self, callback, types=None, batched=False):
+        """Call `callback` with each event (or each list of events if
+        batched) of the given types, or of every type when types is None.
+        Returns a Subscription."""
+        if types is not None:
+            types = frozenset(types)
+            unknown = types.difference(EVENT_TYPES)
+            if unknown:
+                raise ValueError(f"Unknown event types: {', '.join(sorted(unknown))}")
+        subscription = Subscription(self, callback, types, batched)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+            self._reindex()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscription (no error if it is already gone)."""
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions
+                                   if s is not subscription]
+            self._reindex()
+
+    def _reindex(self):
+        """Rebuild the per-type lists publish() reads without locking."""
+        self._by_type = {
+            event_type: (
+                [s for s in self._subscriptions
+                 if not s.batched and s.wants(event_type)],
+                [s for s in self._subscriptions
+                 if s.batched and s.wants(event_type)])
+            for event_type in EVENT_TYPES
+        }
+
+    def wants(self, event_type):
+        """Whether anyone listens for a type, so publishers can skip work."""
+        subscribers = self._by_type.get(event_type)
+        return bool(subscribers and (subscribers[0] or subscribers[1]))
+
+    def publish(self, event_type, **fields):
+        """Publish an event to everyone subscribed to its type."""
+        sync, batched = self._by_type.get(event_type, ((), ()))
+        if not sync and not batched:
+            return
+        event = Event(event_type, fields)
+        for subscription in sync:
+            self._call(subscription, event)
+        if batched:
+            pending = getattr(self._local, 'pending', None)
+            if pending is not None:
+                pending.append(event)
+            else:
+                for subscription in batched:
+                    self._call(subscription, [event])
+
+    @contextmanager
+    def batch(self):
+        """Hold events for batched subscribers until the block ends.
+
+        Batches nest; only the outermost one delivers.
+        """
+        local = self._local
+        if getattr(local, 'pending', None) is not None:
+            yield
+            return
+        local.pending = []
+        try:
+            yield
+        finally:
+            events, local.pending = local.pending, None
+            if events:
+                self._deliver(events)
+
+    def _deliver(self, events):
+        """Hand each batched subscriber the events it subscribed to."""
+        for subscription in self._subscriptions:
+            if not subscription.batched:
+                continue
+            selected = (events if subscription.types is None else
+                        [e for e in events if e.type in subscription.types])
+            if selected:
+                self._call(subscription, selected)
+
+    @staticmethod
+    def _call(subscription, payload):
+        """Call a subscriber without letting its errors break the game."""
+        try:
+            subscription.callback(payload)
+        except Exception as e:
+            print(f"Error in event subscriber {subscription.callback!r}: {e}")
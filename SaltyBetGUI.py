@@ -3,10 +3,34 @@
 Salty Bet GUI - A GUI version of the wrestling betting game using tkinter.
 """
 
+import queue
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import random
-from SaltyBet import SaltyBet
+from SaltyBet import (SaltyBet, MATCH_TYPES, MATCH_OPEN, PAYOUT_FIXED,
+                      PAYOUT_PARIMUTUEL, parse_card)
+from SaltyBetEvents import EVENT_BALANCE_CHANGED, EVENT_USER_ADDED
+from SaltyBetLeaderboard import LEADERBOARD_MIN_GAMES
+from SaltyBetPersistence import SAVE_FAILED, SAVE_PENDING, SAVE_SAVED
+from SaltyBetRatings import fair_odds
+
+# Users shown on each board of the statistics tab
+LEADERBOARD_SIZE = 10
+
+# How often the status bar checks on background saves
+SAVE_POLL_MS = 200
+
+# Matching users offered by the betting tab's type-ahead
+USER_SUGGESTIONS = 20
+
+# Rows per page of the users table, and the user column behind each heading
+USERS_PAGE_SIZE = 100
+USER_TREE_COLUMNS = {
+    'Name': 'name',
+    'WrestleBucks': 'wrestlebucks',
+    'Wins': 'wins',
+    'Losses': 'losses',
+    'Win Rate': 'win_rate'
+}
 
 
 class SaltyBetGUI:
@@ -18,19 +42,42 @@ class SaltyBetGUI:
         self.root.geometry("800x600")
         self.root.configure(bg='#2c3e50')
 
-        # Initialize the backend
+        # Initialize the backend; saves run on a background thread and
+        # report back through a queue polled from the Tk loop
         self.salty_bet = SaltyBet()
+        self._save_results = queue.Queue()
+        self.salty_bet.start_background_saves(self._save_results.put)
 
         # Show data file location
         data_location = self.salty_bet.get_data_file_location()
         print(f"Data file location: {data_location}")
 
+        # {combobox label: Match} for the unsettled matches
+        self._match_choices = {}
+        # {match_id: StringVar} holding the winners entered on the card tab
+        self._card_winner_vars = {}
+
+        # The users table shows one sorted page; only users named in change
+        # events can make the shown rows out of date
+        self._users_sort = ('name', False)  # (column, descending)
+        self._users_page = 0
+        self._users_rows = []  # Values of the rows currently shown
+        self._users_stale = True
+        self._stats_stale = True
+        self._changed_users = set()
+        self.salty_bet.events.subscribe(self._note_user_events,
+                                        (EVENT_USER_ADDED, EVENT_BALANCE_CHANGED),
+                                        batched=True)
+
         # Create main interface
         self.create_main_interface()
 
         # Update display
         self.update_display()
 
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.root.after(SAVE_POLL_MS, self.poll_saves)
+
     def create_main_interface(self):
         """Create the main GUI interface."""
         # Main title
@@ -59,12 +106,14 @@ class SaltyBetGUI:
         style.configure('TNotebook.Tab', font=('Arial', 10, 'bold'))
 
         self.notebook.pack(fill='both', expand=True, padx=10, pady=5)
+        self.notebook.bind('<<NotebookTabChanged>>', self.update_visible_tab)
 
         # Create tabs
         self.create_users_tab()
         self.create_match_tab()
         self.create_betting_tab()
         self.create_resolution_tab()
+        self.create_card_tab()
         self.create_stats_tab()
 
         # Create status bar
@@ -72,7 +121,7 @@ class SaltyBetGUI:
 
     def create_users_tab(self):
         """Create the users management tab."""
-        users_frame = ttk.Frame(self.notebook)
+        users_frame = self.users_frame = ttk.Frame(self.notebook)
         self.notebook.add(users_frame, text="👥 Users")
 
         # Add user section
@@ -117,8 +166,11 @@ class SaltyBetGUI:
                                        show='headings',
                                        height=10)
 
+        # Clicking a heading sorts every user (not just this page) by it
         for col in columns:
-            self.users_tree.heading(col, text=col)
+            self.users_tree.heading(col,
+                                    text=col,
+                                    command=lambda col=col: self.sort_users_by(col))
             self.users_tree.column(col, width=120, anchor='center')
 
         # Scrollbar for users tree
@@ -127,8 +179,28 @@ class SaltyBetGUI:
                                         command=self.users_tree.yview)
         self.users_tree.configure(yscrollcommand=users_scrollbar.set)
 
+        # Page controls
+        pager_frame = tk.Frame(users_list_frame, bg='#34495e')
+        pager_frame.pack(side='bottom', fill='x')
+
+        tk.Button(pager_frame,
+                  text="◀ Previous",
+                  command=lambda: self.change_users_page(-1),
+                  font=('Arial', 8)).pack(side='left', padx=5, pady=2)
+        self.users_page_label = tk.Label(pager_frame,
+                                         text="",
+                                         bg='#34495e',
+                                         fg='white',
+                                         font=('Arial', 8))
+        self.users_page_label.pack(side='left', expand=True)
+        tk.Button(pager_frame,
+                  text="Next ▶",
+                  command=lambda: self.change_users_page(1),
+                  font=('Arial', 8)).pack(side='right', padx=5, pady=2)
+
         self.users_tree.pack(side='left', fill='both', expand=True)
         users_scrollbar.pack(side='right', fill='y')
+        self._update_users_headings()
 
     def create_match_tab(self):
         """Create the match setup tab."""
@@ -144,10 +216,7 @@ class SaltyBetGUI:
         match_type_frame.pack(fill='x', padx=10, pady=10)
 
         self.match_type_var = tk.StringVar(value="One on One")
-        match_types = [
-            "One on One", "Triple Threat", "Fatal 4 Way", "Five Way",
-            "Six Way", "Seven Way", "Eight Way"
-        ]
+        match_types = list(MATCH_TYPES)
 
         match_type_combo = ttk.Combobox(match_type_frame,
                                         textvariable=self.match_type_var,
@@ -157,6 +226,16 @@ class SaltyBetGUI:
                                         font=('Arial', 9))
         match_type_combo.pack(padx=10, pady=5)
 
+        # Winners split the whole pool instead of getting double their bet
+        self.parimutuel_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(match_type_frame,
+                       text="Parimutuel payouts (winners split the pool)",
+                       variable=self.parimutuel_var,
+                       bg='#34495e',
+                       fg='white',
+                       selectcolor='#2c3e50',
+                       font=('Arial', 9)).pack(padx=10, pady=5)
+
         # Wrestlers input section
         wrestlers_frame = tk.LabelFrame(match_frame,
                                         text="Enter Wrestlers/Teams",
@@ -180,7 +259,7 @@ class SaltyBetGUI:
 
         # Current match display
         self.current_match_label = tk.Label(match_frame,
-                                            text="No match set up",
+                                            text="No matches set up",
                                             font=('Arial', 10),
                                             bg='#34495e',
                                             fg='#ecf0f1')
@@ -196,6 +275,25 @@ class SaltyBetGUI:
         betting_frame = ttk.Frame(self.notebook)
         self.notebook.add(betting_frame, text="💰 Place Bets")
 
+        # Match selection
+        betting_match_frame = tk.LabelFrame(betting_frame,
+                                            text="Select Match",
+                                            font=('Arial', 10, 'bold'),
+                                            bg='#34495e',
+                                            fg='white')
+        betting_match_frame.pack(fill='x', padx=10, pady=10)
+
+        self.betting_match_var = tk.StringVar()
+        self.betting_match_combo = ttk.Combobox(
+            betting_match_frame,
+            textvariable=self.betting_match_var,
+            state='readonly',
+            width=50,
+            font=('Arial', 9))
+        self.betting_match_combo.pack(side='left', padx=5, pady=5)
+        self.betting_match_combo.bind('<<ComboboxSelected>>',
+                                      lambda event: self.update_display())
+
         # User selection
         user_frame = tk.LabelFrame(betting_frame,
                                    text="Select User",
@@ -214,10 +312,12 @@ class SaltyBetGUI:
         self.betting_user_combo = ttk.Combobox(
             user_frame,
             textvariable=self.betting_user_var,
-            state='readonly',
             width=20,
             font=('Arial', 9))
         self.betting_user_combo.pack(side='left', padx=5)
+        # Type-ahead: the dropdown only ever holds the best matches so far
+        self.betting_user_combo.bind('<KeyRelease>', self.suggest_users)
+        self.betting_user_combo.bind('<Return>', self.accept_user_suggestion)
 
         # Wrestler selection
         wrestler_frame = tk.LabelFrame(betting_frame,
@@ -302,6 +402,33 @@ class SaltyBetGUI:
         resolution_frame = ttk.Frame(self.notebook)
         self.notebook.add(resolution_frame, text="🏆 Resolve Match")
 
+        # Match selection
+        resolve_match_frame = tk.LabelFrame(resolution_frame,
+                                            text="Select Match",
+                                            font=('Arial', 10, 'bold'),
+                                            bg='#34495e',
+                                            fg='white')
+        resolve_match_frame.pack(fill='x', padx=10, pady=10)
+
+        self.resolve_match_var = tk.StringVar()
+        self.resolve_match_combo = ttk.Combobox(
+            resolve_match_frame,
+            textvariable=self.resolve_match_var,
+            state='readonly',
+            width=50,
+            font=('Arial', 9))
+        self.resolve_match_combo.pack(side='left', padx=5, pady=5)
+        self.resolve_match_combo.bind('<<ComboboxSelected>>',
+                                      self.update_resolution_display)
+
+        lock_btn = tk.Button(resolve_match_frame,
+                             text="Lock Betting",
+                             command=self.lock_match_gui,
+                             bg='#f39c12',
+                             fg='white',
+                             font=('Arial', 9, 'bold'))
+        lock_btn.pack(side='left', padx=5)
+
         # Winner selection
         winner_frame = tk.LabelFrame(resolution_frame,
                                      text="Select Winner",
@@ -348,9 +475,69 @@ class SaltyBetGUI:
                                                       font=('Arial', 9))
         self.results_text.pack(fill='both', expand=True, padx=5, pady=5)
 
+    def create_card_tab(self):
+        """Create the event card tab (open a whole card, enter all results)."""
+        card_frame = ttk.Frame(self.notebook)
+        self.notebook.add(card_frame, text="📋 Event Card")
+
+        # Card entry, one match per line
+        entry_frame = tk.LabelFrame(card_frame,
+                                    text="Card (one match per line, e.g. "
+                                    "One on One: Hulk Hogan, Randy Savage)",
+                                    font=('Arial', 10, 'bold'),
+                                    bg='#34495e',
+                                    fg='white')
+        entry_frame.pack(fill='x', padx=10, pady=10)
+
+        self.card_text = tk.Text(entry_frame, height=5, font=('Arial', 9))
+        self.card_text.pack(fill='x', padx=5, pady=5)
+
+        self.card_parimutuel_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(entry_frame,
+                       text="Parimutuel payouts (winners split the pool)",
+                       variable=self.card_parimutuel_var,
+                       bg='#34495e',
+                       fg='white',
+                       selectcolor='#2c3e50',
+                       font=('Arial', 9)).pack(side='left', padx=5, pady=5)
+
+        open_card_btn = tk.Button(entry_frame,
+                                  text="Open Card",
+                                  command=self.open_card_gui,
+                                  bg='#e74c3c',
+                                  fg='white',
+                                  font=('Arial', 9, 'bold'))
+        open_card_btn.pack(side='right', padx=5, pady=5)
+
+        # A winner picker for every unsettled match
+        winners_frame = tk.LabelFrame(card_frame,
+                                      text="Results",
+                                      font=('Arial', 10, 'bold'),
+                                      bg='#34495e',
+                                      fg='white')
+        winners_frame.pack(fill='x', padx=10, pady=10)
+
+        self.card_winners_frame = tk.Frame(winners_frame, bg='#34495e')
+        self.card_winners_frame.pack(fill='x', padx=5, pady=5)
+
+        resolve_card_btn = tk.Button(card_frame,
+                                     text="Resolve Card",
+                                     command=self.resolve_card_gui,
+                                     bg='#e74c3c',
+                                     fg='white',
+                                     font=('Arial', 10, 'bold'))
+        resolve_card_btn.pack(pady=5)
+
+        self.card_results_text = scrolledtext.ScrolledText(card_frame,
+                                                           height=6,
+                                                           bg='#2c3e50',
+                                                           fg='white',
+                                                           font=('Arial', 9))
+        self.card_results_text.pack(fill='both', expand=True, padx=10, pady=5)
+
     def create_stats_tab(self):
         """Create the statistics tab."""
-        stats_frame = ttk.Frame(self.notebook)
+        stats_frame = self.stats_frame = ttk.Frame(self.notebook)
         self.notebook.add(stats_frame, text="📊 Statistics")
 
         # Stats display
@@ -384,6 +571,34 @@ class SaltyBetGUI:
                                      font=('Arial', 8))
         self.status_label.pack(side='left', padx=5, pady=2)
 
+        self.save_status_label = tk.Label(status_frame,
+                                          text="",
+                                          bg='#34495e',
+                                          fg='#ecf0f1',
+                                          font=('Arial', 8))
+        self.save_status_label.pack(side='right', padx=5, pady=2)
+
+    def poll_saves(self):
+        """Show the state of background saves in the status bar."""
+        failed = False
+        try:
+            while True:
+                failed = not self._save_results.get_nowait() or failed
+        except queue.Empty:
+            pass
+
+        saver = self.salty_bet.saver
+        if saver is not None:
+            if saver.state == SAVE_PENDING:
+                self.save_status_label.config(text="Saving...", fg='#f39c12')
+            elif saver.state == SAVE_FAILED or failed:
+                self.save_status_label.config(
+                    text="Save failed - your progress may be lost!", fg='#e74c3c')
+            elif saver.state == SAVE_SAVED:
+                self.save_status_label.config(text="All changes saved",
+                                              fg='#2ecc71')
+        self.root.after(SAVE_POLL_MS, self.poll_saves)
+
     def update_wrestler_entries(self, event=None):
         """Update wrestler entry fields based on selected match type."""
         # Clear existing entries
@@ -391,20 +606,11 @@ class SaltyBetGUI:
             widget.destroy()
 
         # Get number of wrestlers needed
-        match_type_counts = {
-            "One on One": 2,
-            "Triple Threat": 3,
-            "Fatal 4 Way": 4,
-            "Five Way": 5,
-            "Six Way": 6,
-            "Seven Way": 7,
-            "Eight Way": 8
-        }
-
-        wrestler_count = match_type_counts[self.match_type_var.get()]
-
-        # Create entry fields
+        wrestler_count = MATCH_TYPES[self.match_type_var.get()]
+
+        # Create entry fields, each with its fair odds from the ratings
         self.wrestler_entries = []
+        self.wrestler_odds_labels = []
         for i in range(wrestler_count):
             frame = tk.Frame(self.wrestler_entries_frame, bg='#34495e')
             frame.pack(fill='x', pady=2)
@@ -418,8 +624,29 @@ class SaltyBetGUI:
 
             entry = tk.Entry(frame, font=('Arial', 9), width=20)
             entry.pack(side='left', padx=5)
+            entry.bind('<KeyRelease>', self.update_fair_odds_preview)
             self.wrestler_entries.append(entry)
 
+            odds_label = tk.Label(frame,
+                                  text="",
+                                  bg='#34495e',
+                                  fg='#f1c40f',
+                                  font=('Arial', 9))
+            odds_label.pack(side='left', padx=5)
+            self.wrestler_odds_labels.append(odds_label)
+
+    def update_fair_odds_preview(self, event=None):
+        """Show each entered wrestler's win chance and fair odds."""
+        names = [entry.get().strip() for entry in self.wrestler_entries]
+        entered = [name for name in names if name]
+        chances = self.salty_bet.ratings.probabilities(entered)
+        for name, label in zip(names, self.wrestler_odds_labels):
+            if name and len(entered) > 1:
+                chance = chances[name]
+                label.config(text=f"{chance * 100:.1f}% (fair odds {fair_odds(chance):.2f}x)")
+            else:
+                label.config(text="")
+
     def add_user_gui(self):
         """Add a new user through the GUI."""
         name = self.user_name_entry.get().strip()
@@ -435,43 +662,25 @@ class SaltyBetGUI:
         else:
             messagebox.showerror("Error", f"User '{name}' already exists!")
 
-        # Check if save was successful
-        if not self.salty_bet.save_users_to_file():
-            messagebox.showwarning(
-                "Save Warning",
-                "Could not save user data. Your progress may be lost!")
-
     def setup_match_gui(self):
         """Setup a match through the GUI."""
         # Get wrestler names
-        wrestlers = []
-        for entry in self.wrestler_entries:
-            name = entry.get().strip()
-            if not name:
-                messagebox.showerror("Error",
-                                     "All wrestler names must be filled!")
-                return
-            wrestlers.append(name)
+        wrestlers = [entry.get().strip() for entry in self.wrestler_entries]
 
-        # Check for duplicates
-        if len(wrestlers) != len(set(w.lower() for w in wrestlers)):
-            messagebox.showerror("Error", "Wrestler names must be unique!")
+        # Setup match in backend (validates names and duplicates)
+        payout_mode = (PAYOUT_PARIMUTUEL
+                       if self.parimutuel_var.get() else PAYOUT_FIXED)
+        success, message = self.salty_bet.setup_match(
+            self.match_type_var.get(), wrestlers, payout_mode)
+        if not success:
+            messagebox.showerror("Error", message)
             return
 
-        # Setup match in backend
-        self.salty_bet.current_match = {
-            'type': self.match_type_var.get(),
-            'wrestlers': wrestlers
-        }
-        self.salty_bet.bets = {}
-
-        # Update display
-        match_display = " vs ".join(wrestlers)
-        self.current_match_label.config(
-            text=f"{self.match_type_var.get()}: {match_display}")
+        # Update display, selecting the new match for betting
+        self.betting_match_var.set(self.salty_bet.current_match.describe())
         self.update_display()
 
-        messagebox.showinfo("Success", "Match setup successfully!")
+        messagebox.showinfo("Success", message)
 
     def place_bet_gui(self):
         """Place a bet through the GUI."""
@@ -489,47 +698,21 @@ class SaltyBetGUI:
             messagebox.showerror("Error", "Please enter a valid number!")
             return
 
-        # Check if match is set up
-        if not self.salty_bet.current_match:
-            messagebox.showerror("Error", "No match is currently set up!")
-            return
-
-        # Check if user exists
-        if user_name not in self.salty_bet.users:
-            messagebox.showerror("Error", f"User '{user_name}' not found!")
+        match = self._selected_match(self.betting_match_var)
+        if match is None:
+            messagebox.showerror("Error", "Please select a match!")
             return
 
-        # Check if user already placed a bet
-        if user_name in self.salty_bet.bets:
-            messagebox.showerror(
-                "Error",
-                f"User '{user_name}' has already placed a bet for this match!")
-            return
-
-        # Check if wrestler is valid
-        if wrestler not in self.salty_bet.current_match['wrestlers']:
-            messagebox.showerror(
-                "Error", f"Wrestler '{wrestler}' is not in the current match!")
-            return
-
-        # Get user and place bet using backend method
-        user = self.salty_bet.users[user_name]
-        success, message = user.place_bet(amount)
-        
+        # Place bet using backend method (validates match, user and wrestler)
+        success, message = self.salty_bet.place_bet(user_name, wrestler, amount,
+                                                    match.id)
         if not success:
             messagebox.showerror("Error", message)
             return
 
-        # Record the bet in the match
-        self.salty_bet.bets[user_name] = {
-            'wrestler': wrestler,
-            'amount': amount
-        }
-
         self.bet_amount_entry.delete(0, tk.END)
         self.update_display()
-        messagebox.showinfo(
-            "Success", f"Bet of {amount} WrestleBucks placed on {wrestler}!")
+        messagebox.showinfo("Success", message)
 
     def resolve_match_gui(self):
         """Resolve a match through the GUI."""
@@ -538,54 +721,44 @@ class SaltyBetGUI:
             messagebox.showerror("Error", "Please select a winner!")
             return
 
-        if not self.salty_bet.current_match:
-            messagebox.showerror("Error", "No match to resolve!")
+        match = self._selected_match(self.resolve_match_var)
+        if match is None:
+            messagebox.showerror("Error", "Please select a match!")
             return
 
-        if not self.salty_bet.bets:
-            messagebox.showerror("Error", "No bets placed for this match!")
+        # Settle all bets in the backend
+        try:
+            result = self.salty_bet.resolve_match(winner, match.id)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
 
-        # Process bets
         results = []
         bankruptcy_messages = []
-
-        for user_name, bet_info in self.salty_bet.bets.items():
-            user = self.salty_bet.users[user_name]
-            if bet_info['wrestler'] == winner:
-                winnings = user.win_bet(bet_info['amount'])
+        for user_name, won, amount, payout, balance, bailout in result.outcomes():
+            if result.refunded:
                 results.append(
-                    f"{user_name}: Won! +{winnings} WrestleBucks (Total: {user.wrestlebucks})"
+                    f"{user_name}: Refunded {amount} WrestleBucks (Total: {balance})"
+                )
+            elif won:
+                results.append(
+                    f"{user_name}: Won! +{payout} WrestleBucks (Total: {balance})"
                 )
             else:
-                user.lose_bet()
                 results.append(
-                    f"{user_name}: Lost! WrestleBucks remain: {user.wrestlebucks}"
+                    f"{user_name}: Lost! WrestleBucks remain: {balance - bailout}"
                 )
 
-            # Check for bankruptcy and capture the message
-            if user.wrestlebucks <= 0:
-                # Generate random amount and create bankruptcy message
-                random_amount = random.randint(10, 1000)
-                user.wrestlebucks += random_amount
-                bankruptcy_message = f"\n💸 {user.name} is broke! The wrestling federation has given them {random_amount} WrestleBucks to keep them in the game!\n💰 {user.name} now has {user.wrestlebucks} WrestleBucks."
+            if bailout:
+                bankruptcy_message = f"\n💸 {user_name} is broke! The wrestling federation has given them {bailout} WrestleBucks to keep them in the game!\n💰 {user_name} now has {balance} WrestleBucks."
                 bankruptcy_messages.append(bankruptcy_message)
 
-        # Save data
-        if not self.salty_bet.save_users_to_file():
-            messagebox.showwarning(
-                "Save Warning",
-                "Could not save user data. Your progress may be lost!")
-
-        # Clear match
-        self.salty_bet.current_match = None
-        self.salty_bet.bets = {}
-        # Reset current match label in UI
-        self.current_match_label.config(text="No match set up")
-
         # Display results
         self.results_text.delete(1.0, tk.END)
         self.results_text.insert(tk.END, f"🏆 {winner} wins the match!\n\n")
+        if result.refunded:
+            self.results_text.insert(
+                tk.END, "Nobody bet on the winner, so all bets are refunded.\n")
 
         # Add bet results
         for result in results:
@@ -600,6 +773,55 @@ class SaltyBetGUI:
         self.update_display()
         messagebox.showinfo("Match Resolved", f"{winner} wins!")
 
+    def open_card_gui(self):
+        """Open every match typed into the card tab."""
+        try:
+            card = parse_card(self.card_text.get(1.0, tk.END))
+            if not card:
+                raise ValueError("Please enter at least one match!")
+            payout_mode = (PAYOUT_PARIMUTUEL
+                           if self.card_parimutuel_var.get() else PAYOUT_FIXED)
+            matches = self.salty_bet.open_card(card, payout_mode)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        self.card_text.delete(1.0, tk.END)
+        self.update_display()
+        messagebox.showinfo("Success", f"Opened {len(matches)} matches!")
+
+    def resolve_card_gui(self):
+        """Settle every match on the card tab that has a winner selected."""
+        results = {match_id: var.get()
+                   for match_id, var in self._card_winner_vars.items() if var.get()}
+        if not results:
+            messagebox.showerror("Error", "Please select at least one winner!")
+            return
+
+        # One pipeline, one save and one refresh for the whole card
+        try:
+            settled = self.salty_bet.resolve_card(results)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        self.card_results_text.delete(1.0, tk.END)
+        for result in settled:
+            summary = f"🏆 Match #{result.match.id}: {result.winner} wins"
+            if result.refunded:
+                summary += f" - {len(result)} bets refunded"
+            else:
+                summary += (f" - {len(result)} bets, {result.total_paid} "
+                            f"WrestleBucks paid out")
+            self.card_results_text.insert(tk.END, summary + "\n")
+            for user_name, bailout, balance in result.bankruptcies():
+                self.card_results_text.insert(
+                    tk.END, f"   💸 {user_name} went broke and got a {bailout} "
+                    f"WrestleBucks bailout (now {balance})\n")
+
+        self.update_display()
+        messagebox.showinfo("Card Resolved", f"Settled {len(settled)} matches!")
+
     def update_betting_options(self, event=None):
         """Update betting options when user is selected."""
         user_name = self.betting_user_var.get()
@@ -609,8 +831,9 @@ class SaltyBetGUI:
                 text=f"Current: {user.wrestlebucks} WrestleBucks")
 
         # Update wrestler options
-        if self.salty_bet.current_match:
-            wrestlers = self.salty_bet.current_match['wrestlers']
+        match = self._selected_match(self.betting_match_var)
+        if match is not None:
+            wrestlers = match.wrestlers
             self.betting_wrestler_combo['values'] = wrestlers
             # Clear selection if it's no longer valid
             if self.betting_wrestler_var.get() not in wrestlers:
@@ -622,41 +845,206 @@ class SaltyBetGUI:
             self.betting_wrestler_var.set("")
             self.betting_wrestler_combo.set("")
 
+    def lock_match_gui(self):
+        """Stop taking bets on the selected match."""
+        match = self._selected_match(self.resolve_match_var)
+        if match is None:
+            messagebox.showerror("Error", "Please select a match!")
+            return
+
+        success, message = self.salty_bet.lock_match(match.id)
+        if not success:
+            messagebox.showerror("Error", message)
+            return
+        self.update_display()
+        messagebox.showinfo("Success", message)
+
+    def _selected_match(self, match_var):
+        """Get the unsettled match chosen in a match combobox, if any."""
+        return self._match_choices.get(match_var.get())
+
+    def update_match_choices(self):
+        """Update the match comboboxes and the open matches label."""
+        matches = list(self.salty_bet.matches.values())
+        self._match_choices = {}
+        for match in matches:
+            label = match.describe()
+            if match.state != MATCH_OPEN:
+                label += f" ({match.state})"
+            self._match_choices[label] = match
+        choices = list(self._match_choices)
+
+        for combo, var in ((self.betting_match_combo, self.betting_match_var),
+                           (self.resolve_match_combo, self.resolve_match_var)):
+            combo['values'] = choices
+            # Keep the same match selected even if its label changed
+            selected = next((label for label in choices
+                             if label.split(' ', 1)[0] == var.get().split(' ', 1)[0]),
+                            None)
+            if selected is None and choices:
+                selected = choices[-1]
+            var.set(selected or "")
+            combo.set(selected or "")
+
+        if choices:
+            self.current_match_label.config(text="Open matches:\n" +
+                                            "\n".join(choices))
+        else:
+            self.current_match_label.config(text="No matches set up")
+
+    def update_card_winners(self):
+        """Show a winner picker for every unsettled match on the card tab."""
+        matches = list(self.salty_bet.matches.values())
+        if [match.id for match in matches] == list(self._card_winner_vars):
+            return  # Same matches; keep the winners already picked
+
+        for widget in self.card_winners_frame.winfo_children():
+            widget.destroy()
+        previous = self._card_winner_vars
+        self._card_winner_vars = {}
+        for match in matches:
+            row = tk.Frame(self.card_winners_frame, bg='#34495e')
+            row.pack(fill='x', pady=1)
+            tk.Label(row,
+                     text=match.describe(),
+                     bg='#34495e',
+                     fg='white',
+                     font=('Arial', 9),
+                     anchor='w').pack(side='left', fill='x', expand=True)
+            var = previous.get(match.id) or tk.StringVar()
+            ttk.Combobox(row,
+                         textvariable=var,
+                         values=match.wrestlers,
+                         state='readonly',
+                         width=20,
+                         font=('Arial', 9)).pack(side='right', padx=5)
+            self._card_winner_vars[match.id] = var
+
     def update_display(self):
         """Update all GUI displays."""
-        self.update_users_display()
+        self.update_match_choices()
+        self.update_card_winners()
+        self.update_user_choices()
         self.update_betting_display()
         self.update_resolution_display()
         # Ensure betting wrestler options reflect current match state
         self.update_betting_options()
-        self.update_stats_display()
+        # The users and stats tabs are only redrawn while they are visible
+        self._stats_stale = True
+        self.update_visible_tab()
+
+    def update_visible_tab(self, event=None):
+        """Redraw the users or stats tab if it is the one being shown."""
+        current = self.notebook.select()
+        if current == str(self.users_frame):
+            self.update_users_display()
+        elif current == str(self.stats_frame) and self._stats_stale:
+            self.update_stats_display()
+
+    def sort_users_by(self, heading):
+        """Sort the users table by a column; clicking it again flips the order."""
+        column = USER_TREE_COLUMNS[heading]
+        current, descending = self._users_sort
+        if column == current:
+            descending = not descending
+        else:
+            descending = column != 'name'  # Numbers read best first
+        self._users_sort = (column, descending)
+        self._users_page = 0
+        self._users_stale = True
+        self._update_users_headings()
+        self.update_users_display()
+
+    def _update_users_headings(self):
+        """Mark the sorted column's heading with the sort direction."""
+        column, descending = self._users_sort
+        for heading, heading_column in USER_TREE_COLUMNS.items():
+            arrow = (" ▼" if descending else " ▲") if heading_column == column else ""
+            self.users_tree.heading(heading, text=heading + arrow)
+
+    def change_users_page(self, step):
+        """Move the users table forwards or backwards by a page."""
+        self._users_page = max(0, self._users_page + step)
+        self._users_stale = True
+        self.update_users_display()
 
     def update_users_display(self):
-        """Update the users list display."""
-        # Clear existing items
-        for item in self.users_tree.get_children():
-            self.users_tree.delete(item)
-
-        # Add users
-        for user_name, user in self.salty_bet.users.items():
-            stats = user.get_stats()
-            self.users_tree.insert(
-                '',
-                'end',
-                values=(stats['name'], stats['wrestlebucks'], stats['wins'],
-                        stats['losses'], f"{stats['win_rate']:.1f}%"))
-
-        # Update betting user combo
-        user_names = list(self.salty_bet.users.keys())
-        self.betting_user_combo['values'] = user_names
+        """Show the current page of users, touching only rows that changed."""
+        if not self._users_stale and not self._changed_users:
+            return
+        self._users_stale = False
+        self._changed_users.clear()
+
+        column, descending = self._users_sort
+        total, page = self.salty_bet.get_users_page(
+            column, self._users_page * USERS_PAGE_SIZE, USERS_PAGE_SIZE, descending)
+        pages = max(1, -(-total // USERS_PAGE_SIZE))
+        if self._users_page >= pages:
+            self._users_page = pages - 1
+            total, page = self.salty_bet.get_users_page(
+                column, self._users_page * USERS_PAGE_SIZE, USERS_PAGE_SIZE,
+                descending)
+
+        rows = [(stats['name'], stats['wrestlebucks'], stats['wins'],
+                 stats['losses'], f"{stats['win_rate']:.1f}%") for stats in page]
+        items = self.users_tree.get_children()
+        for position, row in enumerate(rows):
+            if position >= len(items):
+                self.users_tree.insert('', 'end', values=row)
+            elif (position >= len(self._users_rows)
+                  or self._users_rows[position] != row):
+                self.users_tree.item(items[position], values=row)
+        if len(items) > len(rows):
+            self.users_tree.delete(*items[len(rows):])
+        self._users_rows = rows
+
+        self.users_page_label.config(
+            text=f"Page {self._users_page + 1} of {pages} ({total} users)")
+
+    def _note_user_events(self, events):
+        """Remember which users changed (called on whichever thread changed them)."""
+        self._changed_users.update(event.fields['name'] for event in events)
+
+    def update_user_choices(self):
+        """Refresh the betting user suggestions for what is typed."""
+        text = self.betting_user_var.get()
+        self.betting_user_combo['values'] = (
+            self.salty_bet.search_users(text, USER_SUGGESTIONS) if text.strip() else ())
+
+    def suggest_users(self, event=None):
+        """Offer the users matching what was typed so far."""
+        if event is not None and event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'):
+            return
+        self.update_user_choices()
+        self.update_betting_options()
+
+    def accept_user_suggestion(self, event=None):
+        """Pick the best match when Enter is pressed on a partial name."""
+        values = self.betting_user_combo['values']
+        if values and self.betting_user_var.get() not in self.salty_bet.users:
+            self.betting_user_var.set(values[0])
+            self.betting_user_combo.icursor(tk.END)
+        self.update_betting_options()
 
     def update_betting_display(self):
         """Update the betting display."""
         # Update current bets
         self.bets_text.delete(1.0, tk.END)
-        if self.salty_bet.bets:
-            self.bets_text.insert(tk.END, "Current Bets:\n")
-            for user_name, bet_info in self.salty_bet.bets.items():
+        match = self._selected_match(self.betting_match_var)
+        if match is not None and match.payout_mode == PAYOUT_PARIMUTUEL:
+            odds = ", ".join(
+                f"{wrestler} {value:.2f}x" if value else f"{wrestler} -"
+                for wrestler, value in match.odds().items())
+            self.bets_text.insert(
+                tk.END, f"Pool: {match.bets.total_pool} WrestleBucks | Odds: {odds}\n\n")
+        if match is not None:
+            chances = self.salty_bet.get_win_probabilities(match.id)
+            fair = ", ".join(f"{wrestler} {fair_odds(chance):.2f}x"
+                             for wrestler, chance in chances.items())
+            self.bets_text.insert(tk.END, f"Fair odds from ratings: {fair}\n\n")
+        if match is not None and match.bets:
+            self.bets_text.insert(tk.END, f"Current Bets on match #{match.id}:\n")
+            for user_name, bet_info in match.bets.items():
                 self.bets_text.insert(
                     tk.END,
                     f"• {user_name}: {bet_info['amount']} WrestleBucks on {bet_info['wrestler']}\n"
@@ -664,10 +1052,11 @@ class SaltyBetGUI:
         else:
             self.bets_text.insert(tk.END, "No bets placed yet.")
 
-    def update_resolution_display(self):
+    def update_resolution_display(self, event=None):
         """Update the resolution display."""
-        if self.salty_bet.current_match:
-            wrestlers = self.salty_bet.current_match['wrestlers']
+        match = self._selected_match(self.resolve_match_var)
+        if match is not None:
+            wrestlers = match.wrestlers
             self.winner_combo['values'] = wrestlers
             # Clear selection if it's no longer valid
             if self.winner_var.get() not in wrestlers:
@@ -680,25 +1069,59 @@ class SaltyBetGUI:
             self.winner_combo.set("")
 
     def update_stats_display(self):
-        """Update the statistics display."""
+        """Update the statistics display with totals and the leaderboards."""
+        self._stats_stale = False
         self.stats_text.delete(1.0, tk.END)
 
         if not self.salty_bet.users:
             self.stats_text.insert(tk.END, "No users in the system yet.")
             return
 
-        for user_name, user in self.salty_bet.users.items():
-            stats = user.get_stats()
-            self.stats_text.insert(tk.END,
-                                   f"=== {stats['name']}'s Statistics ===\n")
-            self.stats_text.insert(tk.END,
-                                   f"WrestleBucks: {stats['wrestlebucks']}\n")
-            self.stats_text.insert(tk.END, f"Wins: {stats['wins']}\n")
-            self.stats_text.insert(tk.END, f"Losses: {stats['losses']}\n")
-            self.stats_text.insert(tk.END,
-                                   f"Win Rate: {stats['win_rate']:.1f}%\n")
+        totals = self.salty_bet.get_aggregate_stats()
+        self.stats_text.insert(tk.END, "=== Overall ===\n")
+        self.stats_text.insert(tk.END, f"Users: {totals['users']}\n")
+        self.stats_text.insert(
+            tk.END, f"Total WrestleBucks: {totals['total_wrestlebucks']}\n")
+        self.stats_text.insert(tk.END,
+                               f"Overall Win Rate: {totals['win_rate']:.1f}%\n\n")
+
+        boards = (("Richest", 'wrestlebucks', "{wrestlebucks} WrestleBucks"),
+                  ("Most Wins", 'wins', "{wins} wins"),
+                  (f"Best Win Rate (min {LEADERBOARD_MIN_GAMES} games)",
+                   'win_rate', "{win_rate:.1f}% ({wins}-{losses})"))
+        for title, column, line in boards:
+            self.stats_text.insert(tk.END, f"=== {title} ===\n")
+            leaders = self.salty_bet.get_leaderboard(column, LEADERBOARD_SIZE)
+            if not leaders:
+                self.stats_text.insert(tk.END, "Nobody qualifies yet.\n")
+            for rank, stats in enumerate(leaders, 1):
+                self.stats_text.insert(
+                    tk.END, f"{rank}. {stats['name']}: {line.format(**stats)}\n")
             self.stats_text.insert(tk.END, "\n")
 
+        if len(self.salty_bet.wrestlers):
+            self.stats_text.insert(tk.END, "=== Top Wrestlers ===\n")
+            wrestlers = self.salty_bet.wrestlers.top('wins', LEADERBOARD_SIZE)
+            for rank, stats in enumerate(wrestlers, 1):
+                self.stats_text.insert(
+                    tk.END, f"{rank}. {stats['name']}: {stats['wins']}-"
+                    f"{stats['losses']}, {stats['money_bet']} WrestleBucks bet on them\n")
+
+    def close(self):
+        """Finish any pending save, then close the window."""
+        self.save_status_label.config(text="Saving...", fg='#f39c12')
+        self.root.update_idletasks()
+        saver = self.salty_bet.saver
+        if saver is not None and saver.state == SAVE_FAILED:
+            saver.request()  # Give a failed save one more try
+        if saver is not None and not saver.flush():
+            if not messagebox.askyesno(
+                    "Save Failed",
+                    "Could not save user data. Quit anyway and lose your progress?"):
+                return
+        self.salty_bet.close()
+        self.root.destroy()
+
     def run(self):
         """Start the GUI application."""
         self.root.mainloop()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Salty Bet History - A binary log of every settled match and bet.
+
+History is kept in three files next to the data file:
+
+    <name>.matches  fixed-width match records (MATCH_RECORD)
+    <name>.bets     fixed-width bet records (BET_RECORD), grouped by match
+    <name>.names    string table, one JSON-encoded string per line
+
+User names, wrestler names and match types are stored as IDs into the string
+table. Both record files start with a small header and are only ever
+appended to, so analytics can map them straight into NumPy structured arrays
+without parsing or building Python objects per bet.
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:  # Analytics fall back to struct-unpacking the mapped files
+    np = None
+
+HISTORY_VERSION = 1
+HISTORY_MAX_WRESTLERS = 8
+
+# magic, version, record size
+HEADER = struct.Struct('<4sII')
+HEADER_SIZE = 16  # HEADER padded to keep records 8-byte aligned
+
+# match_id, settled_at, first_bet, bet_count, total_pool, type, payout_mode,
+# wrestler_count, winner, refunded, wrestlers[8]
+MATCH_RECORD = struct.Struct('<qdqqqIIBbB5x8I')
+MATCH_FIELDS = ('match_id', 'settled_at', 'first_bet', 'bet_count',
+                'total_pool', 'type', 'payout_mode', 'wrestler_count',
+                'winner', 'refunded', 'wrestlers')
+
+# match_id, user, pick, won, amount, payout, balance, bailout
+BET_RECORD = struct.Struct('<qIbB2xqqqq')
+BET_FIELDS = ('match_id', 'user', 'pick', 'won', 'amount', 'payout',
+              'balance', 'bailout')
+
+if np is not None:
+    MATCH_DTYPE = np.dtype({
+        'names': list(MATCH_FIELDS),
+        'formats': ['<i8', '<f8', '<i8', '<i8', '<i8', '<u4', '<u4', 'u1',
+                    'i1', 'u1', ('<u4', HISTORY_MAX_WRESTLERS)],
+        'offsets': [0, 8, 16, 24, 32, 40, 44, 48, 49, 50, 56],
+        'itemsize': MATCH_RECORD.size
+    })
+    BET_DTYPE = np.dtype({
+        'names': list(BET_FIELDS),
+        'formats': ['<i8', '<u4', 'i1', 'u1', '<i8', '<i8', '<i8', '<i8'],
+        'offsets': [0, 8, 12, 13, 16, 24, 32, 40],
+        'itemsize': BET_RECORD.size
+    })
+
+
+class MatchHistory:
+    """Appends settled matches to the history files and answers queries on them.
+
+    Bets are written before their match record, so the match record marks a
+    match as complete; anything written after the last complete match (a
+    crash mid-append) is cut off when the history is opened again.
+    """
+
+    def __init__(self, path):
+        base = Path(path)
+        base.parent.mkdir(parents=True, exist_ok=True)
+        self.matches_path = str(base.with_suffix('.matches'))
+        self.bets_path = str(base.with_suffix('.bets'))
+        self.names_path = str(base.with_suffix('.names'))
+        self._lock = threading.Lock()
+        self.names = []  # String table: ID -> string
+        self._name_ids = {}  # String table: string -> ID
+
+        self._load_names()
+        self.match_count = self._open_records(self.matches_path, b'SBHM',
+                                              MATCH_RECORD)
+        self.bet_count = 0
+        self.last_match_id = 0  # Match IDs only ever grow
+        if self.match_count:
+            last = self._read_record(self.matches_path, MATCH_RECORD,
+                                     self.match_count - 1)
+            self.last_match_id = last[0]
+            self.bet_count = last[2] + last[3]
+        stored_bets = self._open_records(self.bets_path, b'SBHB', BET_RECORD)
+        if stored_bets != self.bet_count:
+            # Drop bets of a match whose record never made it to disk
+            self._truncate(self.bets_path, BET_RECORD, self.bet_count)
+
+        self._matches_file = open(self.matches_path, 'ab')
+        self._bets_file = open(self.bets_path, 'ab')
+        self._names_file = open(self.names_path, 'a', encoding='utf-8')
+
+    # Files
+
+    def _load_names(self):
+        """Read the string table, dropping a torn last line."""
+        if not os.path.exists(self.names_path):
+            return
+        with open(self.names_path, 'r+', encoding='utf-8') as f:
+            good_length = 0
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                try:
+                    name = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._name_ids[name] = len(self.names)
+                self.names.append(name)
+                good_length += len(line.encode('utf-8'))
+            f.truncate(good_length)
+
+    @staticmethod
+    def _open_records(path, magic, record):
+        """Create or check a record file and return its number of whole records."""
+        if not os.path.exists(path) or os.path.getsize(path) < HEADER_SIZE:
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(magic, HISTORY_VERSION,
+                                    record.size).ljust(HEADER_SIZE, b'\0'))
+            return 0
+
+        with open(path, 'rb') as f:
+            found_magic, version, size = HEADER.unpack(f.read(HEADER.size))
+        if found_magic != magic or size != record.size:
+            raise ValueError(f"{path} is not a Salty Bet history file")
+        if version != HISTORY_VERSION:
+            raise ValueError(f"{path} has unsupported history version {version}")
+
+        count = (os.path.getsize(path) - HEADER_SIZE) // record.size
+        if HEADER_SIZE + count * record.size != os.path.getsize(path):
+            MatchHistory._truncate(path, record, count)
+        return count
+
+    @staticmethod
+    def _truncate(path, record, count):
+        """Cut a record file down to its first `count` records."""
+        with open(path, 'r+b') as f:
+            f.truncate(HEADER_SIZE + count * record.size)
+
+    @staticmethod
+    def _read_record(path, record, index):
+        """Read one record from a record file."""
+        with open(path, 'rb') as f:
+            f.seek(HEADER_SIZE + index * record.size)
+            return record.unpack(f.read(record.size))
+
+    def close(self):
+        """Close the history files."""
+        with self._lock:
+            for f in (self._matches_file, self._bets_file, self._names_file):
+                f.close()
+
+    # Writing
+
+    def _intern(self, name, new_names):
+        """Get the string table ID of a name, adding it if needed."""
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self.names)
+            self.names.append(name)
+            new_names.append(json.dumps(name) + '\n')
+        return name_id
+
+    def record(self, result, settled_at=None):
+        """Append a settled match (a MatchResult) and all of its bets."""
+        match = result.match
+        if len(match.wrestlers) > HISTORY_MAX_WRESTLERS:
+            raise ValueError(
+                f"History holds at most {HISTORY_MAX_WRESTLERS} wrestlers per match")
+        settled_at = time.time() if settled_at is None else settled_at
+
+        with self._lock:
+            new_names = []
+            type_id = self._intern(match.type, new_names)
+            payout_id = self._intern(match.payout_mode, new_names)
+            wrestler_ids = [self._intern(w, new_names) for w in match.wrestlers]
+            user_ids = [self._intern(name, new_names) for name in result.names]
+
+            bets = self._encode_bets(match.id, user_ids, match.bets.picks, result)
+            wrestler_ids += [0] * (HISTORY_MAX_WRESTLERS - len(wrestler_ids))
+            match_record = MATCH_RECORD.pack(
+                match.id, settled_at, self.bet_count, len(user_ids),
+                match.bets.total_pool, type_id, payout_id, len(match.wrestlers),
+                match.wrestler_index[result.winner], result.refunded,
+                *wrestler_ids)
+
+            # Names and bets first; the match record commits the match
+            self._names_file.write(''.join(new_names))
+            self._names_file.flush()
+            self._bets_file.write(bets)
+            self._bets_file.flush()
+            self._matches_file.write(match_record)
+            self._matches_file.flush()
+            self.bet_count += len(user_ids)
+            self.match_count += 1
+            self.last_match_id = max(self.last_match_id, match.id)
+
+    @staticmethod
+    def _encode_bets(match_id, user_ids, picks, result):
+        """Pack the bets of a settled match into BET_RECORD bytes."""
+        if np is not None:
+            records = np.zeros(len(user_ids), dtype=BET_DTYPE)
+            records['match_id'] = match_id
+            records['user'] = user_ids
+            records['pick'] = np.frombuffer(picks, dtype=np.int8)
+            records['won'] = result.won
+            records['amount'] = result.amounts
+            records['payout'] = result.payouts
+            records['balance'] = result.balances
+            records['bailout'] = result.bailouts
+            return records.tobytes()
+
+        columns = [result.won, result.amounts, result.payouts, result.balances,
+                   result.bailouts]
+        won, amounts, payouts, balances, bailouts = [
+            c.tolist() if hasattr(c, 'tolist') else c for c in columns
+        ]
+        pack = BET_RECORD.pack
+        return b''.join(
+            pack(match_id, user_ids[i], picks[i], won[i], amounts[i], payouts[i],
+                 balances[i], bailouts[i]) for i in range(len(user_ids)))
+
+    # Reading
+
+    @staticmethod
+    def _map(path, record, count, dtype):
+        """Map a record file as a NumPy structured array (or a list of tuples)."""
+        if np is not None:
+            if count == 0:
+                return np.zeros(0, dtype=dtype)
+            return np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE,
+                             shape=(count, ))
+
+        if count == 0:
+            return []
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                data = mapped[HEADER_SIZE:HEADER_SIZE + count * record.size]
+        return list(record.iter_unpack(data))
+
+    def matches(self):
+        """All match records, oldest first."""
+        return self._map(self.matches_path, MATCH_RECORD, self.match_count,
+                         MATCH_DTYPE if np is not None else None)
+
+    def bets(self):
+        """All bet records, grouped by match, oldest first."""
+        return self._map(self.bets_path, BET_RECORD, self.bet_count,
+                         BET_DTYPE if np is not None else None)
+
+    def describe_match(self, record):
+        """Turn a match record into a dictionary with names instead of IDs."""
+        if np is not None and hasattr(record, 'dtype'):
+            record = tuple(record.item())
+            record = record[:-1] + tuple(record[-1].tolist())
+        count = record[7]
+        return {
+            'match_id': record[0],
+            'settled_at': record[1],
+            'type': self.names[record[5]],
+            'payout_mode': self.names[record[6]],
+            'wrestlers': [self.names[i] for i in record[10:10 + count]],
+            'winner': self.names[record[10 + record[8]]],
+            'refunded': bool(record[9]),
+            'bets': record[3],
+            'total_pool': record[4]
+        }
+
+    def user_roi(self, user_name):
+        """Get a user's cumulative return on investment after each match.
+
+        Returns a list of (match_id, roi) where roi is (paid back - staked) /
+        staked over all of the user's bets up to and including that match.
+        Refunds count as paid back; bailouts do not.
+        """
+        user_id = self._name_ids.get(user_name)
+        if user_id is None:
+            return []
+        bets = self.bets()
+        if np is not None:
+            mine = bets[bets['user'] == user_id]
+            staked = np.cumsum(mine['amount'])
+            returned = np.cumsum(mine['payout'])
+            roi = (returned - staked) / staked
+            return list(zip(mine['match_id'].tolist(), roi.tolist()))
+
+        result, staked, returned = [], 0, 0
+        for match_id, user, _, _, amount, payout, _, _ in bets:
+            if user == user_id:
+                staked += amount
+                returned += payout
+                result.append((match_id, (returned - staked) / staked))
+        return result
+
+    def roi_by_user(self, min_bets=1):
+        """Get {user_name: roi} over every recorded bet of each user."""
+        bets = self.bets()
+        if np is not None:
+            size = len(self.names)
+            counts = np.bincount(bets['user'], minlength=size)
+            staked = np.bincount(bets['user'], weights=bets['amount'], minlength=size)
+            returned = np.bincount(bets['user'], weights=bets['payout'],
+                                   minlength=size)
+            users = np.nonzero((counts >= min_bets) & (staked > 0))[0]
+            roi = (returned[users] - staked[users]) / staked[users]
+            return {self.names[u]: r for u, r in zip(users.tolist(), roi.tolist())}
+
+        totals = {}
+        for _, user, _, _, amount, payout, _, _ in bets:
+            count, staked, returned = totals.get(user, (0, 0, 0))
+            totals[user] = (count + 1, staked + amount, returned + payout)
+        return {
+            self.names[user]: (returned - staked) / staked
+            for user, (count, staked, returned) in totals.items()
+            if count >= min_bets and staked > 0
+        }
+
+    def biggest_upsets(self, limit=10):
+        """Get the settled matches where the least money was on the winner.
+
+        Each entry is describe_match() plus 'winner_share', the fraction of
+        the pool that was bet on the winner. Refunded matches and matches
+        nobody bet on are skipped.
+        """
+        matches = self.matches()
+        if not len(matches):
+            return []
+        bets = self.bets()
+        if np is not None:
+            match_index = np.repeat(np.arange(len(matches)), matches['bet_count'])
+            winner_pool = np.bincount(match_index,
+                                      weights=bets['amount'] * bets['won'],
+                                      minlength=len(matches))
+            share = winner_pool / np.maximum(matches['total_pool'], 1)
+            share[(matches['refunded'] == 1) | (matches['total_pool'] == 0)] = np.inf
+            order = np.argsort(share, kind='stable')[:limit]
+            return [
+                dict(self.describe_match(matches[i]), winner_share=float(share[i]))
+                for i in order.tolist() if np.isfinite(share[i])
+            ]
+
+        upsets = []
+        for record in matches:
+            if record[9] or not record[4]:
+                continue
+            first, count = record[2], record[3]
+            winner_pool = sum(bet[4] for bet in bets[first:first + count] if bet[3])
+            upsets.append((winner_pool / max(record[4], 1), record))
+        upsets.sort(key=lambda upset: upset[0])
+        return [
+            dict(self.describe_match(record), winner_share=share)
+            for share, record in upsets[:limit]
+        ]
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Salty Bet Leaderboard - Ranked indexes of users kept up to date incrementally.
+
+Each board is a sorted list of (sort key..., name) tuples split into buckets,
+so inserts, removals and rank lookups cost O(log n) plus a small bucket move
+instead of a scan over every user.
+"""
+
+import threading
+from bisect import bisect_left, insort
+from itertools import chain, islice
+
+# Users need at least this many settled bets to appear on the win rate board
+LEADERBOARD_MIN_GAMES = 10
+
+# Boards kept by the index; get_leaderboard() falls back to a scan for others
+BOARDS = ('wrestlebucks', 'wins', 'win_rate')
+
+# Columns Leaderboard.sorted_page() can order every user by
+SORT_COLUMNS = ('wrestlebucks', 'wins', 'losses', 'win_rate')
+
+
+def _sort_key(column, descending, name, values):
+    """Build a user's key in a sorted_page() order (ties go by name)."""
+    wrestlebucks, wins, losses = values
+    if column == 'win_rate':
+        value = wins / (wins + losses) if wins + losses else 0.0
+    else:
+        value = values[SORT_COLUMNS.index(column)]
+    return (-value if descending else value, name)
+
+
+class SortedKeyList:
+    """A sorted list of unique keys stored as a list of short sorted buckets.
+
+    A Fenwick tree over the bucket sizes turns positions into buckets (and
+    back) in O(log n), so rank and page lookups never walk every bucket.
+    """
+
+    BUCKET_SIZE = 512
+
+    def __init__(self, keys=()):
+        keys = sorted(keys)  # Linear when the keys are already in order
+        size = self.BUCKET_SIZE
+        self._buckets = [keys[i:i + size] for i in range(0, len(keys), size)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._len = len(keys)
+        self._build_tree()
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return chain.from_iterable(self._buckets)
+
+    def __contains__(self, key):
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return False
+        bucket = self._buckets[i]
+        j = bisect_left(bucket, key)
+        return j < len(bucket) and bucket[j] == key
+
+    # Fenwick tree of bucket sizes (1-based, rebuilt when buckets split or go)
+
+    def _build_tree(self):
+        tree = [0] + [len(bucket) for bucket in self._buckets]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _resize(self, i, delta):
+        """Add `delta` to the size of bucket i."""
+        tree = self._tree
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _before(self, i):
+        """Count the keys in the buckets before bucket i."""
+        tree = self._tree
+        total = 0
+        while i:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, position):
+        """Get (bucket index, offset in that bucket) of a position."""
+        tree = self._tree
+        i = 0
+        step = 1 << (len(tree).bit_length() - 1)
+        while step:
+            j = i + step
+            if j < len(tree) and tree[j] <= position:
+                i = j
+                position -= tree[j]
+            step >>= 1
+        return i, position
+
+    def add(self, key):
+        """Insert a key."""
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            self._build_tree()
+            return
+
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            i -= 1
+        bucket = self._buckets[i]
+        insort(bucket, key)
+        self._maxes[i] = bucket[-1]
+        self._len += 1
+
+        if len(bucket) > 2 * self.BUCKET_SIZE:
+            half = len(bucket) // 2
+            self._buckets[i:i + 1] = [bucket[:half], bucket[half:]]
+            self._maxes[i:i + 1] = [bucket[half - 1], bucket[-1]]
+            self._build_tree()
+        else:
+            self._resize(i, 1)
+
+    def remove(self, key):
+        """Remove a key that is in the list."""
+        i = bisect_left(self._maxes, key)
+        bucket = self._buckets[i]
+        del bucket[bisect_left(bucket, key)]
+        self._len -= 1
+        if bucket:
+            self._maxes[i] = bucket[-1]
+            self._resize(i, -1)
+        else:
+            del self._buckets[i]
+            del self._maxes[i]
+            self._build_tree()
+
+    def index(self, key):
+        """Get the position of a key that is in the list."""
+        i = bisect_left(self._maxes, key)
+        return self._before(i) + bisect_left(self._buckets[i], key)
+
+    def ceiling(self, key):
+        """Get the first key >= key, or None if there is none."""
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return None
+        bucket = self._buckets[i]
+        return bucket[bisect_left(bucket, key)]
+
+    def iter_from(self, key):
+        """Iterate over the keys from the first one >= key onwards."""
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return
+        bucket = self._buckets[i]
+        yield from islice(bucket, bisect_left(bucket, key), None)
+        for j in range(i + 1, len(self._buckets)):
+            yield from self._buckets[j]
+
+    def head(self, count):
+        """Get the first `count` keys."""
+        return list(islice(self, count))
+
+    def slice(self, start, stop):
+        """Get the keys at positions start..stop-1."""
+        stop = min(stop, self._len)
+        if start >= stop:
+            return []
+        i, offset = self._locate(start)
+        keys = self._buckets[i][offset:offset + stop - start]
+        while len(keys) < stop - start:
+            i += 1
+            keys.extend(self._buckets[i][:stop - start - len(keys)])
+        return keys
+
+
+class Leaderboard:
+    """Top-K and rank queries over users for each board in BOARDS.
+
+    A change moves the user to their new place on each board right away, in
+    O(log n) plus a short bucket move. A batch touching more than a quarter
+    of the users (for example a huge match) is instead sorted in one go on
+    the next query, which costs no more per change.
+    """
+
+    def __init__(self, users, min_games=LEADERBOARD_MIN_GAMES):
+        self.users = users  # {name: User}-like mapping the index reads from
+        self.min_games = min_games
+        self._lock = threading.Lock()
+        self._values = {}  # {name: (wrestlebucks, wins, losses)} as indexed
+        self._boards = {board: SortedKeyList() for board in BOARDS}
+        # {(column, descending): SortedKeyList} of every user, built on first use
+        self._orders = {}
+        self._stale = True  # Rebuild everything on the next query
+
+    def mark(self, name):
+        """Move a changed user to their place on every board."""
+        with self._lock:
+            if not self._stale:
+                self._update(name)
+
+    def mark_many(self, names):
+        """Move a batch of changed users to their places on every board."""
+        with self._lock:
+            if self._stale:
+                return
+            if len(names) > len(self._values) // 4:
+                self._stale = True
+                return
+            for name in names:
+                self._update(name)
+
+    def invalidate(self):
+        """Rebuild all boards on the next query (e.g. after a reload)."""
+        self._stale = True
+
+    def _keys_for(self, name, values):
+        """Build the sort key of a user on each board (best sorts first)."""
+        if values is None:
+            return None, None, None
+        wrestlebucks, wins, losses = values
+        games = wins + losses
+        rate_key = None
+        if games >= self.min_games and games > 0:
+            rate_key = (-wins / games, -games, name)
+        return (-wrestlebucks, name), (-wins, name), rate_key
+
+    def _records(self):
+        """Yield (name, wrestlebucks, wins, losses) for every user."""
+        if hasattr(self.users, 'records'):
+            return self.users.records()
+        return ((user.name, user.wrestlebucks, user.wins, user.losses)
+                for user in self.users.values())
+
+    def _update(self, name):
+        """Bring one user's entries on the boards up to date."""
+        old = self._values.get(name)
+        user = self.users.get(name)
+        new = None if user is None else (user.wrestlebucks, user.wins, user.losses)
+        if old == new:
+            return
+        boards = self._boards
+        for board, old_key, new_key in zip([boards[board] for board in BOARDS],
+                                           self._keys_for(name, old),
+                                           self._keys_for(name, new)):
+            if old_key == new_key:
+                continue
+            if old_key is not None:
+                board.remove(old_key)
+            if new_key is not None:
+                board.add(new_key)
+        for (column, descending), order in self._orders.items():
+            if old is not None:
+                order.remove(_sort_key(column, descending, name, old))
+            if new is not None:
+                order.add(_sort_key(column, descending, name, new))
+        if new is None:
+            del self._values[name]
+        else:
+            self._values[name] = new
+
+    def _refresh(self):
+        """Rebuild the boards if a reload or a large batch made them stale."""
+        if self._stale:
+            self._rebuild()
+
+    def _rebuild(self):
+        """Sort every user onto every board from scratch."""
+        self._stale = False
+        self._values = values = {
+            name: (wrestlebucks, wins, losses)
+            for name, wrestlebucks, wins, losses in self._records()
+        }
+        min_games = max(self.min_games, 1)
+        self._boards = {
+            'wrestlebucks': SortedKeyList(
+                [(-v[0], name) for name, v in values.items()]),
+            'wins': SortedKeyList([(-v[1], name) for name, v in values.items()]),
+            'win_rate': SortedKeyList(
+                [(-v[1] / (v[1] + v[2]), -(v[1] + v[2]), name)
+                 for name, v in values.items() if v[1] + v[2] >= min_games]),
+        }
+        self._orders = {}
+
+    def top(self, board, limit=10):
+        """Get the names of the best `limit` users on a board."""
+        with self._lock:
+            self._refresh()
+            return [key[-1] for key in self._boards[board].head(limit)]
+
+    def page(self, board, offset, limit):
+        """Get the names at positions offset..offset+limit-1 of a board."""
+        with self._lock:
+            self._refresh()
+            return [key[-1] for key in self._boards[board].slice(offset, offset + limit)]
+
+    def sorted_page(self, column, descending, offset, limit):
+        """Get the names at positions offset..offset+limit-1 of all users
+        sorted by a column in SORT_COLUMNS.
+
+        Each order is sorted on its first use and then kept up to date like
+        the boards, so later pages cost O(log n) however often users change.
+        """
+        with self._lock:
+            self._refresh()
+            order = self._orders.get((column, descending))
+            if order is None:
+                order = self._orders[(column, descending)] = SortedKeyList(
+                    _sort_key(column, descending, name, values)
+                    for name, values in self._values.items())
+            return [key[-1] for key in order.slice(offset, offset + limit)]
+
+    def rank(self, board, name):
+        """Get a user's 1-based position on a board, or None if not ranked."""
+        with self._lock:
+            self._refresh()
+            key = self._keys_for(name, self._values.get(name))[BOARDS.index(board)]
+            if key is None:
+                return None
+            return self._boards[board].index(key) + 1
+
+    def size(self, board):
+        """Get the number of users ranked on a board."""
+        with self._lock:
+            self._refresh()
+            return len(self._boards[board])
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Salty Bet Ledger - An append-only write-ahead log of WrestleBucks changes.
+Each line of the ledger is one compact JSON record: [op, user_name, amount].
+
+The active ledger file can be rotated into numbered segments. Closed segments
+are folded into a snapshot of the whole user table, so startup only has to
+load the snapshot and replay the short tail written since.
+
+A shared ledger can be written by several processes. Appends, rotations and
+compactions happen under an advisory lock on `<ledger>.lock`, which also
+holds the number of the last rotated segment. Each process remembers how far
+it has read as (segment, byte offset), so it can pick up what the others
+appended by reading only the bytes after that position.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from json.encoder import encode_basestring_ascii
+from pathlib import Path
+
+from SaltyBetPersistence import FileLock, atomic_write, fsync_directory
+
+
+def apply_record(users_data, record):
+    """Apply one ledger record to a {name: user_data} dictionary."""
+    op, name = record[0], record[1]
+    amount = record[2] if len(record) > 2 else None
+
+    if op == 'add':
+        if name in users_data:
+            return  # Two processes added the same name; the first one counts
+        users_data[name] = {
+            'name': name,
+            'wrestlebucks': amount,
+            'wins': 0,
+            'losses': 0
+        }
+        return
+
+    user_data = users_data.get(name)
+    if user_data is None:
+        print(f"Ledger references unknown user '{name}', skipping.")
+        return
+
+    if op == 'bet':
+        user_data['wrestlebucks'] -= amount
+    elif op == 'win':
+        user_data['wrestlebucks'] += amount
+        user_data['wins'] += 1
+    elif op == 'loss':
+        user_data['losses'] += 1
+    elif op in ('bailout', 'refund'):
+        user_data['wrestlebucks'] += amount
+    else:
+        print(f"Unknown ledger operation '{op}', skipping.")
+
+
+def apply_change(user, op, amount):
+    """Apply one ledger operation (other than 'add') to an object with the
+    User attributes, without notifying its observer."""
+    if op == 'bet':
+        user.wrestlebucks -= amount
+    elif op == 'win':
+        user.wrestlebucks += amount
+        user.wins += 1
+    elif op == 'loss':
+        user.losses += 1
+    elif op in ('bailout', 'refund'):
+        user.wrestlebucks += amount
+    else:
+        print(f"Unknown ledger operation '{op}', skipping.")
+
+
+class Ledger:
+    """Append-only log of new users, bets, payouts, losses, refunds and bailouts."""
+
+    def __init__(self, path, shared=False):
+        self.path = path
+        self.snapshot_path = str(Path(path).with_suffix('.snapshot'))
+        self.pending = []  # Encoded records waiting for the next flush
+        self._pending_lock = threading.Lock()  # Guards appends against flush's swap
+        self.active_records = 0  # Records in the active (unrotated) file
+        self.last_segment = 0  # Highest segment number seen so far
+        self.durable = True  # fsync every flush before it counts as written
+        self._tail_checked = False
+        # Shared ledgers only: the lock other processes also take, how far
+        # this process has read as (segment the active file will become
+        # minus one, byte offset), and records read but not yet applied
+        self.lock = FileLock(f"{path}.lock") if shared else None
+        self.position = None
+        self.incoming = []
+
+    @contextmanager
+    def locked(self):
+        """Hold the lock shared with other processes (a shared ledger only),
+        keeping last_segment in step with the number stored in it."""
+        with self.lock as f:
+            f.seek(0)
+            text = f.read().strip()
+            stored = int(text) if text.isdigit() else 0
+            self.last_segment = max(self.last_segment, stored)
+            try:
+                yield
+            finally:
+                if self.last_segment != stored:
+                    f.seek(0)
+                    f.truncate()
+                    f.write(str(self.last_segment))
+                    f.flush()
+                    if self.durable:
+                        os.fsync(f.fileno())
+
+    def mark_read(self):
+        """Note that everything written so far has been read (hold the lock)."""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self.position = (self.last_segment, size)
+
+    def read_changes(self):
+        """Queue the records other processes appended since our position on
+        `incoming` (hold the lock).
+
+        Returns False if some of them were already folded into the snapshot
+        and deleted, in which case everything has to be loaded again.
+        """
+        segment, offset = self.position
+        records = []
+        # Files rotated since we last read: ours became segment + 1
+        for number in range(segment + 1, self.last_segment + 1):
+            path = f"{self.path}.{number:06d}"
+            if not os.path.exists(path):
+                return False
+            records.extend(self._read_from(path, offset)[0])
+            offset = 0
+        if segment != self.last_segment:
+            self.active_records = 0  # Someone else rotated the active file
+        if os.path.exists(self.path):
+            new_records, offset = self._read_from(self.path, offset)
+            records.extend(new_records)
+            self.active_records += len(new_records)
+        self.incoming.extend(records)
+        self.position = (self.last_segment, offset)
+        return True
+
+    @staticmethod
+    def _read_from(path, offset):
+        """Read the records in a ledger file after a byte offset; returns
+        (records, offset of the end of the file)."""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        records = []
+        for line in data.decode('utf-8', errors='replace').splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Skipping corrupt ledger record in {path}")
+        return records, offset + len(data)
+
+    def append(self, op, name, amount=None):
+        """Queue a record to be written on the next flush."""
+        # Same text as json.dumps([op, name, amount]) without the general
+        # encoder, which dominates the cost of recording a change
+        encoded = encode_basestring_ascii(name)
+        record = (f'["{op}",{encoded}]' if amount is None
+                  else f'["{op}",{encoded},{int(amount)}]')
+        with self._pending_lock:
+            self.pending.append(record)
+
+    def append_settlement(self, names, won, payouts, bailouts):
+        """Queue the win/loss (and bailout) records for a settled bet book."""
+        pending = []
+        for name, did_win, payout, bailout in zip(names, won, payouts, bailouts):
+            encoded = encode_basestring_ascii(name)
+            if did_win:
+                pending.append(f'["win",{encoded},{payout}]')
+            else:
+                pending.append(f'["loss",{encoded}]')
+            if bailout:
+                pending.append(f'["bailout",{encoded},{bailout}]')
+        with self._pending_lock:
+            self.pending.extend(pending)
+
+    def flush(self):
+        """Append all queued records to the ledger file."""
+        if not self.pending:
+            return 0
+
+        # Swap the queue out first: records other threads append while this
+        # one writes go to the new list and wait for the next flush
+        with self._pending_lock:
+            pending, self.pending = self.pending, []
+        try:
+            written = self._write(pending)
+        except BaseException:
+            with self._pending_lock:
+                self.pending[:0] = pending  # Keep them, in order, for a retry
+            raise
+        self.active_records += written
+        return written
+
+    def _write(self, pending):
+        """Append encoded records to the ledger file; returns how many."""
+        data = '\n'.join(pending) + '\n'
+        with open(self.path, 'a') as f:
+            created = f.tell() == 0
+            if not self._tail_checked:
+                # A crash mid-write can leave a torn last line; start a fresh
+                # line so the next record is not glued onto it
+                if f.tell() > 0 and not self._ends_with_newline(self.path):
+                    data = '\n' + data
+                self._tail_checked = True
+            f.write(data)
+            if self.durable:
+                # One fsync for everything queued since the last flush
+                f.flush()
+                os.fsync(f.fileno())
+            if self.position is not None:
+                # Shared: we caught up before writing, so we have read it all
+                self.position = (self.last_segment, f.tell())
+        if created and self.durable:
+            # A new (or freshly rotated) ledger file also needs its name synced
+            fsync_directory(os.path.dirname(self.path))
+        return len(pending)
+
+    def replay(self, path=None):
+        """Yield every record in a ledger file (the active one by default)."""
+        path = self.path if path is None else path
+        if not os.path.exists(path):
+            return
+
+        with open(path, 'r') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    print(
+                        f"Skipping corrupt ledger record at line {line_number} of {path}"
+                    )
+
+    def segments(self):
+        """List closed segments as (number, path) pairs, oldest first."""
+        ledger_path = Path(self.path)
+        prefix = ledger_path.name + '.'
+        found = []
+        if not ledger_path.parent.exists():
+            return found
+        for entry in ledger_path.parent.iterdir():
+            suffix = entry.name[len(prefix):]
+            if entry.name.startswith(prefix) and suffix.isdigit():
+                found.append((int(suffix), str(entry)))
+        return sorted(found)
+
+    def rotate(self):
+        """Close the active ledger file as a new segment and return its number."""
+        self.flush()
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return None
+
+        existing = [n for n, _ in self.segments()]
+        number = max(existing + [self.last_segment]) + 1
+        os.replace(self.path, f"{self.path}.{number:06d}")
+        self.last_segment = number
+        self.active_records = 0
+        self._tail_checked = False
+        return number
+
+    def remove_segments(self, up_to):
+        """Delete closed segments that have been folded into a snapshot."""
+        for number, path in self.segments():
+            if number <= up_to:
+                os.remove(path)
+
+    def read_snapshot(self):
+        """Read the latest snapshot as (last_folded_segment, users_data)."""
+        if not os.path.exists(self.snapshot_path):
+            return None
+        with open(self.snapshot_path, 'r') as f:
+            snapshot = json.load(f)
+        self.last_segment = max(self.last_segment, snapshot['segment'])
+        return snapshot['segment'], snapshot['users']
+
+    def write_snapshot(self, segment, users_data):
+        """Atomically replace the snapshot with a new one."""
+        atomic_write(self.snapshot_path,
+                     lambda f: json.dump({'segment': segment, 'users': users_data},
+                                         f,
+                                         separators=(',', ':')),
+                     durable=self.durable)
+
+    @staticmethod
+    def _ends_with_newline(path):
+        """Check whether a ledger file ends with a complete line."""
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Salty Bet Persistence - Save user data safely and on a background thread.
+
+Files are replaced through a temp file and os.replace, so a crash leaves
+either the old or the new version, never a torn one. In durable mode the
+data and the rename are fsynced before a save counts as done; fast mode
+leaves flushing to the operating system, so a crash may lose the latest
+saves but still never corrupts the file.
+
+FileLock is an advisory lock (fcntl.flock) that processes sharing a data
+file take around reads and writes.
+
+Callers ask for a save and return at once. Requests that arrive while a
+save is running, or within the commit window after the first of them, are
+coalesced into one save (group commit): a burst of changes costs one write
+and one fsync instead of one per change.
+"""
+
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # No advisory locks (Windows): FileLock only locks threads
+    fcntl = None
+
+DURABLE = 'durable'  # A save is done once the data is fsynced
+FAST = 'fast'  # A save is done once the operating system has the data
+DURABILITY_MODES = (DURABLE, FAST)
+
+SAVE_IDLE = 'idle'  # Nothing has been saved yet
+SAVE_PENDING = 'pending'  # Changes are waiting to be written
+SAVE_SAVED = 'saved'  # Every requested save is on disk
+SAVE_FAILED = 'failed'  # The last save failed; the next request retries
+
+
+def fsync_directory(path):
+    """Make a rename or a new file in a directory survive a crash."""
+    if os.name != 'posix':
+        return  # Directories cannot be opened (or need not be synced) here
+    fd = os.open(path or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, write, binary=False, durable=True):
+    """Replace a file with what write(f) writes to a temp file next to it.
+
+    The temp file is swapped in with os.replace, so readers and crashes see
+    either the old file or the complete new one. With durable=True the data
+    and the directory entry are fsynced before returning.
+    """
+    path = str(path)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb' if binary else 'w') as f:
+        write(f)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    if durable:
+        fsync_directory(os.path.dirname(path))
+
+
+class FileLock:
+    """An advisory lock (fcntl.flock) on a lock file, shared by every process
+    that opens the same path.
+
+    The lock is reentrant within a thread and also excludes other threads of
+    this process. Entering it yields the lock file, opened for reading and
+    writing, so small shared state can be kept in it.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                # The data file's directory may not have been created yet
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                self._file = os.fdopen(fd, 'r+')
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self._file
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        try:
+            if self._depth == 0:
+                # Closing the file releases the flock
+                self._file.close()
+                self._file = None
+        finally:
+            self._thread_lock.release()
+
+
+class SaveWorker:
+    """Runs a save function on a background thread, coalescing requests.
+
+    `save` returns True on success (like SaltyBet.save_users_to_file).
+    `on_done(success)` is called on the worker thread after every save, so
+    GUI code should only hand the result over to its own thread from it.
+    A save starts at most `window` seconds after the oldest request it
+    covers, so requests arriving meanwhile share it.
+    """
+
+    def __init__(self, save, on_done=None, window=0.0):
+        self.save = save
+        self.on_done = on_done
+        self.window = window
+        self.state = SAVE_IDLE
+        self.saves = 0  # Saves run so far
+        self._condition = threading.Condition()
+        self._requested = 0  # Number of the latest save request
+        self._completed = 0  # Latest request covered by a finished save
+        self._saved = 0  # Latest request covered by a successful save
+        self._pending_since = None  # When the oldest unsaved request came in
+        self._closing = False
+        self._thread = threading.Thread(target=self._run,
+                                        name='SaltyBetSaveWorker',
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        """Whether some requested changes are not on disk yet."""
+        with self._condition:
+            return self._completed < self._requested
+
+    def request(self):
+        """Ask for a save; returns immediately with a ticket for wait()."""
+        with self._condition:
+            if self._closing:
+                raise RuntimeError("The save worker is closed")
+            self._requested += 1
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            self.state = SAVE_PENDING
+            self._condition.notify_all()
+            return self._requested
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._completed == self._requested and not self._closing:
+                    self._condition.wait()
+                if self._completed == self._requested:
+                    return  # Closing with nothing left to write
+                # Let more requests join this save until the window closes
+                deadline = self._pending_since + self.window
+                while not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                # Everything requested up to now goes into this one save
+                target = self._requested
+                self._pending_since = None
+
+            success = self.save()
+
+            with self._condition:
+                self.saves += 1
+                self._completed = target
+                if success:
+                    self._saved = target
+                if self._completed == self._requested:
+                    self.state = SAVE_SAVED if success else SAVE_FAILED
+                self._condition.notify_all()
+            if self.on_done is not None:
+                self.on_done(success)
+
+    def wait(self, ticket, timeout=None):
+        """Wait until the save covering a request() ticket has finished.
+
+        Returns whether that request is saved (a later successful save also
+        counts), or False on timeout.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._completed >= ticket,
+                                            timeout):
+                return False
+            return self._saved >= ticket
+
+    def flush(self, timeout=None):
+        """Wait until every save requested so far has finished.
+
+        Returns whether they are all saved, or False on timeout.
+        """
+        with self._condition:
+            return self.wait(self._requested, timeout)
+
+    def close(self, timeout=None):
+        """Write any pending changes and stop the thread.
+
+        Returns whether the final save succeeded (True if there was none).
+        """
+        saved = self.flush(timeout)
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        return saved
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Salty Bet Ratings - Elo-style wrestler ratings for matches of any size.
+
+Each wrestler's strength is Q = 10 ** (rating / RATING_SCALE) and the chance
+of winning an N-way match is their share of the total strength in the ring
+(a softmax). For a One on One this is exactly classic Elo. After a match
+every wrestler moves by K_FACTOR * (result - expected), where result is 1 for
+the winner and 0 for everyone else, so ratings gained equal ratings lost.
+"""
+
+import math
+import threading
+from array import array
+
+from SaltyBetWrestlers import canonical_name
+
+try:
+    import numpy as np
+except ImportError:  # Card probabilities fall back to one match at a time
+    np = None
+
+DEFAULT_RATING = 1500.0
+RATING_SCALE = 400.0
+K_FACTOR = 32.0
+
+_LN10_OVER_SCALE = math.log(10) / RATING_SCALE
+
+
+def win_probabilities(ratings):
+    """Get each wrestler's chance of winning a match from their ratings."""
+    top = max(ratings)
+    strengths = [math.exp((rating - top) * _LN10_OVER_SCALE) for rating in ratings]
+    total = sum(strengths)
+    return [strength / total for strength in strengths]
+
+
+def fair_odds(probability):
+    """Get the decimal odds that break even for a win probability."""
+    return 1 / probability if probability > 0 else None
+
+
+class RatingModel:
+    """Ratings for every wrestler in a WrestlerRegistry, indexed by wrestler ID."""
+
+    def __init__(self, registry, k_factor=K_FACTOR):
+        self.registry = registry
+        self.k_factor = k_factor
+        self.ratings = array('d')  # Rating by wrestler ID
+        self._lock = threading.Lock()
+
+    def _grow(self):
+        """Give newly registered wrestlers the default rating."""
+        missing = len(self.registry) - len(self.ratings)
+        if missing > 0:
+            self.ratings.extend([DEFAULT_RATING] * missing)
+
+    def _rating_of(self, name):
+        """Get a rating by name (DEFAULT_RATING for unknown wrestlers)."""
+        wrestler_id = self.registry.ids.get(canonical_name(name))
+        if wrestler_id is None or wrestler_id >= len(self.ratings):
+            return DEFAULT_RATING
+        return self.ratings[wrestler_id]
+
+    def rating(self, name):
+        """Get a wrestler's current rating."""
+        return self._rating_of(name)
+
+    def probabilities(self, wrestlers):
+        """Get {wrestler: chance of winning} for one match."""
+        chances = win_probabilities([self._rating_of(w) for w in wrestlers])
+        return dict(zip(wrestlers, chances))
+
+    def card_probabilities(self, cards):
+        """Get win probabilities for a whole card of matches in one pass.
+
+        `cards` is a list of wrestler name lists; the result is a list of
+        {wrestler: chance of winning} in the same order.
+        """
+        if np is None or not cards:
+            return [self.probabilities(wrestlers) for wrestlers in cards]
+
+        # Look every wrestler up at once; unknown ones point past the end of
+        # the ratings, where the default rating is appended
+        ids = self.registry.ids
+        unknown = len(self.ratings)
+        flat = np.fromiter((ids.get(canonical_name(w), unknown)
+                            for wrestlers in cards for w in wrestlers), np.int64)
+        np.minimum(flat, unknown, out=flat)
+        with self._lock:  # A buffer view would stop update() from growing it
+            table = np.append(
+                np.frombuffer(self.ratings, dtype=np.float64)[:unknown],
+                DEFAULT_RATING)
+
+        lengths = np.fromiter(map(len, cards), np.int64, len(cards))
+        rows = np.repeat(np.arange(len(cards)), lengths)
+        cols = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        ratings = np.full((len(cards), int(lengths.max())), -np.inf)
+        ratings[rows, cols] = table[flat]
+
+        # Softmax in base 10 over each row; padding (-inf) gets probability 0
+        exponents = (ratings - ratings.max(axis=1, keepdims=True)) * _LN10_OVER_SCALE
+        strengths = np.exp(exponents)
+        chances = (strengths / strengths.sum(axis=1, keepdims=True)).tolist()
+        return [
+            dict(zip(wrestlers, chances[row][:len(wrestlers)]))
+            for row, wrestlers in enumerate(cards)
+        ]
+
+    def update(self, wrestler_ids, winner_id):
+        """Move the ratings of everyone in a settled match."""
+        with self._lock:
+            self._grow()
+            ratings = self.ratings
+            expected = win_probabilities([ratings[i] for i in wrestler_ids])
+            for wrestler_id, chance in zip(wrestler_ids, expected):
+                result = 1.0 if wrestler_id == winner_id else 0.0
+                ratings[wrestler_id] += self.k_factor * (result - chance)
+
+    def record_result(self, result):
+        """Update the ratings from a MatchResult."""
+        match = result.match
+        wrestler_ids = match.wrestler_ids or [
+            self.registry.intern(w) for w in match.wrestlers
+        ]
+        self.update(wrestler_ids, wrestler_ids[match.wrestler_index[result.winner]])
+
+    def load_history(self, history):
+        """Replay every recorded match, oldest first."""
+        for record in history.matches():
+            info = history.describe_match(record)
+            wrestler_ids = [self.registry.intern(w) for w in info['wrestlers']]
+            self.update(wrestler_ids, self.registry.intern(info['winner']))
+
+    def top(self, limit=10):
+        """Get (name, rating) for the highest rated wrestlers."""
+        self._grow()
+        best = sorted(range(len(self.ratings)), key=lambda i: -self.ratings[i])
+        return [(self.registry.names[i], self.ratings[i]) for i in best[:limit]]
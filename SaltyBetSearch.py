@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Salty Bet Search - Type-ahead lookup of user names.
+
+Names are kept case-folded in a sorted index, so every name starting with a
+prefix sits in one run found by a binary search, and a query only reads as
+many names as it returns. Later words of a name ("hogan" in "Hulk Hogan")
+are indexed the same way, and typos are forgiven by looking up every
+prefix one edit away from the query.
+"""
+
+import threading
+
+from SaltyBetLeaderboard import SortedKeyList
+
+# Queries shorter than this are not fuzzy matched; one edit away from a
+# couple of letters matches nearly everyone
+FUZZY_MIN_LENGTH = 3
+
+# Index keys are "<case-folded text>\0<name>" strings, which sort about
+# twice as fast as (text, name) tuples and take less memory
+SEPARATOR = '\0'
+
+
+def _name_key(name):
+    return name.casefold() + SEPARATOR + name
+
+
+def _word_keys(name):
+    """Get keys for every word of a name after the first."""
+    text = name.casefold()
+    if text.isalnum():  # Quick skip for the usual one-word name
+        return []
+    return [word + SEPARATOR + name for word in dict.fromkeys(text.split()[1:])]
+
+
+class NameIndex:
+    """Prefix and fuzzy search over a growing set of user names."""
+
+    def __init__(self, names=()):
+        self._lock = threading.Lock()
+        names = list(names)
+        keys = [_name_key(name) for name in names]
+        self._names = SortedKeyList(keys)
+        self._words = SortedKeyList(key for name in names for key in _word_keys(name))
+        # Characters used in names; fuzzy lookups only try these
+        self._alphabet = set(''.join(keys))
+        self._alphabet.discard(SEPARATOR)
+
+    def __len__(self):
+        return len(self._names)
+
+    def add_many(self, names):
+        """Index new names (names already indexed are skipped)."""
+        with self._lock:
+            for name in names:
+                key = _name_key(name)
+                if key in self._names:
+                    continue
+                self._names.add(key)
+                self._alphabet.update(name.casefold())
+                for word_key in _word_keys(name):
+                    self._words.add(word_key)
+
+    def prefix(self, prefix, limit=10):
+        """Get up to `limit` names starting with a prefix, ignoring case,
+        in alphabetical order."""
+        key = prefix.casefold().replace(SEPARATOR, '')
+        with self._lock:
+            return self._starting_with(self._names, key, limit)
+
+    def search(self, query, limit=10, fuzzy=True):
+        """Get up to `limit` names matching a query, best matches first.
+
+        Names starting with the query come first, then names with a later
+        word starting with it, then (if fuzzy) names starting with something
+        one typo away from it: a letter missing, extra, wrong or swapped.
+        """
+        key = query.casefold().replace(SEPARATOR, '').strip()
+        if not key or limit <= 0:
+            return []
+        with self._lock:
+            found = dict.fromkeys(self._starting_with(self._names, key, limit))
+            if len(found) < limit:
+                for name in self._starting_with(self._words, key, limit):
+                    found.setdefault(name)
+                    if len(found) == limit:
+                        break
+            if fuzzy and len(found) < limit and len(key) >= FUZZY_MIN_LENGTH:
+                self._fuzzy(key, limit, found)
+        return list(found)
+
+    @staticmethod
+    def _starting_with(keys, prefix, limit):
+        """Get the names of up to `limit` keys whose text starts with prefix."""
+        names = []
+        if limit <= 0:
+            return names
+        for key in keys.iter_from(prefix):
+            if not key.startswith(prefix):
+                break
+            names.append(key.partition(SEPARATOR)[2])
+            if len(names) == limit:
+                break
+        return names
+
+    def _fuzzy(self, key, limit, found):
+        """Add names (or later words) starting with a one-edit variant of
+        key to found."""
+        alphabet = sorted(self._alphabet)
+        for keys in (self._names, self._words):
+            for variant in self._variants(keys, key, alphabet):
+                first = keys.ceiling(variant)
+                if first is None or not first.startswith(variant):
+                    continue
+                for name in self._starting_with(keys, variant, limit - len(found)):
+                    found.setdefault(name)
+                if len(found) >= limit:
+                    return
+
+    @staticmethod
+    def _variants(keys, key, alphabet):
+        """Get the distinct non-empty strings one edit away from key."""
+        # An edit after the longest prefix of key that some key starts with
+        # cannot help, so only positions up to there are tried
+        reach = len(key)
+        while reach:
+            first = keys.ceiling(key[:reach])
+            if first is not None and first.startswith(key[:reach]):
+                break
+            reach -= 1
+
+        variants = []
+        for i in range(min(reach + 1, len(key))):
+            head, tail = key[:i], key[i + 1:]
+            variants.append(head + tail)  # Deleted letter
+            if tail:
+                variants.append(head + tail[0] + key[i] + tail[1:])  # Swapped
+            variants.extend(head + c + tail for c in alphabet if c != key[i])
+        for i in range(min(reach, len(key) - 1) + 1):
+            variants.extend(key[:i] + c + key[i:] for c in alphabet)  # Inserted
+        return [variant for variant in dict.fromkeys(variants) if variant]
@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+"""
+Salty Bet Server - An asyncio HTTP/JSON service wrapping the SaltyBet core.
+
+Only the standard library is used. Endpoints:
+
+    POST /users                    {"name": str}
+    GET  /users/<name>
+    POST /matches                  {"type": str, "wrestlers": [str],
+                                    "payout_mode": "fixed" | "parimutuel"}
+    GET  /matches
+    POST /matches/<id>/bets        {"user": str, "wrestler": str, "amount": int}
+    POST /matches/<id>/lock
+    POST /matches/<id>/resolve     {"winner": str}
+    GET  /matches/<id>/odds
+    GET  /events                   Streams odds and results as NDJSON
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+from urllib.parse import unquote
+
+from SaltyBet import SaltyBet, PAYOUT_FIXED
+from SaltyBetPersistence import DURABILITY_MODES, DURABLE
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 64 * 1024
+# Events buffered for a slow /events client before it is disconnected
+# (odds updates do not count: only the latest odds per match are kept)
+EVENT_QUEUE_SIZE = 1000
+# Seconds between picking up changes other processes saved to a shared ledger
+SYNC_INTERVAL = 1.0
+
+STATUS_TEXT = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    """An error that is sent back to the client as a JSON error response."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class EventSubscriber:
+    """Events waiting to be streamed to one /events client.
+
+    Odds updates for a match replace any earlier one still waiting, so a
+    burst of bets costs a slow client one line per match instead of one per
+    bet.
+    """
+
+    def __init__(self):
+        self.pending = {}  # {key: event} in publish order
+        self.ready = asyncio.Event()
+        self.closed = False
+        self._ids = itertools.count()
+
+    def put(self, event):
+        """Queue an event; returns False if the client has fallen too far behind."""
+        if event.get('event') == 'odds':
+            key = ('odds', event['match'])
+        else:
+            if len(self.pending) >= EVENT_QUEUE_SIZE:
+                return False
+            key = next(self._ids)
+        self.pending[key] = event
+        self.ready.set()
+        return True
+
+    def close(self):
+        """End the stream once the pending events have been sent."""
+        self.closed = True
+        self.ready.set()
+
+    async def get_batch(self):
+        """Wait for events and take all of them (empty once closed)."""
+        while not self.pending and not self.closed:
+            self.ready.clear()
+            await self.ready.wait()
+        events = list(self.pending.values())
+        self.pending.clear()
+        return events
+
+
+class SaltyBetServer:
+    """Serves one SaltyBet instance to many concurrent HTTP clients.
+
+    Core calls run on the event loop thread and never wait for the disk:
+    saves run on a background thread, which group-commits the changes made
+    within `commit_window` seconds of each other. New users and results are
+    only acknowledged once the save covering them is done. SaltyBet's user
+    locks make each bet's balance check and debit atomic.
+    """
+
+    def __init__(self, salty_bet, host='127.0.0.1', port=8080, commit_window=0.0):
+        self.salty_bet = salty_bet
+        self.host = host
+        self.port = port
+        self.commit_window = commit_window
+        salty_bet.start_background_saves(window=commit_window)
+        self.server = None
+        self._subscribers = set()  # EventSubscriber per /events client
+
+    async def start(self):
+        """Start listening; returns once the socket is bound."""
+        self.server = await asyncio.start_server(self._handle_connection,
+                                                 self.host,
+                                                 self.port,
+                                                 backlog=4096)
+        # Report the real port when port 0 (any free port) was requested
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def serve_forever(self):
+        """Start the server and run until cancelled."""
+        if self.server is None:
+            await self.start()
+        print(f"Salty Bet server listening on http://{self.host}:{self.port}")
+        sync_task = None
+        if self.salty_bet.storage.shared:
+            sync_task = asyncio.create_task(self._sync_forever())
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            if sync_task is not None:
+                sync_task.cancel()
+
+    async def _sync_forever(self):
+        """Pick up other processes' changes to the shared ledger now and then."""
+        while True:
+            await asyncio.sleep(SYNC_INTERVAL)
+            self.salty_bet.sync()
+
+    async def close(self):
+        """Stop accepting connections and end all event streams."""
+        for subscriber in list(self._subscribers):
+            subscriber.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def publish(self, event):
+        """Send an event to every /events client."""
+        for subscriber in list(self._subscribers):
+            if not subscriber.put(event):
+                # Too slow to keep up: end its stream rather than buffer forever
+                self._subscribers.discard(subscriber)
+                subscriber.close()
+
+    # Connection handling
+
+    async def _handle_connection(self, reader, writer):
+        """Serve requests on one keep-alive connection."""
+        try:
+            while True:
+                request = await self._read_request(reader, writer)
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+
+                if method == 'GET' and path == '/events':
+                    await self._stream_events(writer)
+                    break
+
+                try:
+                    status, payload = await self._dispatch(method, path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': e.message}
+                except Exception as e:
+                    # A bug in one request must not take the connection down
+                    # without an answer
+                    print(f"Error handling {method} {path}: {e!r}")
+                    status, payload = 500, {'error': "Internal server error"}
+                self._write_json(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader, writer):
+        """Read one request as (method, path, body, keep_alive), or None at EOF."""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            self._write_json(writer, 400, {'error': "Malformed request line"}, False)
+            return None
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            self._write_json(writer, 400, {'error': "Bad Content-Length"}, False)
+            return None
+        if length < 0:
+            self._write_json(writer, 400, {'error': "Bad Content-Length"}, False)
+            return None
+        if length > MAX_BODY_SIZE:
+            self._write_json(writer, 413, {'error': "Request body too large"}, False)
+            return None
+        body = await reader.readexactly(length) if length else b''
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = (connection != 'close' if version == 'HTTP/1.1'
+                      else connection == 'keep-alive')
+        return method.upper(), unquote(target.split('?', 1)[0]), body, keep_alive
+
+    @staticmethod
+    def _write_json(writer, status, payload, keep_alive):
+        """Write a complete JSON response."""
+        body = json.dumps(payload).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'Error')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+
+    async def _stream_events(self, writer):
+        """Stream events as chunked NDJSON until the client goes away."""
+        subscriber = EventSubscriber()
+        self._subscribers.add(subscriber)
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\n"
+                     b"Connection: close\r\n\r\n")
+        try:
+            await writer.drain()
+            while True:
+                events = await subscriber.get_batch()
+                if not events:
+                    break
+                lines = b''.join(json.dumps(event).encode('utf-8') + b'\n'
+                                 for event in events)
+                writer.write(b"%x\r\n%s\r\n" % (len(lines), lines))
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            self._subscribers.discard(subscriber)
+
+    # Routing
+
+    async def _dispatch(self, method, path, body):
+        """Route a request to its handler and return (status, payload)."""
+        parts = [part for part in path.split('/') if part]
+        data = self._parse_body(body) if method == 'POST' else {}
+
+        if parts == ['users']:
+            self._require(method, 'POST')
+            return await self._saved(self._create_user(data))
+        if len(parts) == 2 and parts[0] == 'users':
+            self._require(method, 'GET')
+            return self._get_user(parts[1])
+        if parts == ['matches']:
+            if method == 'GET':
+                return 200, [self._match_info(m)
+                             for m in self.salty_bet.matches.values()]
+            self._require(method, 'POST')
+            return self._open_match(data)
+        if len(parts) == 3 and parts[0] == 'matches':
+            match = self._find_match(parts[1])
+            action = parts[2]
+            if action == 'odds':
+                self._require(method, 'GET')
+                return 200, self._odds_event(match)
+            self._require(method, 'POST')
+            if action == 'bets':
+                return await self._place_bet(match, data)
+            if action == 'lock':
+                return self._lock_match(match)
+            if action == 'resolve':
+                return await self._saved(self._resolve_match(match, data))
+        raise HTTPError(404, f"No such endpoint: {path}")
+
+    async def _saved(self, response):
+        """Hold a response back until the change it reports is saved."""
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, self.salty_bet.wait_for_saves):
+            raise HTTPError(500, "The change was made but could not be saved")
+        return response
+
+    @staticmethod
+    def _require(method, expected):
+        """Reject requests that use the wrong HTTP method."""
+        if method != expected:
+            raise HTTPError(405, f"Use {expected} for this endpoint")
+
+    @staticmethod
+    def _parse_body(body):
+        """Decode a JSON object request body."""
+        if not body:
+            return {}
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise HTTPError(400, "Request body must be JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        return data
+
+    def _find_match(self, match_id):
+        """Look up an unsettled match from a URL path segment."""
+        match = self.salty_bet.matches.get(int(match_id)) if match_id.isdigit() else None
+        if match is None:
+            raise HTTPError(404, f"No open match #{match_id}")
+        return match
+
+    @staticmethod
+    def _match_info(match):
+        """Describe a match as JSON."""
+        return {
+            'id': match.id,
+            'type': match.type,
+            'wrestlers': match.wrestlers,
+            'payout_mode': match.payout_mode,
+            'state': match.state,
+            'bets': len(match.bets),
+            'pool': match.bets.total_pool
+        }
+
+    def _odds_event(self, match):
+        """Build the odds event for a match from its pools and the ratings."""
+        return {
+            'event': 'odds',
+            'match': match.id,
+            'pool': match.bets.total_pool,
+            'pools': dict(zip(match.wrestlers, match.bets.pools)),
+            'odds': match.odds(),
+            'win_probabilities': self.salty_bet.ratings.probabilities(match.wrestlers)
+        }
+
+    # Handlers
+
+    def _create_user(self, data):
+        name = data.get('name')
+        if not isinstance(name, str) or not name.strip():
+            raise HTTPError(400, "A user name is required")
+        name = name.strip()
+        if not self.salty_bet.add_user(name):
+            raise HTTPError(409, f"User '{name}' already exists!")
+        return 201, self.salty_bet.users[name].get_stats()
+
+    def _get_user(self, name):
+        if name not in self.salty_bet.users:
+            raise HTTPError(404, f"User '{name}' not found!")
+        return 200, self.salty_bet.users[name].get_stats()
+
+    def _open_match(self, data):
+        if not isinstance(data.get('type'), str):
+            raise HTTPError(400, "type must be a match type name")
+        if not isinstance(data.get('payout_mode', PAYOUT_FIXED), str):
+            raise HTTPError(400, "payout_mode must be a string")
+        wrestlers = data.get('wrestlers')
+        if not isinstance(wrestlers, list) or not all(
+                isinstance(w, str) for w in wrestlers):
+            raise HTTPError(400, "wrestlers must be a list of names")
+        try:
+            match = self.salty_bet.open_match(
+                data.get('type'), [w.strip() for w in wrestlers],
+                data.get('payout_mode', PAYOUT_FIXED))
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        info = self._match_info(match)
+        self.publish(dict(info, event='match_opened'))
+        return 201, info
+
+    async def _place_bet(self, match, data):
+        user_name = data.get('user')
+        wrestler = data.get('wrestler')
+        amount = data.get('amount')
+        if not isinstance(user_name, str) or not isinstance(wrestler, str):
+            raise HTTPError(400, "user and wrestler are required")
+        if not isinstance(amount, int) or isinstance(amount, bool):
+            raise HTTPError(400, "amount must be a whole number")
+
+        if self.salty_bet.storage.shared:
+            # Checked and written under the lock shared with other processes
+            loop = asyncio.get_running_loop()
+            success, message = await loop.run_in_executor(
+                None, self.salty_bet.place_bet, user_name, wrestler, amount, match.id)
+        else:
+            success, message = self.salty_bet.place_bet(user_name, wrestler,
+                                                        amount, match.id)
+        if not success:
+            raise HTTPError(400, message)
+        self.publish(self._odds_event(match))
+        return 200, {'message': message, 'match': match.id}
+
+    def _lock_match(self, match):
+        success, message = self.salty_bet.lock_match(match.id)
+        if not success:
+            raise HTTPError(409, message)
+        self.publish({'event': 'match_locked', 'match': match.id})
+        return 200, {'message': message}
+
+    def _resolve_match(self, match, data):
+        if not isinstance(data.get('winner'), str):
+            raise HTTPError(400, "winner must be a wrestler name")
+        try:
+            result = self.salty_bet.resolve_match(data.get('winner'), match.id)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+        summary = {
+            'event': 'result',
+            'match': match.id,
+            'winner': result.winner,
+            'bets': len(result),
+            'refunded': result.refunded,
+            'total_wagered': result.total_wagered,
+            'total_paid': result.total_paid,
+            'total_bailouts': result.total_bailouts,
+            'bankruptcies': len(result.bankruptcies()),
+            'saved': result.saved
+        }
+        self.publish(summary)
+        return 200, summary
+
+
+class SaltyBetClient:
+    """Minimal asyncio HTTP/JSON client for a SaltyBetServer (one keep-alive connection)."""
+
+    def __init__(self, host='127.0.0.1', port=8080):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self._lock = asyncio.Lock()  # One request at a time per connection
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+    async def request(self, method, path, payload=None):
+        """Send a request and return (status, decoded JSON body)."""
+        async with self._lock:
+            return await self._request(method, path, payload)
+
+    async def _request(self, method, path, payload):
+        if self.writer is None:
+            await self.connect()
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.writer.write(
+            (f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+             f"Content-Type: application/json\r\n"
+             f"Content-Length: {len(body)}\r\n\r\n").encode('latin-1') + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        data = await self.reader.readexactly(length)
+        return status, json.loads(data)
+
+    async def events(self):
+        """Yield events from GET /events until the server ends the stream."""
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(f"GET /events HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode('latin-1'))
+            await writer.drain()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            while True:
+                size = int((await reader.readline()).strip(), 16)
+                if size == 0:
+                    break
+                chunk = await reader.readexactly(size + 2)
+                for line in chunk[:-2].splitlines():
+                    yield json.loads(line)
+        finally:
+            writer.close()
+
+
+def main():
+    """Run the server from the command line."""
+    parser = argparse.ArgumentParser(description="Salty Bet HTTP/JSON server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--data-file', default=None)
+    parser.add_argument('--storage', default=None,
+                        choices=['json', 'ledger', 'sqlite', 'binary'])
+    parser.add_argument('--durability', choices=DURABILITY_MODES, default=DURABLE,
+                        help="durable: fsync every save; fast: let the OS flush")
+    parser.add_argument('--commit-window', type=float, default=0.0, metavar='MS',
+                        help="Group-commit the changes made within this many "
+                        "milliseconds into one save")
+    parser.add_argument('--cache-size', type=int, default=None, metavar='USERS',
+                        help="Keep at most this many users in memory (sqlite storage)")
+    parser.add_argument('--shared', action='store_true',
+                        help="Share the ledger with other processes (ledger storage)")
+    args = parser.parse_args()
+
+    try:
+        salty_bet = SaltyBet(args.data_file, args.storage, verbose=False,
+                             durability=args.durability, cache_size=args.cache_size,
+                             shared=args.shared)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    server = SaltyBetServer(salty_bet, args.host, args.port,
+                            args.commit_window / 1000)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("Server stopped.")
+    finally:
+        server.salty_bet.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""
+Salty Bet Shards - Settle huge tournaments across several worker processes.
+
+Users are split between shards by a stable hash of their name. Each shard is
+a worker process that owns its users (in a data file of its own) and its
+part of every bet book, so bets are routed to the owning shard and
+settlement fans out to all shards at once. The coordinator merges what comes
+back: totals, bailouts and the leaderboard.
+
+A shard can fail after the others have already settled their part of a
+match. resolve_match() then raises with the match left partly settled, and
+calling it again with the same winner settles just the remaining shards.
+
+Fixed payouts settle in a single round trip. Parimutuel payouts depend on
+the pools of every shard, so the coordinator first collects each shard's
+floor shares and largest remainders and then hands out the leftover
+WrestleBucks exactly as parimutuel_payouts would for one big bet book.
+"""
+
+import heapq
+import multiprocessing
+import os
+import threading
+import zlib
+from array import array
+from pathlib import Path
+
+from SaltyBet import (MATCH_OPEN, MATCH_LOCKED, MATCH_SETTLED, PAYOUT_FIXED,
+                      PAYOUT_PARIMUTUEL, Match, SaltyBet, check_match)
+from SaltyBetRatings import RatingModel
+from SaltyBetWrestlers import WrestlerRegistry
+
+try:
+    import numpy as np
+except ImportError:  # Shards fall back to plain Python settlement
+    np = None
+
+# Users kept on the merged leaderboard returned after each settlement
+SHARD_LEADERBOARD_SIZE = 10
+
+
+def shard_of(name, shards):
+    """Get the shard that owns a user (the same in every process)."""
+    return zlib.crc32(name.encode('utf-8')) % shards
+
+
+def shard_file(data_file, shard, shards):
+    """Get the data file of one shard, next to the main data file."""
+    path = Path(data_file)
+    return path.with_name(f"{path.stem}.shard{shard}of{shards}{path.suffix}")
+
+
+class _Shard:
+    """The state a worker process owns: its users and its part of each match."""
+
+    def __init__(self, data_file, storage):
+        self.game = SaltyBet(data_file, storage=storage, columnar=np is not None,
+                             history=False, verbose=False)
+        self.sequences = {}  # {match_id: global bet number, in bet book order}
+        self.pending = {}  # {match_id: (floor payouts, remainders)}
+
+    def add_users(self, names):
+        return self.game.add_users(names)
+
+    def get_user(self, name):
+        user = self.game.users.get(name)
+        return None if user is None else user.get_stats()
+
+    def leaderboard(self, column, limit):
+        return self.game.get_leaderboard(column, limit)
+
+    def stats(self):
+        return self.game.get_aggregate_stats()
+
+    def place_bets(self, match_id, match_type, wrestlers, payout_mode, bets):
+        """Place (sequence, user, wrestler, amount) bets, opening the match if new."""
+        if self.game.get_match(match_id) is None:
+            self.game.open_match(match_type, wrestlers, payout_mode, match_id)
+            self.sequences[match_id] = array('q')
+        sequences = self.sequences[match_id]
+        replies = []
+        for sequence, user_name, wrestler, amount in bets:
+            success, message = self.game.place_bet(user_name, wrestler, amount,
+                                                   match_id)
+            if success:
+                sequences.append(sequence)
+            replies.append((success, message))
+        return replies
+
+    def prepare(self, match_id, winner_pick, total_pool, winning_pool):
+        """Work out the floor of every parimutuel share; return their sum."""
+        book = self.game.get_match(match_id).bets
+        if np is not None and max(book.amounts) * total_pool < 2**63:
+            won = np.frombuffer(book.picks, dtype=np.int8) == winner_pick
+            shares = np.where(won, np.frombuffer(book.amounts, dtype=np.int64), 0)
+            shares *= total_pool
+            payouts, remainders = np.divmod(shares, winning_pool)
+            floor_total = int(payouts.sum())
+        else:
+            payouts, remainders = [], []
+            for pick, amount in zip(book.picks, book.amounts):
+                payout, remainder = (divmod(amount * total_pool, winning_pool)
+                                     if pick == winner_pick else (0, 0))
+                payouts.append(payout)
+                remainders.append(remainder)
+            floor_total = sum(payouts)
+        self.pending[match_id] = (payouts, remainders)
+        return floor_total
+
+    def candidates(self, match_id, leftover):
+        """Get this shard's best `leftover` claims on the rounding leftover.
+
+        Claims are (-remainder, sequence) so that the coordinator can merge
+        every shard's sorted list: largest remainder first, earliest bet
+        first on ties.
+        """
+        _, remainders = self.pending[match_id]
+        sequences = self.sequences[match_id]
+        if np is not None and isinstance(remainders, np.ndarray):
+            positions = np.nonzero(remainders)[0]
+            claimed = remainders[positions]
+            numbers = np.frombuffer(sequences, dtype=np.int64)[positions]
+            order = np.lexsort((numbers, -claimed))[:leftover]
+            return list(zip((-claimed[order]).tolist(), numbers[order].tolist()))
+        claims = sorted((-remainder, sequence)
+                        for remainder, sequence in zip(remainders, sequences)
+                        if remainder)
+        return claims[:leftover]
+
+    def settle(self, match_id, winner, extra, refund, limit):
+        """Settle this shard's part of a match and summarize it.
+
+        `extra` holds the sequence numbers of bets that get one more
+        WrestleBuck from the parimutuel rounding leftover.
+        """
+        pool_payouts = None
+        # Kept until the match settles, so that a failed settlement can be retried
+        pending = self.pending.get(match_id)
+        sequences = self.sequences[match_id]
+        if pending is not None:
+            # A copy, so that a retry after a failed settlement starts from
+            # the floor payouts again instead of adding the extras twice
+            pool_payouts = pending[0].copy()
+            if extra:
+                extra = set(extra)
+                positions = [i for i, sequence in enumerate(sequences)
+                             if sequence in extra]
+                if np is not None and isinstance(pool_payouts, np.ndarray):
+                    pool_payouts[positions] += 1
+                else:
+                    for position in positions:
+                        pool_payouts[position] += 1
+
+        result = self.game.resolve_match(winner, match_id, pool_payouts, refund)
+        self.pending.pop(match_id, None)
+        del self.sequences[match_id]
+        return {
+            'bets': len(result),
+            'wagered': result.total_wagered,
+            'paid': 0 if result.refunded else result.total_paid,
+            'bailouts': result.total_bailouts,
+            'bankruptcies': result.bankruptcies(),
+            'leaders': self.game.get_leaderboard('wrestlebucks', limit),
+            'saved': result.saved
+        }
+
+    def close(self):
+        self.game.close()
+
+
+def _shard_worker(connection, data_file, storage):
+    """Serve commands from the coordinator until told to close."""
+    shard = _Shard(data_file, storage)
+    while True:
+        command, args = connection.recv()
+        try:
+            reply = (True, getattr(shard, command)(*args))
+        except Exception as e:
+            reply = (False, f"{type(e).__name__}: {e}")
+        connection.send(reply)
+        if command == 'close':
+            break
+    connection.close()
+
+
+class ShardedSaltyBet:
+    """A SaltyBet whose users and bets are spread over worker processes.
+
+    One call fans out to every shard involved before waiting for any reply,
+    so the shards work in parallel. Matches are coordinated here: the
+    coordinator assigns match IDs and a global sequence number to every bet,
+    keeps the pools and the wrestler records, and decides when betting
+    closes.
+    """
+
+    def __init__(self, data_file=None, shards=None, storage='ledger'):
+        self.shards = max(1, shards or os.cpu_count() or 1)
+        if data_file is None:
+            # Next to the data file a single-process SaltyBet would use
+            data_file = SaltyBet._get_safe_data_file_path()
+        self.data_file = data_file
+        self._lock = threading.Lock()  # One conversation with the shards at a time
+        self._connections = []
+        self._workers = []
+        for shard in range(self.shards):
+            parent, child = multiprocessing.Pipe()
+            worker = multiprocessing.Process(
+                target=_shard_worker,
+                args=(child, str(shard_file(data_file, shard, self.shards)), storage),
+                daemon=True)
+            worker.start()
+            child.close()
+            self._connections.append(parent)
+            self._workers.append(worker)
+
+        self.matches = {}  # {match_id: Match} for unsettled matches
+        self._pools = {}  # {match_id: WrestleBucks bet on each wrestler}
+        self._sequences = {}  # {match_id: next bet sequence number}
+        self._betting_shards = {}  # {match_id: shards holding bets}
+        self._settling = {}  # {match_id: settlement some shards have not finished}
+        self._next_match_id = 1
+        self.wrestlers = WrestlerRegistry()
+        self.ratings = RatingModel(self.wrestlers)
+
+    def _exchange(self, calls):
+        """Send {shard: (command, args)} to every shard, then gather the
+        (success, value) replies."""
+        with self._lock:
+            for shard, call in calls.items():
+                self._connections[shard].send(call)
+            return {shard: self._connections[shard].recv() for shard in calls}
+
+    def _fan_out(self, calls):
+        """Run {shard: (command, args)} and return the values; raise if any shard failed."""
+        replies = self._exchange(calls)
+        for shard, (success, value) in replies.items():
+            if not success:
+                raise RuntimeError(f"Shard {shard}: {value}")
+        return {shard: value for shard, (_, value) in replies.items()}
+
+    def _everywhere(self, command, *args):
+        """Run the same command on every shard; return the replies in shard order."""
+        replies = self._fan_out({shard: (command, args)
+                                 for shard in range(self.shards)})
+        return [replies[shard] for shard in range(self.shards)]
+
+    def close(self):
+        """Stop the shard workers (each one saves on the way out)."""
+        if not self._workers:
+            return
+        self._everywhere('close')
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    # Users
+
+    def add_users(self, names):
+        """Add many users; return how many were new."""
+        groups = {}
+        for name in names:
+            groups.setdefault(shard_of(name, self.shards), []).append(name)
+        replies = self._fan_out({shard: ('add_users', (group,))
+                                 for shard, group in groups.items()})
+        return sum(replies.values())
+
+    def add_user(self, name):
+        """Add a user; return False if they already exist."""
+        return self.add_users([name]) == 1
+
+    def get_user(self, name):
+        """Get a user's stats, or None if they do not exist."""
+        shard = shard_of(name, self.shards)
+        return self._fan_out({shard: ('get_user', (name,))})[shard]
+
+    def get_leaderboard(self, column='wrestlebucks', limit=10):
+        """Merge every shard's leaderboard into the overall top `limit`."""
+        leaders = self._everywhere('leaderboard', column, limit)
+
+        def rank_key(stats):
+            if column == 'win_rate':
+                games = stats['wins'] + stats['losses']
+                return (-stats['wins'] / games, -games, stats['name'])
+            return (-stats[column], stats['name'])
+
+        return heapq.nsmallest(limit, (stats for shard in leaders for stats in shard),
+                               key=rank_key)
+
+    def get_aggregate_stats(self):
+        """Combine the aggregate stats of every shard.
+
+        Percentiles cannot be merged from per-shard percentiles, so they are
+        left out; everything else is exact.
+        """
+        shards = [stats for stats in self._everywhere('stats') if stats['users']]
+        if not shards:
+            return {'users': 0}
+        users = sum(stats['users'] for stats in shards)
+        total_wrestlebucks = sum(stats['total_wrestlebucks'] for stats in shards)
+        total_wins = sum(stats['total_wins'] for stats in shards)
+        total_losses = sum(stats['total_losses'] for stats in shards)
+        total_games = total_wins + total_losses
+        return {
+            'users': users,
+            'total_wrestlebucks': total_wrestlebucks,
+            'mean_wrestlebucks': total_wrestlebucks / users,
+            'min_wrestlebucks': min(stats['min_wrestlebucks'] for stats in shards),
+            'max_wrestlebucks': max(stats['max_wrestlebucks'] for stats in shards),
+            'total_wins': total_wins,
+            'total_losses': total_losses,
+            'win_rate': (total_wins / total_games * 100) if total_games > 0 else 0
+        }
+
+    # Matches
+
+    def open_match(self, match_type, wrestlers, payout_mode=PAYOUT_FIXED):
+        """Open a match for betting on every shard. Returns the Match."""
+        check_match(match_type, wrestlers, payout_mode)
+        wrestler_ids = [self.wrestlers.intern(w) for w in wrestlers]
+        with self._lock:
+            match = Match(self._next_match_id, match_type, wrestlers, payout_mode,
+                          wrestler_ids)
+            self._next_match_id += 1
+            self.matches[match.id] = match
+            self._pools[match.id] = [0] * len(wrestlers)
+            self._sequences[match.id] = 0
+            self._betting_shards[match.id] = set()
+        return match
+
+    def get_match(self, match_id=None):
+        """Get an unsettled match by ID (the newest one if match_id is None)."""
+        if match_id is None:
+            return next(reversed(self.matches.values()), None)
+        return self.matches.get(match_id)
+
+    def lock_match(self, match_id=None):
+        """Close betting on a match."""
+        match = self.get_match(match_id)
+        if match is None:
+            return False, "No match to lock!"
+        if match.state != MATCH_OPEN:
+            return False, f"Match #{match.id} is not open for betting!"
+        match.state = MATCH_LOCKED
+        return True, f"Betting on match #{match.id} is now closed!"
+
+    def place_bet(self, user_name, wrestler, amount, match_id=None):
+        """Place one bet; returns (success, message)."""
+        return self.place_bets([(user_name, wrestler, amount)], match_id)[0]
+
+    def place_bets(self, bets, match_id=None):
+        """Place a batch of (user, wrestler, amount) bets on one match.
+
+        Each shard gets its bets in one message. Returns a (success,
+        message) pair per bet, in order.
+        """
+        bets = list(bets)
+        match = self.get_match(match_id)
+        if match is None:
+            return [(False, "No match is currently set up!")] * len(bets)
+        if match.state != MATCH_OPEN:
+            return [(False, f"Betting on match #{match.id} is closed!")] * len(bets)
+
+        groups = {}
+        sequence = self._sequences[match.id]
+        for position, (user_name, wrestler, amount) in enumerate(bets):
+            groups.setdefault(shard_of(user_name, self.shards), []).append(
+                (sequence + position, user_name, wrestler, amount))
+        self._sequences[match.id] = sequence + len(bets)
+
+        header = (match.id, match.type, match.wrestlers, match.payout_mode)
+        replies = self._fan_out({shard: ('place_bets', header + (group,))
+                                 for shard, group in groups.items()})
+
+        results = [None] * len(bets)
+        pools = self._pools[match.id]
+        for shard, group in groups.items():
+            for (number, _, wrestler, amount), reply in zip(group, replies[shard]):
+                results[number - sequence] = reply
+                if reply[0]:
+                    pools[match.wrestler_index[wrestler]] += amount
+                    self._betting_shards[match.id].add(shard)
+        return results
+
+    def resolve_match(self, winner, match_id=None, limit=SHARD_LEADERBOARD_SIZE):
+        """Settle a match on every shard at once and merge the results.
+
+        Returns a summary dict of totals, bankruptcies and the overall
+        wrestlebucks leaderboard; `unsaved_shards` lists the shards that
+        settled but could not save. Raises ValueError if the match cannot be
+        resolved, and RuntimeError if some shards failed to settle: the
+        others keep their part settled, and resolving the match again with
+        the same winner settles the rest.
+        """
+        match = self.get_match(match_id)
+        if match is None:
+            raise ValueError("No match to resolve!")
+        if winner not in match.wrestler_index:
+            raise ValueError(f"Wrestler '{winner}' is not in this match!")
+        if match.state == MATCH_SETTLED:
+            raise ValueError(f"Match #{match.id} is already settled!")
+        settling = self._settling.get(match.id)
+        if settling is None:
+            settling = self._prepare_settlement(match, winner)
+            self._settling[match.id] = settling
+            match.state = MATCH_LOCKED  # No more bets once any shard settles
+        elif winner != settling['winner']:
+            raise ValueError(f"Match #{match.id} is partly settled with "
+                             f"'{settling['winner']}' as the winner!")
+
+        summaries = settling['summaries']
+        replies = self._exchange({
+            shard: ('settle', (match.id, winner, extra, settling['refund'], limit))
+            for shard, extra in settling['extra'].items() if shard not in summaries})
+        failed = []
+        for shard, (success, value) in sorted(replies.items()):
+            if success:
+                summaries[shard] = value
+            else:
+                failed.append(f"Shard {shard}: {value}")
+        if failed:
+            raise RuntimeError(
+                f"Match #{match.id} is only partly settled ({len(summaries)} of "
+                f"{len(settling['extra'])} shards); resolve it again to settle "
+                f"the rest. " + "; ".join(failed))
+        del self._settling[match.id]
+        refund = settling['refund']
+        pools = self._pools[match.id]
+        winner_pick = match.wrestler_index[winner]
+
+        match.state = MATCH_SETTLED
+        match.winner = winner
+        paid = sum(summary['paid'] for summary in summaries.values())
+        self.wrestlers.record_match(match.type, match.wrestler_ids,
+                                    match.wrestler_ids[winner_pick], pools, paid)
+        self.ratings.update(match.wrestler_ids, match.wrestler_ids[winner_pick])
+        with self._lock:
+            del self.matches[match.id]
+            del self._pools[match.id]
+            del self._sequences[match.id]
+            del self._betting_shards[match.id]
+
+        unsaved = sorted(shard for shard, summary in summaries.items()
+                         if not summary['saved'])
+        if unsaved:
+            print(f"Error saving match #{match.id} on shard(s) "
+                  f"{', '.join(map(str, unsaved))}")
+        leaders = [stats for summary in summaries.values()
+                   for stats in summary['leaders']]
+        return {
+            'match_id': match.id,
+            'winner': winner,
+            'refunded': refund,
+            'bets': sum(summary['bets'] for summary in summaries.values()),
+            'total_wagered': sum(summary['wagered'] for summary in summaries.values()),
+            'total_paid': paid,
+            'total_bailouts': sum(summary['bailouts']
+                                  for summary in summaries.values()),
+            'bankruptcies': [entry for summary in summaries.values()
+                             for entry in summary['bankruptcies']],
+            'leaderboard': heapq.nsmallest(
+                limit, leaders, key=lambda s: (-s['wrestlebucks'], s['name'])),
+            'saved': not unsaved,
+            'unsaved_shards': unsaved
+        }
+
+    def _prepare_settlement(self, match, winner):
+        """Work out how a match settles on each shard before any shard does.
+
+        Returns {'winner', 'refund', 'extra': {shard: sequence numbers of
+        bets owed one more WrestleBuck}, 'summaries': {}}.
+        """
+        shards = sorted(self._betting_shards[match.id])
+        if not shards:
+            raise ValueError("No bets placed for this match!")
+
+        pools = self._pools[match.id]
+        winner_pick = match.wrestler_index[winner]
+        parimutuel = match.payout_mode == PAYOUT_PARIMUTUEL
+        refund = parimutuel and pools[winner_pick] == 0
+        extra = {shard: [] for shard in shards}
+
+        if parimutuel and not refund:
+            total_pool = sum(pools)
+            floors = self._fan_out({
+                shard: ('prepare', (match.id, winner_pick, total_pool,
+                                    pools[winner_pick]))
+                for shard in shards})
+            leftover = total_pool - sum(floors.values())
+            if leftover:
+                claims = self._fan_out({shard: ('candidates', (match.id, leftover))
+                                        for shard in shards})
+                streams = [[(remainder, sequence, shard)
+                            for remainder, sequence in claims[shard]]
+                           for shard in shards]
+                for _, sequence, shard in heapq.nsmallest(
+                        leftover, heapq.merge(*streams)):
+                    extra[shard].append(sequence)
+        return {'winner': winner, 'refund': refund, 'extra': extra, 'summaries': {}}
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Salty Bet Sim - Monte Carlo simulation of bettors playing many matches.
+
+Every simulation is an independent world of bettors who each bet on a random
+wrestler in every match. All worlds advance one match at a time as NumPy
+arrays, and settlement goes through the same settle_arrays and
+parimutuel_payouts functions the game uses, so payouts and bailouts follow
+the production rules exactly. Worlds are split across processes with
+independent, reproducible random streams.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from SaltyBet import (MATCH_TYPES, PAYOUT_FIXED, PAYOUT_PARIMUTUEL,
+                      STARTING_WRESTLEBUCKS, parimutuel_payouts, settle_arrays)
+
+try:
+    import numpy as np
+except ImportError:  # The simulator needs NumPy; see run_simulation
+    np = None
+
+# How bettors size their bets: a flat amount, a fraction of their balance,
+# or everything they have
+STRATEGIES = ('flat', 'fraction', 'all_in')
+
+# Money supply samples in the report
+SUPPLY_SAMPLES = 10
+
+
+def bet_amounts(strategy, balances, bet=100, fraction=0.1):
+    """Get each bettor's bet, kept within what User.place_bet accepts."""
+    if strategy == 'flat':
+        amounts = np.full_like(balances, bet)
+    elif strategy == 'fraction':
+        amounts = (balances * fraction).astype(np.int64)
+    elif strategy == 'all_in':
+        amounts = balances.copy()
+    else:
+        raise ValueError(f"Unknown strategy '{strategy}'")
+    # Bets must be positive and no more than the bettor's balance
+    return np.clip(amounts, 1, balances)
+
+
+def _pool_payouts(amounts, won):
+    """Parimutuel payouts in every world at once; arrays are (worlds, bettors).
+
+    Each row comes out exactly as parimutuel_payouts would split it (floor
+    shares, leftover WrestleBucks to the largest remainders, earliest bettor
+    first on ties). A world where nobody backed the winner gets every bet
+    refunded, like SaltyBet.resolve_match.
+    """
+    winning = np.where(won, amounts, 0)
+    winning_pools = winning.sum(axis=1, keepdims=True)
+    totals = amounts.sum(axis=1, keepdims=True)
+    backed = winning_pools[:, 0] > 0
+    if int(winning.max(initial=0)) * int(totals.max(initial=0)) >= 2**63:
+        # Too big for int64 arithmetic: split world by world with Python integers
+        pool_payouts = amounts.copy()
+        for world in np.nonzero(backed)[0]:
+            pool_payouts[world] = parimutuel_payouts(amounts[world], won[world],
+                                                     int(totals[world, 0]))
+        return pool_payouts
+
+    payouts, remainders = np.divmod(winning * totals, np.maximum(winning_pools, 1))
+    leftovers = totals - payouts.sum(axis=1, keepdims=True)
+    # Rank every bet by remainder within its world (a stable sort keeps bet
+    # order among equal remainders); the first `leftover` ranks get one more
+    order = np.argsort(-remainders, axis=1, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order,
+                      np.broadcast_to(np.arange(order.shape[1]), order.shape), axis=1)
+    payouts += ranks < leftovers
+    return np.where(backed[:, None], payouts, amounts)
+
+
+def _settle_round(amounts, won, balances, payout_mode, rng):
+    """Settle one match in every world; arrays are (worlds, bettors)."""
+    after_bets = balances - amounts
+    pool_payouts = None
+    if payout_mode == PAYOUT_PARIMUTUEL:
+        pool_payouts = _pool_payouts(amounts, won).ravel()
+
+    payouts, new_balances, bailouts = settle_arrays(amounts.ravel(), won.ravel(),
+                                                    after_bets.ravel(), rng,
+                                                    pool_payouts)
+    shape = balances.shape
+    return payouts.reshape(shape), new_balances.reshape(shape), bailouts.reshape(shape)
+
+
+def simulate_chunk(simulations, bettors, matches, strategy='flat', bet=100,
+                   fraction=0.1, match_type="One on One", payout_mode=PAYOUT_FIXED,
+                   seed=None):
+    """Run a group of worlds and return their raw totals (see merge_chunks)."""
+    rng = np.random.default_rng(seed)
+    wrestler_count = MATCH_TYPES[match_type]
+    shape = (simulations, bettors)
+    balances = np.full(shape, STARTING_WRESTLEBUCKS, dtype=np.int64)
+    first_bankruptcy = np.full(shape, -1, dtype=np.int64)
+    supply = np.zeros(matches, dtype=np.int64)
+    totals = {'wagered': 0, 'paid': 0, 'bailouts': 0, 'bankruptcies': 0}
+
+    for match in range(matches):
+        amounts = bet_amounts(strategy, balances, bet, fraction)
+        picks = rng.integers(0, wrestler_count, size=shape, dtype=np.int8)
+        winners = rng.integers(0, wrestler_count, size=(simulations, 1), dtype=np.int8)
+        won = picks == winners
+
+        payouts, balances, bailouts = _settle_round(amounts, won, balances,
+                                                    payout_mode, rng)
+
+        broke = bailouts > 0
+        first_bankruptcy[broke & (first_bankruptcy < 0)] = match
+        totals['wagered'] += int(amounts.sum())
+        totals['paid'] += int(payouts.sum())
+        totals['bailouts'] += int(bailouts.sum())
+        totals['bankruptcies'] += int(np.count_nonzero(broke))
+        supply[match] = balances.sum()
+
+    return {
+        'balances': balances.ravel(),
+        'first_bankruptcy': first_bankruptcy.ravel(),
+        'supply': supply,
+        'totals': totals
+    }
+
+
+def merge_chunks(chunks):
+    """Combine the results of simulate_chunk calls."""
+    totals = {key: sum(chunk['totals'][key] for chunk in chunks)
+              for key in chunks[0]['totals']}
+    return {
+        'balances': np.concatenate([chunk['balances'] for chunk in chunks]),
+        'first_bankruptcy': np.concatenate(
+            [chunk['first_bankruptcy'] for chunk in chunks]),
+        'supply': sum(chunk['supply'] for chunk in chunks),
+        'totals': totals
+    }
+
+
+def run_simulation(simulations=1000, bettors=100, matches=1000, strategy='flat',
+                   bet=100, fraction=0.1, match_type="One on One",
+                   payout_mode=PAYOUT_FIXED, seed=None, processes=1):
+    """Simulate many worlds of bettors and report what happened to the money.
+
+    Results depend only on the arguments: the same seed and number of
+    processes always give the same report.
+    """
+    if np is None:
+        raise RuntimeError("The simulator needs NumPy")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}'")
+    if match_type not in MATCH_TYPES:
+        raise ValueError(f"Unknown match type '{match_type}'!")
+    if payout_mode not in (PAYOUT_FIXED, PAYOUT_PARIMUTUEL):
+        raise ValueError(f"Unknown payout mode '{payout_mode}'!")
+    if min(simulations, bettors, matches) < 1:
+        raise ValueError("Simulations, bettors and matches must all be at least 1!")
+
+    processes = max(1, min(processes, simulations))
+    seeds = np.random.SeedSequence(seed).spawn(processes)
+    sizes = [len(part) for part in np.array_split(np.arange(simulations), processes)]
+    jobs = [(size, bettors, matches, strategy, bet, fraction, match_type,
+             payout_mode, child) for size, child in zip(sizes, seeds)]
+
+    if processes == 1:
+        chunks = [simulate_chunk(*jobs[0])]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            chunks = list(pool.map(simulate_chunk, *zip(*jobs)))
+    merged = merge_chunks(chunks)
+    return _report(merged, simulations, bettors, matches, strategy, match_type,
+                   payout_mode)
+
+
+def _report(merged, simulations, bettors, matches, strategy, match_type,
+            payout_mode):
+    """Summarize merged simulation results."""
+    balances = merged['balances']
+    first = merged['first_bankruptcy']
+    totals = merged['totals']
+    went_broke = first[first >= 0]
+    starting_supply = STARTING_WRESTLEBUCKS * simulations * bettors
+    p1, p10, p50, p90, p99 = np.percentile(balances, [1, 10, 50, 90, 99],
+                                           method='nearest').tolist()
+    samples = np.unique(np.linspace(0, matches - 1, SUPPLY_SAMPLES).astype(int))
+
+    return {
+        'simulations': simulations,
+        'bettors': bettors,
+        'matches': matches,
+        'strategy': strategy,
+        'match_type': match_type,
+        'payout_mode': payout_mode,
+        'final_balance': {
+            'mean': float(balances.mean()),
+            'min': int(balances.min()),
+            'p1': p1,
+            'p10': p10,
+            'p50': p50,
+            'p90': p90,
+            'p99': p99,
+            'max': int(balances.max())
+        },
+        # Share of all bets that left the bettor broke
+        'bankruptcy_rate': totals['bankruptcies'] / (simulations * bettors * matches),
+        'ever_bankrupt': len(went_broke) / len(first),
+        'median_matches_to_bankruptcy':
+        (float(np.median(went_broke)) + 1 if len(went_broke) else None),
+        'total_wagered': totals['wagered'],
+        'total_paid': totals['paid'],
+        'total_bailouts': totals['bailouts'],
+        # Money created = payouts beyond what was bet, plus bailouts
+        'money_created': int(merged['supply'][-1]) - starting_supply,
+        'supply_per_simulation': [(int(match) + 1,
+                                   float(merged['supply'][match]) / simulations)
+                                  for match in samples]
+    }
+
+
+def print_report(report):
+    """Print a simulation report."""
+    print(f"{report['simulations']} simulations x {report['bettors']} bettors x "
+          f"{report['matches']} {report['match_type']} matches "
+          f"({report['strategy']} bets, {report['payout_mode']} payouts)")
+    balance = report['final_balance']
+    print(f"Final balances: mean {balance['mean']:.1f}, median {balance['p50']}, "
+          f"p1 {balance['p1']}, p99 {balance['p99']}, "
+          f"range {balance['min']}..{balance['max']}")
+    print(f"Bankruptcy rate per bet: {report['bankruptcy_rate'] * 100:.3f}%")
+    print(f"Bettors who ever went broke: {report['ever_bankrupt'] * 100:.1f}%")
+    if report['median_matches_to_bankruptcy'] is not None:
+        print(f"Median matches until first bankruptcy: "
+              f"{report['median_matches_to_bankruptcy']:.0f}")
+    print(f"WrestleBucks wagered {report['total_wagered']}, paid "
+          f"{report['total_paid']}, bailouts {report['total_bailouts']}")
+    print(f"WrestleBucks created: {report['money_created']}")
+    print("Money supply per simulation:")
+    for match, supply in report['supply_per_simulation']:
+        print(f"  after match {match}: {supply:.0f}")
+
+
+def _positive_int(text):
+    """argparse type for counts that must be at least 1."""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+
+def main():
+    """Run a simulation from the command line."""
+    parser = argparse.ArgumentParser(description="Salty Bet Monte Carlo simulator")
+    parser.add_argument('--simulations', type=_positive_int, default=1000)
+    parser.add_argument('--bettors', type=_positive_int, default=100)
+    parser.add_argument('--matches', type=_positive_int, default=1000)
+    parser.add_argument('--strategy', choices=STRATEGIES, default='flat')
+    parser.add_argument('--bet', type=int, default=100,
+                        help="WrestleBucks per bet for the flat strategy")
+    parser.add_argument('--fraction', type=float, default=0.1,
+                        help="Share of the balance bet by the fraction strategy")
+    parser.add_argument('--match-type', choices=list(MATCH_TYPES), default="One on One")
+    parser.add_argument('--payout-mode', choices=[PAYOUT_FIXED, PAYOUT_PARIMUTUEL],
+                        default=PAYOUT_FIXED)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--processes', type=int, default=1)
+    args = parser.parse_args()
+
+    try:
+        report = run_simulation(args.simulations, args.bettors, args.matches,
+                                args.strategy, args.bet, args.fraction,
+                                args.match_type, args.payout_mode, args.seed,
+                                args.processes)
+    except (RuntimeError, ValueError) as e:
+        print(f"Error: {e}")
+        return
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
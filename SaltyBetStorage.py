@@ -0,0 +1,723 @@
+#!/usr/bin/env python3
+"""
+Salty Bet Storage - Pluggable places to keep Salty Bet users.
+
+Backends deal in plain user records (the dictionaries produced by
+User.to_dict()) and in objects that have the User attributes, so they know
+nothing else about the game.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from SaltyBetBinary import (columns_from_records, read_user_file,
+                            records_from_columns, write_user_file)
+from SaltyBetLedger import Ledger, apply_record
+from SaltyBetPersistence import FileLock, atomic_write
+
+
+class StorageConflict(OSError):
+    """The data file was changed by another process since it was read."""
+
+
+def _file_signature(path):
+    """Identify a file's current version cheaply (None if it does not exist)."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class _FileGuard:
+    """Keeps a backend that rewrites a whole file from overwriting changes
+    another process saved to it since this one last read or wrote it.
+
+    Reads and writes hold an advisory lock on `<file>.lock`, and a write is
+    refused if the file is no longer the version this process saw.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = FileLock(f"{path}.lock")
+        self.signature = None  # The file as we last read or wrote it
+
+    def seen(self):
+        """Note the file's current version as ours (hold the lock)."""
+        self.signature = _file_signature(self.path)
+
+    @contextmanager
+    def replacing(self):
+        """Hold the lock while the file is replaced, if it is still ours."""
+        with self.lock:
+            if _file_signature(self.path) != self.signature:
+                raise StorageConflict(
+                    f"{self.path} was changed by another process since it was "
+                    f"loaded; not overwriting it. Restart to load the changes, "
+                    f"or share a ledger between processes (shared=True).")
+            yield
+            self.seen()
+
+
+class StorageBackend:
+    """Base class for Salty Bet storage backends."""
+
+    # Lazy backends serve users on demand instead of loading them all up front
+    lazy = False
+    # Whether other processes may change the stored users (see catch_up)
+    shared = False
+    # Whether record_change needs to be called for every user change
+    wants_changes = True
+    # Whether load_columns() is the native (faster) way to load
+    stores_columns = False
+
+    def __init__(self, path, verbose=True):
+        self.path = str(path)
+        # verbose=False keeps routine messages (imports, timings) quiet
+        self.verbose = verbose
+        self.load_timings = {}  # {phase: seconds} for the last load
+        # Whether commits wait for the disk (fsync); see set_durable()
+        self.durable = True
+
+    def set_durable(self, durable):
+        """Choose whether commits are fsynced (durable) or left to the
+        operating system to flush (fast)."""
+        self.durable = durable
+
+    def load(self):
+        """Load all users as {name: record}, or None if there is no data yet."""
+        raise NotImplementedError
+
+    def load_columns(self):
+        """Load all users as (names, wrestlebucks, wins, losses) columns, or
+        None if there is no data yet."""
+        users_data = self.load()
+        if users_data is None:
+            return None
+        return columns_from_records(users_data.values())
+
+    def add(self, user):
+        """Store a newly created user."""
+
+    def record_change(self, user, op, amount):
+        """Called after every bet, payout, loss or bailout of a user."""
+
+    def record_settlement(self, users, names, won, payouts, bailouts):
+        """Called once for a batch-settled match instead of per-user changes."""
+        for name, did_win, payout, bailout in zip(names, won, payouts, bailouts):
+            user = users[name]
+            if did_win:
+                self.record_change(user, 'win', payout)
+            else:
+                self.record_change(user, 'loss', None)
+            if bailout:
+                self.record_change(user, 'bailout', bailout)
+
+    def write_back(self, users):
+        """Write out changes to users that are about to leave memory (lazy
+        backends that hold changes until commit)."""
+
+    def commit(self, users):
+        """Make all changes so far durable. `users` is the {name: User} map."""
+        raise NotImplementedError
+
+    def begin_commit(self, users):
+        """Do the part of a commit that needs the users locked.
+
+        Returns a callable that finishes the commit once the locks are
+        released, or None if the whole commit is already done.
+        """
+        self.commit(users)
+        return None
+
+    def catch_up(self):
+        """Get the changes other processes saved since the last catch-up.
+
+        Returns (users_data, records): {name: record} with every user's
+        values to set first when everything had to be loaded again (else
+        None), then ledger records to apply in order.
+        """
+        return None, []
+
+    def compact(self, wait=False):
+        """Reorganize stored data for faster loading (if supported)."""
+        return None
+
+    def close(self):
+        """Release any open files or connections."""
+
+
+class JSONStorage(StorageBackend):
+    """Keeps every user in one pretty-printed JSON file."""
+
+    wants_changes = False  # Every commit rewrites the whole file anyway
+
+    def __init__(self, path, verbose=True):
+        super().__init__(path, verbose)
+        self.guard = _FileGuard(self.path)
+
+    def load(self):
+        with self.guard.lock:
+            self.guard.seen()
+            if not os.path.exists(self.path):
+                return None
+            start = time.perf_counter()
+            with open(self.path, 'r') as f:
+                users_data = json.load(f)
+        self.load_timings = {'parse': time.perf_counter() - start}
+        return users_data
+
+    def commit(self, users):
+        self.begin_commit(users)()
+
+    def begin_commit(self, users):
+        # Copy the records now; encoding and writing them can happen unlocked
+        users_data = {name: user.to_dict() for name, user in users.items()}
+        return lambda: self._write(users_data)
+
+    def _write(self, users_data):
+        """Write a temp file and swap it in, so a crash never leaves a
+        half-written data file behind."""
+        with self.guard.replacing():
+            atomic_write(self.path, lambda f: json.dump(users_data, f, indent=2),
+                         durable=self.durable)
+
+
+class BinaryStorage(StorageBackend):
+    """Keeps every user in a compact binary file (see SaltyBetBinary).
+
+    Loading reads whole columns at once instead of parsing a record per
+    user. A JSON data file with the same name is imported the first time.
+    """
+
+    wants_changes = False  # Every commit rewrites the whole file anyway
+    stores_columns = True
+
+    def __init__(self, path, import_from=None, verbose=True):
+        super().__init__(path, verbose)
+        self.import_from = import_from
+        self.guard = _FileGuard(self.path)
+
+    def load(self):
+        columns = self.load_columns()
+        if columns is None:
+            return None
+        return records_from_columns(*columns)
+
+    def load_columns(self):
+        with self.guard.lock:
+            self.guard.seen()
+            if not os.path.exists(self.path):
+                if self.import_from and os.path.exists(self.import_from):
+                    return self._import_json()
+                return None
+            start = time.perf_counter()
+            columns = read_user_file(self.path)
+        self.load_timings = {'read': time.perf_counter() - start}
+        return columns
+
+    def _import_json(self):
+        """Convert an existing JSON data file into the binary file."""
+        start = time.perf_counter()
+        with open(self.import_from, 'r') as f:
+            users_data = json.load(f)
+        columns = columns_from_records(users_data.values())
+        write_user_file(self.path, *columns)
+        self.guard.seen()
+        self.load_timings = {'import': time.perf_counter() - start}
+        if self.verbose:
+            print(f"Imported {len(users_data)} users from {self.import_from} into {self.path}")
+        return columns
+
+    def commit(self, users):
+        self.begin_commit(users)()
+
+    def begin_commit(self, users):
+        # Copy the columns now; encoding and writing them can happen unlocked
+        if hasattr(users, 'columns'):
+            columns = users.columns()
+        else:
+            columns = columns_from_records(user.to_dict() for user in users.values())
+        return lambda: self._write(columns)
+
+    def _write(self, columns):
+        with self.guard.replacing():
+            write_user_file(self.path, *columns, durable=self.durable)
+
+
+class LedgerStorage(StorageBackend):
+    """Keeps the JSON data file as a base and appends changes to a ledger.
+
+    Every `compact_every` records the ledger is rotated and folded into a
+    snapshot on a background thread, so startup only replays a short tail.
+    """
+
+    def __init__(self, path, compact_every=10000, shared=False, verbose=True):
+        super().__init__(Path(path).with_suffix('.ledger'), verbose)
+        self.base_path = str(path)
+        # A shared ledger may be appended to by other processes at once
+        self.shared = shared
+        self.ledger = Ledger(self.path, shared)
+        self.compact_every = compact_every
+        self._compaction_thread = None
+        self._reloaded = None  # Users loaded again by a catch-up, not yet taken
+
+    def _locked(self):
+        """Hold the ledger lock shared with other processes, if sharing."""
+        return self.ledger.locked() if self.shared else nullcontext()
+
+    def set_durable(self, durable):
+        super().set_durable(durable)
+        self.ledger.durable = durable
+
+    def load(self):
+        with self._locked():
+            users_data, replayed = self._load_all()
+
+        phases = ", ".join(f"{phase} {seconds * 1000:.1f} ms"
+                           for phase, seconds in self.load_timings.items())
+        if self.verbose:
+            print(f"Startup timings: {phases} ({replayed} ledger records)")
+
+        if not users_data and not replayed and not os.path.exists(self.base_path):
+            return None
+        return users_data
+
+    def _load_all(self):
+        """Load the snapshot (or base file) and replay the ledger on top;
+        returns (users_data, records replayed)."""
+        start = time.perf_counter()
+        snapshot = self._load_snapshot()
+        if snapshot is None:
+            folded, users_data = 0, self._load_base()
+        else:
+            folded, users_data = snapshot
+        self.load_timings = {'snapshot': time.perf_counter() - start}
+
+        start = time.perf_counter()
+        replayed = self._replay(users_data, folded)
+        self.load_timings['replay'] = time.perf_counter() - start
+        if self.shared:
+            self.ledger.mark_read()
+        return users_data, replayed
+
+    def _load_base(self):
+        """Load the JSON data file the ledger is applied on top of."""
+        if not os.path.exists(self.base_path):
+            return {}
+        with open(self.base_path, 'r') as f:
+            return json.load(f)
+
+    def _load_snapshot(self):
+        """Load (last folded segment, users) from the latest snapshot, if
+        there is a readable one."""
+        try:
+            snapshot = self.ledger.read_snapshot()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not read snapshot {self.ledger.snapshot_path}: {e}")
+            return None
+        return snapshot
+
+    def _replay(self, users_data, folded):
+        """Replay the segments not yet in the snapshot, then the active ledger."""
+        replayed = 0
+        for number, path in self.ledger.segments():
+            if number > folded:
+                for record in self.ledger.replay(path):
+                    apply_record(users_data, record)
+                    replayed += 1
+
+        self.ledger.active_records = 0
+        for record in self.ledger.replay():
+            apply_record(users_data, record)
+            self.ledger.active_records += 1
+            replayed += 1
+        return replayed
+
+    def add(self, user):
+        self.ledger.append('add', user.name, user.wrestlebucks)
+
+    def record_change(self, user, op, amount):
+        self.ledger.append(op, user.name, amount)
+
+    def record_settlement(self, users, names, won, payouts, bailouts):
+        self.ledger.append_settlement(names, won, payouts, bailouts)
+
+    def commit(self, users):
+        with self._locked():
+            self._flush()
+        if self.compact_every and self.ledger.active_records >= self.compact_every:
+            self.compact()
+
+    def _flush(self):
+        """Append our records; a shared ledger first reads what other
+        processes appended, so none of it is skipped (hold the lock)."""
+        if self.shared:
+            self._read_changes()
+        self.ledger.flush()
+
+    def _read_changes(self):
+        """Read what other processes appended since we last looked (hold
+        the lock)."""
+        if self.ledger.read_changes():
+            return
+        # Records we had not read yet were compacted away: load everything
+        # again, then reapply our own records that are not written yet
+        self._reloaded, _ = self._load_all()
+        self.ledger.incoming = []
+        for encoded in self.ledger.pending:
+            apply_record(self._reloaded, json.loads(encoded))
+
+    @contextmanager
+    def transaction(self):
+        """Hold the shared ledger lock, and append the records made meanwhile
+        before letting other processes in."""
+        with self._locked():
+            try:
+                yield
+            finally:
+                self._flush()
+
+    def catch_up(self):
+        if not self.shared:
+            return None, []
+        with self._locked():
+            self._read_changes()
+            users_data, records = self._reloaded, self.ledger.incoming
+            self._reloaded, self.ledger.incoming = None, []
+        return users_data, records
+
+    def compact(self, wait=False):
+        """Fold the ledger into a new snapshot on a background thread.
+
+        The active ledger is rotated into a closed segment first, so new
+        records keep being appended while the snapshot is being built.
+        """
+        running = self._compaction_thread
+        if running is not None and running.is_alive():
+            if not wait:
+                return running
+            running.join()
+
+        try:
+            with self._locked():
+                self._flush()
+                segment = self.ledger.rotate()
+        except OSError as e:
+            print(f"File system error rotating ledger: {e}")
+            return None
+        if segment is None:
+            return None
+
+        self._compaction_thread = threading.Thread(target=self._fold_segments,
+                                                   args=(segment, ),
+                                                   daemon=True)
+        self._compaction_thread.start()
+        if wait:
+            self._compaction_thread.join()
+        return self._compaction_thread
+
+    def _fold_segments(self, up_to):
+        """Build a snapshot from the previous one plus closed segments."""
+        try:
+            start = time.perf_counter()
+            # Another process sharing the ledger may be compacting too
+            with self._locked():
+                snapshot = self.ledger.read_snapshot()
+                if snapshot is not None:
+                    folded, users_data = snapshot
+                else:
+                    folded, users_data = 0, self._load_base()
+                if folded >= up_to:
+                    return  # Someone else already folded these segments
+
+                for number, path in self.ledger.segments():
+                    if folded < number <= up_to:
+                        for record in self.ledger.replay(path):
+                            apply_record(users_data, record)
+
+                self.ledger.write_snapshot(up_to, users_data)
+                # Keep the newest folded segment of a shared ledger, so a
+                # process one rotation behind can still catch up from it
+                self.ledger.remove_segments(up_to - 1 if self.shared else up_to)
+            elapsed = (time.perf_counter() - start) * 1000
+            if self.verbose:
+                print(f"Compacted ledger into {self.ledger.snapshot_path} "
+                      f"in {elapsed:.1f} ms")
+        except Exception as e:
+            print(f"Error compacting ledger: {e}")
+
+    def close(self):
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+
+
+class SQLiteStorage(StorageBackend):
+    """Keeps users in an indexed SQLite table and serves them on demand.
+
+    Changed users are written back to the database in batches (on commit,
+    when they are evicted from memory, or before a query that sorts by
+    their values) inside an open transaction and committed together, so a
+    whole match settles atomically and a user who bets, wins and gets a
+    bailout costs one UPDATE.
+    """
+
+    lazy = True
+    # SQL expressions that leaderboards may be sorted by
+    RANKABLE_COLUMNS = {
+        'wrestlebucks': 'wrestlebucks',
+        'wins': 'wins',
+        'losses': 'losses',
+        'win_rate': 'CAST(wins AS REAL) / (wins + losses)'
+    }
+
+    def __init__(self, path, import_from=None, verbose=True):
+        super().__init__(path, verbose)
+        is_new = not os.path.exists(self.path)
+        self._lock = threading.RLock()
+        self._dirty = {}  # {name: User} changed since they were last written
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.set_durable(True)
+        self._create_schema()
+        if is_new and import_from and os.path.exists(import_from):
+            self._import_json(import_from)
+
+    def _create_schema(self):
+        """Create the users table and its indexes if they do not exist."""
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    name TEXT PRIMARY KEY,
+                    wrestlebucks INTEGER NOT NULL,
+                    wins INTEGER NOT NULL,
+                    losses INTEGER NOT NULL
+                )""")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS users_by_wrestlebucks ON users(wrestlebucks)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS users_by_wins ON users(wins)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS users_by_name ON users(name COLLATE NOCASE)")
+
+    def _import_json(self, json_path):
+        """Copy users from an existing JSON data file into a new database."""
+        with open(json_path, 'r') as f:
+            users_data = json.load(f)
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?)",
+                ((data['name'], data['wrestlebucks'], data['wins'],
+                  data['losses']) for data in users_data.values()))
+        if self.verbose:
+            print(f"Imported {len(users_data)} users from {json_path} into {self.path}")
+
+    def load(self):
+        raise NotImplementedError("SQLite users are loaded on demand")
+
+    def get(self, name):
+        """Fetch one user record by name, or None if there is no such user."""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT name, wrestlebucks, wins, losses FROM users WHERE name = ?",
+                (name, )).fetchone()
+        return self._to_record(row) if row is not None else None
+
+    def contains(self, name):
+        """Check whether a user exists."""
+        with self._lock:
+            row = self.connection.execute("SELECT 1 FROM users WHERE name = ?",
+                                          (name, )).fetchone()
+        return row is not None
+
+    def names(self):
+        """Get all user names in insertion order."""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT name FROM users ORDER BY rowid").fetchall()
+        return [row[0] for row in rows]
+
+    def count(self):
+        """Get the number of stored users."""
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def top(self, column, limit, min_games=0):
+        """Get the records with the highest values in a column, best first.
+
+        Only users with at least `min_games` settled bets are ranked by
+        win rate; ties go to the user with more games, then by name.
+        """
+        if column not in self.RANKABLE_COLUMNS:
+            raise ValueError(f"Cannot rank users by '{column}'")
+        if column == 'win_rate':
+            query = (f"SELECT name, wrestlebucks, wins, losses FROM users "
+                     f"WHERE wins + losses >= ? "
+                     f"ORDER BY {self.RANKABLE_COLUMNS[column]} DESC, "
+                     f"wins + losses DESC, name LIMIT ?")
+            params = (max(min_games, 1), limit)
+        else:
+            query = (f"SELECT name, wrestlebucks, wins, losses FROM users "
+                     f"ORDER BY {column} DESC, name LIMIT ?")
+            params = (limit, )
+        with self._lock:
+            self._write_dirty()
+            rows = self.connection.execute(query, params).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def rank(self, column, name, min_games=0):
+        """Get a user's 1-based position in top() order, or None if unranked."""
+        if column not in self.RANKABLE_COLUMNS:
+            raise ValueError(f"Cannot rank users by '{column}'")
+        with self._lock:
+            self._write_dirty()
+        record = self.get(name)
+        if record is None:
+            return None
+        if column == 'win_rate':
+            games = record['wins'] + record['losses']
+            if games < max(min_games, 1):
+                return None
+            value = self.RANKABLE_COLUMNS[column]
+            query = (f"SELECT COUNT(*) FROM users WHERE wins + losses >= ? AND "
+                     f"({value} > ? OR ({value} = ? AND (wins + losses > ? OR "
+                     f"(wins + losses = ? AND name < ?))))")
+            rate = record['wins'] / games
+            params = (max(min_games, 1), rate, rate, games, games, name)
+        else:
+            query = (f"SELECT COUNT(*) FROM users WHERE {column} > ? OR "
+                     f"({column} = ? AND name < ?)")
+            params = (record[column], record[column], name)
+        with self._lock:
+            return self.connection.execute(query, params).fetchone()[0] + 1
+
+    def page(self, column, offset, limit, descending=False):
+        """Get (user count, records) for one page of users sorted by a column.
+
+        Ties are broken by name; users without settled bets sort as a 0% win
+        rate.
+        """
+        if column == 'name':
+            order = "name DESC" if descending else "name"
+        elif column in self.RANKABLE_COLUMNS:
+            direction = "DESC" if descending else ""
+            order = f"COALESCE({self.RANKABLE_COLUMNS[column]}, 0) {direction}, name"
+        else:
+            raise ValueError(f"Cannot sort users by '{column}'")
+        with self._lock:
+            self._write_dirty()
+            total = self.connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            rows = self.connection.execute(
+                f"SELECT name, wrestlebucks, wins, losses FROM users "
+                f"ORDER BY {order} LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return total, [self._to_record(row) for row in rows]
+
+    def add(self, user):
+        with self._lock:
+            self.connection.execute(
+                "INSERT INTO users VALUES (?, ?, ?, ?)",
+                (user.name, user.wrestlebucks, user.wins, user.losses))
+
+    def record_change(self, user, op, amount):
+        with self._lock:
+            self._dirty[user.name] = user
+
+    def write_back(self, users):
+        with self._lock:
+            dirty = self._dirty
+            self._update([user for user in users
+                          if dirty.pop(user.name, None) is not None])
+
+    def _write_dirty(self):
+        """Write every changed user into the open transaction."""
+        if self._dirty:
+            users, self._dirty = list(self._dirty.values()), {}
+            self._update(users)
+
+    def _update(self, users):
+        if users:
+            self.connection.executemany(
+                "UPDATE users SET wrestlebucks = ?, wins = ?, losses = ? WHERE name = ?",
+                [(user.wrestlebucks, user.wins, user.losses, user.name)
+                 for user in users])
+
+    def set_durable(self, durable):
+        # In WAL mode NORMAL skips the fsync on commit but still never
+        # corrupts the database
+        super().set_durable(durable)
+        with self._lock:
+            self.connection.execute(
+                f"PRAGMA synchronous={'FULL' if durable else 'NORMAL'}")
+
+    def commit(self, users):
+        with self._lock:
+            self._write_dirty()
+            self.connection.commit()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    @staticmethod
+    def _to_record(row):
+        """Convert a database row into a user record."""
+        return {
+            'name': row[0],
+            'wrestlebucks': row[1],
+            'wins': row[2],
+            'losses': row[3]
+        }
+
+
+# Storage backend names implied by data file extensions
+STORAGE_BY_SUFFIX = {
+    '.json': 'json',
+    '.ledger': 'ledger',
+    '.db': 'sqlite',
+    '.sqlite': 'sqlite',
+    '.sbu': 'binary',
+}
+
+
+def create_storage(kind, data_file, shared=False, verbose=True):
+    """Create a storage backend by name for a data file path.
+
+    When `kind` is None the backend is chosen from the file extension.
+    With shared=True several processes can use the data at once; only the
+    ledger backend supports that.
+    """
+    if isinstance(kind, StorageBackend):
+        if shared and not kind.shared:
+            raise ValueError("The storage backend is not shared between processes")
+        return kind
+    if kind is None:
+        kind = STORAGE_BY_SUFFIX.get(Path(data_file).suffix.lower(), 'json')
+    if shared and kind != 'ledger':
+        raise ValueError("Only ledger storage can be shared between processes")
+
+    if kind == 'json':
+        return JSONStorage(data_file, verbose)
+    if kind == 'ledger':
+        return LedgerStorage(Path(data_file).with_suffix('.json'), shared=shared,
+                             verbose=verbose)
+    if kind == 'sqlite':
+        data_path = Path(data_file)
+        if STORAGE_BY_SUFFIX.get(data_path.suffix.lower()) != 'sqlite':
+            data_path = data_path.with_suffix('.db')
+        return SQLiteStorage(data_path,
+                             import_from=str(data_path.with_suffix('.json')),
+                             verbose=verbose)
+    if kind == 'binary':
+        data_path = Path(data_file)
+        if data_path.suffix.lower() != '.sbu':
+            data_path = data_path.with_suffix('.sbu')
+        return BinaryStorage(data_path,
+                             import_from=str(data_path.with_suffix('.json')),
+                             verbose=verbose)
+    raise ValueError(f"Unknown storage backend '{kind}'")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Salty Bet Wrestlers - A registry of every wrestler with running counters.
+
+Wrestlers are identified by a canonical key (the lower-cased name), so
+"Hulk Hogan" and "hulk hogan" are the same wrestler. Each wrestler gets an
+interned integer ID, and the counters are plain arrays indexed by that ID,
+so settling a match updates them in O(1) per wrestler.
+"""
+
+import threading
+from array import array
+
+from SaltyBetHistory import HISTORY_MAX_WRESTLERS
+
+try:
+    import numpy as np
+except ImportError:  # Rebuilding from history falls back to plain Python
+    np = None
+
+
+def canonical_name(name):
+    """Get the key that identifies a wrestler regardless of capitalization."""
+    return name.lower()
+
+
+class WrestlerRegistry:
+    """Interned wrestler IDs plus win/loss, betting and head-to-head counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ids = {}  # {canonical name: wrestler ID}
+        self.names = []  # Display name (first spelling seen) by ID
+        self.wins = array('q')
+        self.losses = array('q')
+        self.money_bet = array('q')  # WrestleBucks bet on the wrestler
+        self.money_paid = array('q')  # WrestleBucks paid to their backers
+        self.wins_by_type = []  # {match type: wins} by ID
+        self.head_to_head = {}  # {(winner ID, loser ID): wins}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return canonical_name(name) in self.ids
+
+    def intern(self, name):
+        """Get a wrestler's ID, registering them the first time they are seen."""
+        key = canonical_name(name)
+        wrestler_id = self.ids.get(key)
+        if wrestler_id is None:
+            with self._lock:
+                wrestler_id = self.ids.get(key)
+                if wrestler_id is None:
+                    wrestler_id = len(self.names)
+                    self.names.append(name)
+                    for column in (self.wins, self.losses, self.money_bet,
+                                   self.money_paid):
+                        column.append(0)
+                    self.wins_by_type.append({})
+                    self.ids[key] = wrestler_id
+        return wrestler_id
+
+    def record_match(self, match_type, wrestler_ids, winner_id, pools, paid):
+        """Update the counters for one settled match.
+
+        `pools` is the WrestleBucks bet on each wrestler (in wrestler_ids
+        order) and `paid` is what the winner's backers were paid.
+        """
+        with self._lock:
+            for wrestler_id, pool in zip(wrestler_ids, pools):
+                self.money_bet[wrestler_id] += pool
+                if wrestler_id == winner_id:
+                    continue
+                self.losses[wrestler_id] += 1
+                key = (winner_id, wrestler_id)
+                self.head_to_head[key] = self.head_to_head.get(key, 0) + 1
+
+            self.wins[winner_id] += 1
+            self.money_paid[winner_id] += paid
+            by_type = self.wins_by_type[winner_id]
+            by_type[match_type] = by_type.get(match_type, 0) + 1
+
+    def record_result(self, result):
+        """Update the counters from a MatchResult."""
+        match = result.match
+        wrestler_ids = match.wrestler_ids or [self.intern(w) for w in match.wrestlers]
+        winner_id = wrestler_ids[match.wrestler_index[result.winner]]
+        paid = 0 if result.refunded else result.total_paid
+        self.record_match(match.type, wrestler_ids, winner_id, match.bets.pools,
+                          paid)
+
+    def load_history(self, history):
+        """Rebuild every counter from a MatchHistory in one pass."""
+        matches = history.matches()
+        if not len(matches):
+            return
+        bets = history.bets()
+        slots_per_match = HISTORY_MAX_WRESTLERS
+
+        if np is not None:
+            # Sum bets per (match, pick) and winning payouts per match at once
+            counts = matches['bet_count']
+            match_index = np.repeat(np.arange(len(matches)), counts)
+            slots = match_index * slots_per_match + bets['pick']
+            pools = np.bincount(slots, weights=bets['amount'],
+                                minlength=len(matches) * slots_per_match)
+            pools = pools.reshape(-1, slots_per_match)
+            paid = np.bincount(match_index,
+                               weights=bets['payout'] * bets['won'],
+                               minlength=len(matches))
+            pools = pools.astype(np.int64).tolist()
+            paid = paid.astype(np.int64).tolist()
+        else:
+            pools, paid = [], []
+            for record in matches:
+                first, count = record[2], record[3]
+                match_pools = [0] * slots_per_match
+                match_paid = 0
+                for bet in bets[first:first + count]:
+                    match_pools[bet[2]] += bet[4]
+                    if bet[3]:
+                        match_paid += bet[5]
+                pools.append(match_pools)
+                paid.append(match_paid)
+
+        for position in range(len(matches)):
+            info = history.describe_match(matches[position])
+            wrestler_ids = [self.intern(w) for w in info['wrestlers']]
+            winner_id = self.intern(info['winner'])
+            self.record_match(info['type'], wrestler_ids, winner_id,
+                              pools[position][:len(wrestler_ids)],
+                              0 if info['refunded'] else paid[position])
+
+    # Queries
+
+    def get_stats(self, name):
+        """Get a wrestler's record, or None if they were never registered."""
+        wrestler_id = self.ids.get(canonical_name(name))
+        if wrestler_id is None:
+            return None
+        wins = self.wins[wrestler_id]
+        matches = wins + self.losses[wrestler_id]
+        return {
+            'name': self.names[wrestler_id],
+            'wins': wins,
+            'losses': self.losses[wrestler_id],
+            'win_rate': (wins / matches * 100) if matches > 0 else 0,
+            'wins_by_type': dict(self.wins_by_type[wrestler_id]),
+            'money_bet': self.money_bet[wrestler_id],
+            'money_paid': self.money_paid[wrestler_id]
+        }
+
+    def get_head_to_head(self, first, second):
+        """Get {name: wins over the other} for two wrestlers."""
+        first_id = self.ids.get(canonical_name(first))
+        second_id = self.ids.get(canonical_name(second))
+        if first_id is None or second_id is None:
+            return {first: 0, second: 0}
+        return {
+            self.names[first_id]: self.head_to_head.get((first_id, second_id), 0),
+            self.names[second_id]: self.head_to_head.get((second_id, first_id), 0)
+        }
+
+    def top(self, column='wins', limit=10):
+        """Get stats for the wrestlers with the highest values in a column."""
+        values = getattr(self, column)
+        best = sorted(range(len(values)), key=lambda i: (-values[i], self.names[i]))
+        return [self.get_stats(self.names[i]) for i in best[:limit]]
@@ -0,0 +1,43 @@
+"""Tests for placing bets on a match's bet book."""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from SaltyBet import MAX_BET, BetBook, SaltyBet
+
+
+class PlaceBetTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.game = SaltyBet(str(Path(directory) / "users.json"),
+                             history=False, verbose=False)
+        self.addCleanup(self.game.close)
+        self.game.add_user("Hulk")
+        self.match = self.game.open_match("One on One", ["Andre", "Hogan"])
+
+    def test_invalid_amounts_are_rejected_without_charging(self):
+        for amount in (10.5, True, "5", None, MAX_BET + 1, 0, -3):
+            success, _ = self.game.place_bet("Hulk", "Hogan", amount, self.match.id)
+            self.assertFalse(success, amount)
+        self.assertEqual(self.game.users["Hulk"].wrestlebucks, 1000)
+        self.assertEqual(len(self.match.bets), 0)
+
+        self.assertTrue(self.game.place_bet("Hulk", "Hogan", 10, self.match.id)[0])
+        self.assertEqual(dict(self.match.bets),
+                         {"Hulk": {"wrestler": "Hogan", "amount": 10}})
+
+    def test_rejected_amount_leaves_book_in_step(self):
+        book = BetBook(["Andre", "Hogan"])
+        with self.assertRaises(OverflowError):
+            book.add("Hulk", 1, 2**64)
+        book.add("Andre", 0, 5)
+        self.assertEqual(dict(book), {"Andre": {"wrestler": "Andre", "amount": 5}})
+        self.assertEqual(book.total_pool, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
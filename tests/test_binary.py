@@ -0,0 +1,110 @@
+"""Tests for the binary user file format and the binary storage backend."""
+
+import json
+import shutil
+import tempfile
+import unittest
+from array import array
+from pathlib import Path
+
+from SaltyBet import SaltyBet
+from SaltyBetBinary import (FORMAT_VERSION, HEADER, decode_user_file,
+                            encode_user_file, read_user_file, write_user_file)
+
+
+def columns(names, wrestlebucks, wins, losses):
+    return names, array('q', wrestlebucks), array('q', wins), array('q', losses)
+
+
+class UserFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_round_trip(self):
+        users = columns(["Hulk", "André", "Macho Man", ""],
+                        [1000, -5, 2**62, 0], [3, 0, 7, 1], [0, 9, 2, 40000])
+        path = self.directory / "users.sbu"
+        write_user_file(path, *users)
+        decoded = read_user_file(path)
+        self.assertEqual(decoded, users)
+        # Columns are widened back to 64 bits so values can grow
+        for column in decoded[1:]:
+            self.assertEqual(column.itemsize, 8)
+
+        self.assertEqual(decode_user_file(encode_user_file(*columns([], [], [], []))),
+                         ([], array('q'), array('q'), array('q')))
+
+    def test_columns_are_stored_narrow(self):
+        cases = [([0, 127, -128], 1), ([128, -1], 2), ([-32769], 4),
+                 ([2**31 - 1, -2**31], 4), ([2**31], 8), ([-2**63], 8)]
+        for values, width in cases:
+            with self.subTest(values=values):
+                names = [f"user{i}" for i in range(len(values))]
+                data = encode_user_file(*columns(names, values, [0] * len(values),
+                                                 [0] * len(values)))
+                self.assertEqual(HEADER.unpack_from(data)[6:], (width, 1, 1))
+                # Name table and columns are padded to 8 bytes each
+                names_size = len('\0'.join(names).encode('utf-8'))
+                expected = (HEADER.size + (names_size + 7) // 8 * 8 +
+                            (width * len(values) + 7) // 8 * 8 +
+                            2 * ((len(values) + 7) // 8 * 8))
+                self.assertEqual(len(data), expected)
+                self.assertEqual(decode_user_file(data)[1].tolist(), values)
+
+        with self.assertRaises(ValueError):
+            encode_user_file(["Hulk"], [2**63], [0], [0])
+
+    def test_damaged_files_are_rejected(self):
+        data = encode_user_file(*columns(["Hulk", "Andre"], [1000, 20], [1, 2], [3, 4]))
+
+        corrupted = bytearray(data)
+        corrupted[-1] ^= 0xFF
+        with self.assertRaisesRegex(ValueError, "checksum"):
+            decode_user_file(bytes(corrupted))
+
+        fields = list(HEADER.unpack_from(data))
+        fields[1] = FORMAT_VERSION + 1
+        newer = HEADER.pack(*fields) + data[HEADER.size:]
+        with self.assertRaisesRegex(ValueError, "Unsupported user file version"):
+            decode_user_file(newer)
+
+        fields = list(HEADER.unpack_from(data))
+        fields[0] = b'JUNK'
+        with self.assertRaisesRegex(ValueError, "Not a Salty Bet user file"):
+            decode_user_file(HEADER.pack(*fields) + data[HEADER.size:])
+
+        fields = list(HEADER.unpack_from(data))
+        fields[6] = 3
+        with self.assertRaisesRegex(ValueError, "invalid column width"):
+            decode_user_file(HEADER.pack(*fields) + data[HEADER.size:])
+
+        for damaged in (data[:HEADER.size - 1], data[:-8], data + bytes(8)):
+            with self.assertRaisesRegex(ValueError, "truncated"):
+                decode_user_file(damaged)
+
+    def test_json_is_imported_on_first_load(self):
+        json_file = self.directory / "users.json"
+        json_file.write_text(json.dumps({
+            "Hulk": {"name": "Hulk", "wrestlebucks": 700, "wins": 1, "losses": 2},
+            "Andre": {"name": "Andre", "wrestlebucks": 2**40, "wins": 0, "losses": 0},
+        }))
+        game = SaltyBet(str(json_file), storage='binary', verbose=False)
+        self.assertEqual(game.users["Hulk"].losses, 2)
+        self.assertEqual(game.users["Andre"].wrestlebucks, 2**40)
+        game.users["Hulk"].place_bet(200)
+        game.save_users_to_file()
+        game.close()
+        self.assertTrue((self.directory / "users.sbu").exists())
+
+        # Later loads read the binary file and leave the JSON file alone
+        json_file.write_text(json.dumps({}))
+        game = SaltyBet(str(json_file), storage='binary', verbose=False)
+        self.addCleanup(game.close)
+        self.assertEqual(sorted(game.users), ["Andre", "Hulk"])
+        self.assertEqual(game.users["Hulk"].wrestlebucks, 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+"""Stress tests for thread-safe betting and settlement.
+
+Run from the repository root with `python -m unittest discover tests` (or
+`python -m pytest tests`).
+"""
+
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from SaltyBet import PAYOUT_PARIMUTUEL, SaltyBet, User
+
+THREADS = 16
+STARTING_WRESTLEBUCKS = 1000
+
+
+def run_threads(target, count=THREADS):
+    """Run target(thread_number) on `count` threads that start together."""
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def worker(number):
+        try:
+            barrier.wait()
+            target(number)
+        except Exception as e:  # Surfaced in the test thread below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(number, ))
+               for number in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+class ConcurrentBettingTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Switch threads as often as possible so check-and-debit races show up
+        cls.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    @classmethod
+    def tearDownClass(cls):
+        sys.setswitchinterval(cls.switch_interval)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def new_game(self):
+        game = SaltyBet(str(Path(self.directory) / "users.json"),
+                        history=False, verbose=False)
+        self.addCleanup(game.close)
+        return game
+
+    def test_user_bets_never_overdraw(self):
+        user = User("Hulk")
+        lowest = [user.wrestlebucks]
+
+        def observe(changed, op, amount):
+            lowest[0] = min(lowest[0], changed.wrestlebucks)
+
+        user.observer = observe
+        spent = [0] * THREADS
+
+        def bet(number):
+            # Large bets against a small balance, each handed back after a
+            # moment so the account never runs dry
+            rng = random.Random(number)
+            for _ in range(5000):
+                amount = rng.randint(100, 600)
+                if user.place_bet(amount)[0]:
+                    spent[number] += amount
+                    user.refund_bet(amount)
+                    spent[number] -= amount
+
+        run_threads(bet)
+        self.assertGreaterEqual(lowest[0], 0)
+        self.assertGreaterEqual(user.wrestlebucks, 0)
+        self.assertEqual(user.wrestlebucks + sum(spent), STARTING_WRESTLEBUCKS)
+
+    def test_one_user_betting_on_many_matches(self):
+        game = self.new_game()
+        game.add_user("Hulk")
+        matches = [game.open_match("One on One", ["Andre", "Hogan"])
+                   for _ in range(200)]
+        accepted = [0] * THREADS
+
+        def bet(number):
+            # Every thread tries every match, in its own order
+            order = list(matches)
+            random.Random(number).shuffle(order)
+            for match in order:
+                if game.place_bet("Hulk", "Hogan", 10, match.id)[0]:
+                    accepted[number] += 1
+
+        run_threads(bet)
+        user = game.users["Hulk"]
+        pools = sum(match.bets.total_pool for match in matches)
+        self.assertEqual(user.wrestlebucks, 0)
+        self.assertEqual(sum(accepted), STARTING_WRESTLEBUCKS // 10)
+        self.assertEqual(user.wrestlebucks + pools, STARTING_WRESTLEBUCKS)
+        self.assertTrue(all(len(match.bets) <= 1 for match in matches))
+
+    def test_settlement_while_betting_conserves_money(self):
+        game = self.new_game()
+        names = [f"user{i}" for i in range(64)]
+        game.add_users(names)
+        settling = game.open_match("One on One", ["Andre", "Hogan"],
+                                   PAYOUT_PARIMUTUEL)
+        for i, name in enumerate(names):
+            game.place_bet(name, "Hogan" if i % 3 else "Andre", 10, settling.id)
+        betting = game.open_match("One on One", ["Andre", "Hogan"],
+                                  PAYOUT_PARIMUTUEL)
+
+        def work(number):
+            if number == 0:
+                game.resolve_match("Andre", settling.id)
+                return
+            for name in names[number - 1::THREADS - 1]:
+                self.assertTrue(game.place_bet(name, "Hogan", 10, betting.id)[0])
+
+        run_threads(work)
+        balances = sum(game.users[name].wrestlebucks for name in names)
+        self.assertEqual(len(betting.bets), len(names))
+        self.assertEqual(balances + betting.bets.total_pool,
+                         STARTING_WRESTLEBUCKS * len(names))
+        self.assertTrue(all(game.users[name].wrestlebucks >= 0 for name in names))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+"""Tests for the leaderboard index and the user pages it serves."""
+
+import random
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from SaltyBet import USER_COLUMNS, SaltyBet, User
+from SaltyBetLeaderboard import BOARDS, Leaderboard, SortedKeyList
+
+
+class SmallBuckets(SortedKeyList):
+    """Tiny buckets, so a few hundred keys split and empty buckets often."""
+
+    BUCKET_SIZE = 4
+
+
+class SortedKeyListTest(unittest.TestCase):
+
+    def check(self, keys, expected, rng):
+        self.assertEqual(len(keys), len(expected))
+        self.assertEqual(list(keys), expected)
+        for key in rng.sample(expected, min(10, len(expected))):
+            self.assertIn(key, keys)
+            self.assertEqual(keys.index(key), expected.index(key))
+        self.assertNotIn(-1, keys)
+        start = rng.randint(0, len(expected) + 3)
+        stop = start + rng.randint(0, 30)
+        self.assertEqual(keys.slice(start, stop), expected[start:stop])
+        self.assertEqual(keys.head(7), expected[:7])
+        probe = rng.randint(0, 1000)
+        following = [key for key in expected if key >= probe]
+        self.assertEqual(keys.ceiling(probe), following[0] if following else None)
+        self.assertEqual(list(keys.iter_from(probe)), following)
+
+    def test_matches_a_sorted_list(self):
+        rng = random.Random(3)
+        expected = sorted(rng.sample(range(1000), 50))
+        keys = SmallBuckets(expected)
+        bucket_counts = set()
+        for step in range(4000):
+            # Grow to a few hundred keys, then shrink back to nothing
+            grow = 0.8 if step < 1500 else 0.2
+            if expected and rng.random() > grow:
+                key = rng.choice(expected)
+                expected.remove(key)
+                keys.remove(key)
+            else:
+                key = rng.randint(0, 1000)
+                if key in expected:
+                    continue
+                expected.append(key)
+                expected.sort()
+                keys.add(key)
+            bucket_counts.add(len(keys._buckets))
+            if step % 25 == 0:
+                self.check(keys, expected, rng)
+        self.check(keys, expected, rng)
+        # Buckets were split and emptied along the way
+        self.assertGreater(max(bucket_counts), 50)
+        self.assertLess(min(bucket_counts), 5)
+
+
+class LeaderboardTest(unittest.TestCase):
+
+    MIN_GAMES = 3
+
+    def expected_board(self, users, board):
+        """Sort users onto a board the slow way."""
+        if board == 'wrestlebucks':
+            keys = [(-user.wrestlebucks, name) for name, user in users.items()]
+        elif board == 'wins':
+            keys = [(-user.wins, name) for name, user in users.items()]
+        else:
+            keys = [(-user.wins / (user.wins + user.losses),
+                     -(user.wins + user.losses), name)
+                    for name, user in users.items()
+                    if user.wins + user.losses >= self.MIN_GAMES]
+        return [key[-1] for key in sorted(keys)]
+
+    # Small buckets so rank and page lookups go through many of them
+    @mock.patch.object(SortedKeyList, 'BUCKET_SIZE', 8)
+    def test_matches_sorted_users(self):
+        rng = random.Random(9)
+        users = {}
+        for number in range(300):
+            users[f"user{number}"] = User(f"user{number}")
+        leaderboard = Leaderboard(users, self.MIN_GAMES)
+        next_user = 300
+
+        for step in range(400):
+            action = rng.random()
+            if action < 0.05:
+                # A big batch sorts everything again on the next query
+                names = rng.sample(sorted(users), len(users) // 2)
+                for name in names:
+                    users[name].wrestlebucks = rng.randint(0, 3000)
+                leaderboard.mark_many(names)
+            elif action < 0.1:
+                name = rng.choice(sorted(users))
+                del users[name]
+                leaderboard.mark(name)
+            elif action < 0.15:
+                name = f"user{next_user}"
+                next_user += 1
+                users[name] = User(name)
+                leaderboard.mark(name)
+            else:
+                names = rng.sample(sorted(users), rng.randint(1, 5))
+                for name in names:
+                    user = users[name]
+                    user.wrestlebucks = rng.randint(0, 3000)
+                    if rng.random() < 0.5:
+                        user.wins += 1
+                    else:
+                        user.losses += 1
+                leaderboard.mark_many(names)
+
+            if step % 10 == 0:
+                for board in BOARDS:
+                    expected = self.expected_board(users, board)
+                    self.assertEqual(leaderboard.size(board), len(expected))
+                    self.assertEqual(leaderboard.top(board, 10), expected[:10])
+                    offset = rng.randint(0, len(expected))
+                    self.assertEqual(leaderboard.page(board, offset, 25),
+                                     expected[offset:offset + 25])
+                    for name in rng.sample(sorted(users), 10):
+                        rank = (expected.index(name) + 1 if name in expected
+                                else None)
+                        self.assertEqual(leaderboard.rank(board, name), rank)
+
+
+def sorted_names(game, column, descending):
+    """Sort every user by a column the slow way, ties broken by name."""
+    if column == 'name':
+        return sorted(game.users, reverse=descending)
+
+    def value(user):
+        if column == 'win_rate':
+            games = user.wins + user.losses
+            return user.wins / games if games else 0.0
+        return getattr(user, column)
+
+    sign = -1 if descending else 1
+    return [user.name for user in sorted(game.users.values(),
+                                         key=lambda user: (sign * value(user), user.name))]
+
+
+class UserPageTest(unittest.TestCase):
+
+    def check_pages(self, columnar):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        game = SaltyBet(str(Path(directory) / "users.json"), columnar=columnar,
+                        history=False, verbose=False)
+        self.addCleanup(game.close)
+        game.add_users([f"user{i}" for i in range(200)])
+        rng = random.Random(5)
+
+        for round_number in range(15):
+            for column in USER_COLUMNS:
+                for descending in (False, True):
+                    total, page = game.get_users_page(column, 0, 1000, descending)
+                    self.assertEqual(total, len(game.users))
+                    self.assertEqual([stats['name'] for stats in page],
+                                     sorted_names(game, column, descending),
+                                     (column, descending))
+            match = game.open_match("One on One", ["Andre", "Hogan"])
+            # Small matches move users one at a time, big ones rebuild the index
+            for number in rng.sample(range(200), rng.choice((5, 120))):
+                game.place_bet(f"user{number}", rng.choice(("Andre", "Hogan")),
+                               rng.randint(1, 50), match.id)
+            game.resolve_match(rng.choice(("Andre", "Hogan")), match.id)
+            if round_number % 5 == 0:
+                game.add_user(f"late{round_number}")
+
+    def test_pages_follow_changes(self):
+        self.check_pages(columnar=False)
+
+    def test_columnar_pages_follow_changes(self):
+        self.check_pages(columnar=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""Tests that ledger storage replays to the same users after a restart."""
+
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from SaltyBet import PAYOUT_PARIMUTUEL, SaltyBet
+
+
+class LedgerReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.data_file = str(Path(self.directory) / "users.json")
+
+    def open_game(self):
+        return SaltyBet(self.data_file, storage='ledger', history=False,
+                        verbose=False)
+
+    def play(self, game, rng, matches=5):
+        """Bet every user on a few matches, settling each one."""
+        names = list(game.users)
+        for number in range(matches):
+            mode = PAYOUT_PARIMUTUEL if number % 2 else 'fixed'
+            match = game.open_match("Triple Threat", ["Andre", "Hogan", "Flair"], mode)
+            for name in names:
+                wrestler = rng.choice(match.wrestlers)
+                game.place_bet(name, wrestler, rng.randint(1, 300), match.id)
+            game.resolve_match(rng.choice(match.wrestlers), match.id)
+
+    @staticmethod
+    def stats(game):
+        return {name: user.get_stats() for name, user in game.users.items()}
+
+    def reopened_stats(self):
+        game = self.open_game()
+        try:
+            return self.stats(game)
+        finally:
+            game.close()
+
+    def test_replay_restores_users(self):
+        game = self.open_game()
+        game.add_users([f"user{i}" for i in range(40)])
+        self.play(game, random.Random(1))
+        expected = self.stats(game)
+        game.close()
+        self.assertEqual(self.reopened_stats(), expected)
+
+    def test_replay_after_compaction(self):
+        game = self.open_game()
+        game.add_users([f"user{i}" for i in range(40)])
+        rng = random.Random(2)
+        self.play(game, rng)
+        game.compact_storage(wait=True)
+        # Changes after the snapshot are replayed on top of it
+        game.add_user("latecomer")
+        self.play(game, rng)
+        expected = self.stats(game)
+        game.close()
+        self.assertTrue(Path(self.data_file).with_suffix('.snapshot').exists())
+        self.assertEqual(self.reopened_stats(), expected)
+
+    def test_torn_last_record_is_ignored(self):
+        game = self.open_game()
+        game.add_users([f"user{i}" for i in range(10)])
+        self.play(game, random.Random(3), matches=2)
+        expected = self.stats(game)
+        game.close()
+        # A crash in the middle of an append leaves half a record behind
+        with open(Path(self.data_file).with_suffix('.ledger'), 'a') as f:
+            f.write('["bet","us')
+        self.assertEqual(self.reopened_stats(), expected)
+
+    def test_changes_made_during_compaction_are_kept(self):
+        game = self.open_game()
+        names = [f"user{i}" for i in range(8)]
+        game.add_users(names)
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, switch_interval)
+        done = threading.Event()
+
+        def change(number):
+            user = game.users[names[number]]
+            rng = random.Random(number)
+            while not done.is_set():
+                amount = rng.randint(1, 50)
+                if user.place_bet(amount)[0] and rng.random() < 0.6:
+                    user.refund_bet(amount)
+
+        threads = [threading.Thread(target=change, args=(number, ))
+                   for number in range(len(names))]
+        for thread in threads:
+            thread.start()
+        for _ in range(20):
+            game.compact_storage(wait=True)
+        done.set()
+        for thread in threads:
+            thread.join()
+
+        game.save_users_to_file()
+        expected = self.stats(game)
+        game.close()
+        self.assertEqual(self.reopened_stats(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
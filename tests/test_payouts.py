@@ -0,0 +1,99 @@
+"""Tests for splitting a parimutuel pool among the winning bets."""
+
+import random
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from SaltyBet import PAYOUT_PARIMUTUEL, SaltyBet, np, parimutuel_payouts
+from SaltyBetShards import ShardedSaltyBet
+
+
+class ParimutuelPayoutTest(unittest.TestCase):
+
+    def check_split(self, amounts, won, total_pool):
+        """Split a pool both ways and check it is exact and fair."""
+        payouts = parimutuel_payouts(amounts, won, total_pool)
+        self.assertEqual(sum(payouts), total_pool)
+        winning_pool = sum(amount for amount, did_win in zip(amounts, won) if did_win)
+        for amount, did_win, payout in zip(amounts, won, payouts):
+            if did_win:
+                share = amount * total_pool // winning_pool
+                self.assertIn(payout, (share, share + 1))
+            else:
+                self.assertEqual(payout, 0)
+        if np is not None:
+            array_payouts = parimutuel_payouts(np.array(amounts, dtype=np.int64),
+                                               np.array(won), total_pool)
+            self.assertIsInstance(array_payouts, np.ndarray)
+            self.assertEqual(array_payouts.tolist(), payouts)
+        return payouts
+
+    def test_payouts_add_up_to_the_pool(self):
+        rng = random.Random(11)
+        for _ in range(500):
+            count = rng.randint(1, 40)
+            amounts = [rng.randint(1, rng.choice((3, 100, 10**6))) for _ in range(count)]
+            won = [rng.random() < 0.4 for _ in range(count)]
+            won[rng.randrange(count)] = True
+            self.check_split(amounts, won, sum(amounts))
+
+    def test_ties_go_to_the_earliest_bet(self):
+        self.assertEqual(self.check_split([1, 1, 1], [True] * 3, 5), [2, 2, 1])
+        # Remainders 2, 1, 1, 2 out of 6: only the first of the two largest gets one
+        self.assertEqual(self.check_split([2, 1, 1, 2], [True] * 4, 7), [3, 1, 1, 2])
+        self.assertEqual(self.check_split([5, 3, 3, 3], [False, True, True, True], 14),
+                         [0, 5, 5, 4])
+
+    def test_pools_too_big_for_64_bits(self):
+        amounts = [2**62, 3, 2**62 - 1, 7]
+        won = [True, True, False, True]
+        self.check_split(amounts, won, sum(amounts))
+
+    def test_nobody_backed_the_winner(self):
+        with self.assertRaises(ValueError):
+            parimutuel_payouts([5, 6], [False, False], 11)
+
+
+class ShardedLeftoverTest(unittest.TestCase):
+
+    def test_sharded_leftovers_match_one_process(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        names = [f"user{i}" for i in range(301)]
+        single = SaltyBet(str(directory / "single.json"), history=False, verbose=False)
+        self.addCleanup(single.close)
+        sharded = ShardedSaltyBet(str(directory / "sharded.json"), shards=3)
+        self.addCleanup(sharded.close)
+        single.add_users(names)
+        sharded.add_users(names)
+
+        # Every winning bet is 1 WrestleBuck, so all their remainders tie and
+        # the few leftover WrestleBucks must go to the earliest bets across
+        # every shard, not to each shard's earliest
+        wrestlers = ["Andre", "Hogan", "Flair"]
+        bets = [(name, wrestlers[i % 3], 1 if i % 3 == 1 else 2 + i % 2)
+                for i, name in enumerate(names)]
+        total_pool = sum(amount for _, _, amount in bets)
+        winners = sum(1 for _, pick, _ in bets if pick == "Hogan")
+        leftover = total_pool % winners
+        self.assertTrue(0 < leftover < winners // 6)
+
+        for game in (single, sharded):
+            match = game.open_match("Triple Threat", wrestlers, PAYOUT_PARIMUTUEL)
+            game.place_bets(bets, match.id)
+        result = sharded.resolve_match("Hogan")
+        expected = single.resolve_match("Hogan")
+        self.assertEqual(result['total_paid'], expected.total_paid)
+        self.assertEqual(result['total_paid'], total_pool)
+        for name in names:
+            self.assertEqual(sharded.get_user(name), single.users[name].get_stats())
+        share = total_pool // winners
+        paid = [single.users[name].wrestlebucks - 1000 + 1
+                for name, pick, _ in bets if pick == "Hogan"]
+        self.assertEqual(paid, [share + 1] * leftover + [share] * (winners - leftover))
+
+
+if __name__ == '__main__':
+    unittest.main()
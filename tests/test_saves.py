@@ -0,0 +1,71 @@
+"""Tests for group-committed background saves and durability modes."""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from SaltyBet import SaltyBet
+from SaltyBetPersistence import FAST
+
+THREADS = 16
+
+
+class GroupCommitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.data_file = str(Path(self.directory) / "users.json")
+
+    def test_concurrent_settlements_share_saves(self):
+        game = SaltyBet(self.data_file, history=False, verbose=False)
+        names = [f"user{i}" for i in range(THREADS)]
+        game.add_users(names)
+        matches = []
+        for name in names:
+            match = game.open_match("One on One", ["Andre", "Hogan"])
+            game.place_bet(name, "Hogan", 100, match.id)
+            matches.append(match)
+        game.start_background_saves(window=0.2, wait=True)
+
+        barrier = threading.Barrier(THREADS)
+        saved = [None] * THREADS
+
+        def settle(number):
+            barrier.wait()
+            saved[number] = game.resolve_match("Hogan", matches[number].id).saved
+
+        threads = [threading.Thread(target=settle, args=(number, ))
+                   for number in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Every settlement waited for a successful save, but they shared a few
+        self.assertEqual(saved, [True] * THREADS)
+        self.assertLess(game.saver.saves, THREADS // 2)
+        expected = {name: game.users[name].get_stats() for name in names}
+        game.close()
+
+        reopened = SaltyBet(self.data_file, history=False, verbose=False)
+        self.addCleanup(reopened.close)
+        self.assertEqual({name: reopened.users[name].get_stats() for name in names},
+                         expected)
+
+    def test_fast_saves_skip_fsync(self):
+        game = SaltyBet(self.data_file, history=False, verbose=False,
+                        durability=FAST)
+        self.addCleanup(game.close)
+        with mock.patch.object(os, 'fsync') as fsync:
+            game.add_user("Hulk")
+        self.assertTrue(Path(self.data_file).exists())
+        fsync.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Tests for the HTTP/JSON server, driven by SaltyBetClient over a local socket."""
+
+import asyncio
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from SaltyBet import SaltyBet
+from SaltyBetServer import SaltyBetClient, SaltyBetServer
+
+
+class ServerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.data_file = str(Path(directory) / "users.json")
+        self.game = SaltyBet(self.data_file, history=False, verbose=False)
+        self.server = SaltyBetServer(self.game, port=0)
+        await self.server.start()
+        self.client = SaltyBetClient(port=self.server.port)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.close()
+        self.game.close()
+
+    async def test_betting_round_trip(self):
+        request = self.client.request
+        self.assertEqual((await request('POST', '/users', {'name': 'Hulk'}))[0], 201)
+        self.assertEqual((await request('POST', '/users', {'name': 'Hulk'}))[0], 409)
+        status, match = await request('POST', '/matches', {
+            'type': 'One on One', 'wrestlers': ['Andre', 'Hogan']})
+        self.assertEqual(status, 201)
+
+        bets = f"/matches/{match['id']}/bets"
+        status, _ = await request('POST', bets, {'user': 'Hulk', 'wrestler': 'Hogan',
+                                                 'amount': 2000})
+        self.assertEqual(status, 400)
+        status, _ = await request('POST', bets, {'user': 'Hulk', 'wrestler': 'Hogan',
+                                                 'amount': 400})
+        self.assertEqual(status, 200)
+        status, odds = await request('GET', f"/matches/{match['id']}/odds")
+        self.assertEqual(odds['pool'], 400)
+
+        status, _ = await request('POST', f"/matches/{match['id']}/resolve",
+                                  {'winner': 'Hogan'})
+        self.assertEqual(status, 200)
+        status, user = await request('GET', '/users/Hulk')
+        self.assertEqual(user['wrestlebucks'], 1400)
+
+        # Acknowledged changes are already saved
+        reloaded = SaltyBet(self.data_file, history=False, verbose=False)
+        self.addCleanup(reloaded.close)
+        self.assertEqual(reloaded.users['Hulk'].wrestlebucks, 1400)
+
+    async def test_concurrent_bets_never_overdraw(self):
+        await self.client.request('POST', '/users', {'name': 'Hulk'})
+        matches = []
+        for _ in range(20):
+            _, match = await self.client.request('POST', '/matches', {
+                'type': 'One on One', 'wrestlers': ['Andre', 'Hogan']})
+            matches.append(match['id'])
+        clients = [SaltyBetClient(port=self.server.port) for _ in matches]
+        try:
+            replies = await asyncio.gather(*(
+                client.request('POST', f"/matches/{match_id}/bets",
+                               {'user': 'Hulk', 'wrestler': 'Hogan', 'amount': 300})
+                for client, match_id in zip(clients, matches)))
+        finally:
+            for client in clients:
+                await client.close()
+        self.assertEqual(sum(status == 200 for status, _ in replies), 3)
+        self.assertEqual(self.game.users['Hulk'].wrestlebucks, 100)
+
+    async def test_bad_requests_get_an_answer(self):
+        request = self.client.request
+        await request('POST', '/users', {'name': 'Hulk'})
+        _, match = await request('POST', '/matches', {
+            'type': 'One on One', 'wrestlers': ['Andre', 'Hogan']})
+        for path, payload in (
+                ('/matches', {'type': ['x'], 'wrestlers': ['Andre', 'Hogan']}),
+                ('/matches', {'type': 'One on One', 'wrestlers': [1, 2]}),
+                (f"/matches/{match['id']}/resolve", {'winner': ['Hogan']}),
+                (f"/matches/{match['id']}/bets",
+                 {'user': 'Hulk', 'wrestler': 'Hogan', 'amount': 10.5})):
+            status, reply = await request('POST', path, payload)
+            self.assertEqual(status, 400, path)
+            self.assertIn('error', reply)
+        self.assertEqual((await request('GET', '/nowhere'))[0], 404)
+
+    async def test_negative_content_length_is_rejected(self):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.server.port)
+        writer.write(b"POST /users HTTP/1.1\r\nContent-Length: -5\r\n\r\n")
+        await writer.drain()
+        status_line = await reader.readline()
+        writer.close()
+        await writer.wait_closed()
+        self.assertEqual(status_line.split()[1], b'400')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""Tests for sharded settlement across worker processes."""
+
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from SaltyBet import PAYOUT_PARIMUTUEL, SaltyBet
+from SaltyBetShards import ShardedSaltyBet
+
+SHARDS = 3
+FAILING_SHARD = 1
+
+
+@unittest.skipUnless(multiprocessing.get_start_method() == 'fork',
+                     "the failure is injected into forked shard workers")
+class ShardRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.flag = self.directory / "fail"
+
+    def sharded_game(self):
+        """Start shard workers whose settlement fails while the flag file exists."""
+        flag = self.flag
+        resolve_match = SaltyBet.resolve_match
+
+        def failing_resolve(game, *args, **kwargs):
+            if flag.exists() and f"shard{FAILING_SHARD}of" in str(game.storage.path):
+                raise OSError("injected failure")
+            return resolve_match(game, *args, **kwargs)
+
+        with mock.patch.object(SaltyBet, 'resolve_match', failing_resolve):
+            game = ShardedSaltyBet(str(self.directory / "sharded.json"),
+                                   shards=SHARDS)
+        self.addCleanup(game.close)
+        return game
+
+    def test_retry_after_partial_settlement_pays_the_pool_once(self):
+        names = [f"user{i}" for i in range(300)]
+        single = SaltyBet(str(self.directory / "single.json"), history=False,
+                          verbose=False)
+        self.addCleanup(single.close)
+        sharded = self.sharded_game()
+        single.add_users(names)
+        sharded.add_users(names)
+
+        rng = random.Random(7)
+        wrestlers = ["Andre", "Hogan", "Flair"]
+        bets = [(name, rng.choice(wrestlers), rng.randint(1, 97)) for name in names]
+        for game in (single, sharded):
+            match = game.open_match("Triple Threat", wrestlers, PAYOUT_PARIMUTUEL)
+            game.place_bets(bets, match.id)
+
+        self.flag.touch()
+        with self.assertRaises(RuntimeError):
+            sharded.resolve_match("Hogan")
+        # The match is locked while some shards have not settled
+        self.assertFalse(sharded.place_bet(names[0], "Hogan", 1)[0])
+        with self.assertRaises(ValueError):
+            sharded.resolve_match("Andre")
+
+        os.remove(self.flag)
+        result = sharded.resolve_match("Hogan")
+        expected = single.resolve_match("Hogan")
+        self.assertEqual(result['total_paid'], expected.total_paid)
+        self.assertEqual(result['total_paid'], sum(amount for _, _, amount in bets))
+        for name in names:
+            self.assertEqual(sharded.get_user(name), single.users[name].get_stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""Tests for several SaltyBet instances sharing one ledger."""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from SaltyBet import SaltyBet
+
+
+class SharedLedgerTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.data_file = str(Path(directory) / "users.json")
+
+    def open_game(self):
+        game = SaltyBet(self.data_file, storage='ledger', shared=True,
+                        history=False, verbose=False)
+        self.addCleanup(game.close)
+        return game
+
+    def test_two_instances_cannot_spend_the_same_wrestlebucks(self):
+        first = self.open_game()
+        first.add_user("Hulk")
+        second = self.open_game()
+        second.sync()
+
+        first_match = first.open_match("One on One", ["Andre", "Hogan"])
+        second_match = second.open_match("One on One", ["Andre", "Hogan"])
+        self.assertTrue(first.place_bet("Hulk", "Hogan", 1000, first_match.id)[0])
+        # The second instance still has the old balance in memory, but the
+        # bet is checked against what the first one saved
+        success, message = second.place_bet("Hulk", "Hogan", 1000, second_match.id)
+        self.assertFalse(success)
+        self.assertEqual(message, "Insufficient WrestleBucks!")
+        self.assertEqual(second.users["Hulk"].wrestlebucks, 0)
+
+        first.resolve_match("Hogan", first_match.id)
+        second.sync()
+        self.assertEqual(second.users["Hulk"].wrestlebucks, 2000)
+        self.assertTrue(second.place_bet("Hulk", "Andre", 500, second_match.id)[0])
+        second.resolve_match("Hogan", second_match.id)
+        first.sync()
+
+        reloaded = self.open_game()
+        for game in (first, second, reloaded):
+            self.assertEqual(game.users["Hulk"].get_stats()["wrestlebucks"], 1500)
+
+
+if __name__ == '__main__':
+    unittest.main()
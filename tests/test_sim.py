@@ -0,0 +1,43 @@
+"""Tests for the Monte Carlo simulator."""
+
+import unittest
+
+from SaltyBet import PAYOUT_PARIMUTUEL, parimutuel_payouts
+
+try:
+    import numpy as np
+    from SaltyBetSim import _pool_payouts, run_simulation
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "the simulator needs NumPy")
+class SimulatorTest(unittest.TestCase):
+
+    def test_pool_payouts_match_parimutuel_payouts(self):
+        rng = np.random.default_rng(7)
+        for _ in range(200):
+            worlds, bettors = rng.integers(1, 12, size=2)
+            amounts = rng.integers(1, 50, size=(worlds, bettors)).astype(np.int64)
+            won = rng.random((worlds, bettors)) < 0.4
+            expected = amounts.copy()
+            for world in np.nonzero(won.any(axis=1))[0]:
+                expected[world] = parimutuel_payouts(amounts[world], won[world],
+                                                     int(amounts[world].sum()))
+            np.testing.assert_array_equal(_pool_payouts(amounts, won), expected)
+
+    def test_pool_payouts_too_big_for_int64(self):
+        amounts = np.full((2, 3), 2**40, dtype=np.int64)
+        won = np.array([[True, False, False], [False, True, True]])
+        payouts = _pool_payouts(amounts, won)
+        self.assertEqual(payouts.sum(axis=1).tolist(), amounts.sum(axis=1).tolist())
+        self.assertEqual(payouts[0].tolist(), [3 * 2**40, 0, 0])
+
+    def test_rejects_empty_simulations(self):
+        for counts in ((0, 10, 10), (10, 0, 10), (10, 10, 0)):
+            with self.assertRaises(ValueError):
+                run_simulation(*counts, payout_mode=PAYOUT_PARIMUTUEL)
+
+
+if __name__ == '__main__':
+    unittest.main()
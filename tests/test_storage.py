@@ -0,0 +1,106 @@
+"""Tests shared by every storage backend."""
+
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from SaltyBet import SaltyBet
+
+BACKENDS = ('json', 'ledger', 'sqlite', 'binary')
+
+
+class StorageBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_data_file_in_a_new_directory(self):
+        for kind in BACKENDS:
+            with self.subTest(kind):
+                data_file = str(self.directory / kind / "new" / "users.json")
+                game = SaltyBet(data_file, storage=kind, verbose=False)
+                game.add_user("Hulk")
+                game.users["Hulk"].place_bet(250)
+                game.save_users_to_file()
+                game.close()
+
+                game = SaltyBet(data_file, storage=kind, verbose=False)
+                self.assertEqual(game.users["Hulk"].wrestlebucks, 750)
+                self.assertIsNotNone(game.history)
+                game.close()
+
+    def test_quiet_games_print_nothing(self):
+        users = {"Hulk": {"name": "Hulk", "wrestlebucks": 700, "wins": 1, "losses": 2}}
+        for kind in BACKENDS:
+            with self.subTest(kind):
+                data_file = self.directory / kind / "users.json"
+                data_file.parent.mkdir()
+                # The SQLite and binary backends import an existing JSON file
+                data_file.write_text(json.dumps(users))
+                output = io.StringIO()
+                with redirect_stdout(output):
+                    game = SaltyBet(str(data_file), storage=kind, verbose=False)
+                    game.add_user("Andre")
+                    game.compact_storage(wait=True)
+                    game.close()
+                    game = SaltyBet(str(data_file), storage=kind, verbose=False)
+                    self.assertEqual(game.users["Hulk"].wrestlebucks, 700)
+                    game.close()
+                self.assertEqual(output.getvalue(), "")
+
+
+class UserCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.data_file = str(Path(directory) / "users.db")
+
+    def test_bets_across_more_users_than_the_cache(self):
+        names = [f"user{i}" for i in range(20)]
+        game = SaltyBet(self.data_file, cache_size=5, history=False, verbose=False)
+        game.add_users(names)
+        held = game.users["user0"]
+        match = game.open_match("One on One", ["Andre", "Hogan"])
+        for number, name in enumerate(names):
+            success, _ = game.place_bet(name, ("Andre", "Hogan")[number % 2],
+                                        10 * (number + 1), match.id)
+            self.assertTrue(success)
+        # Evicted users were written back before leaving the cache
+        self.assertEqual(game.storage.get("user1")['wrestlebucks'], 980)
+        # Evicted while still held, so the same object comes back
+        self.assertIs(game.users["user0"], held)
+        game.resolve_match("Hogan", match.id)
+        balances = {name: game.users[name].wrestlebucks for name in names}
+        stats = game.users.cache_stats()
+        self.assertEqual(stats['cached'], 5)
+        self.assertEqual(stats['cache_size'], 5)
+        self.assertGreaterEqual(stats['evictions'], len(names))
+        self.assertGreater(stats['misses'], 0)
+        self.assertGreater(stats['hits'], 0)
+        game.close()
+
+        for number, name in enumerate(names):
+            if number % 2 == 0:
+                self.assertEqual(balances[name], 1000 - 10 * (number + 1))
+            else:
+                self.assertGreater(balances[name], 1000)
+
+        game = SaltyBet(self.data_file, cache_size=3, history=False, verbose=False)
+        self.addCleanup(game.close)
+        self.assertEqual({name: game.users[name].wrestlebucks for name in names},
+                         balances)
+        self.assertEqual(game.users.cache_stats(),
+                         {'hits': 0, 'misses': 20, 'evictions': 17, 'cached': 3,
+                          'cache_size': 3})
+        game.users["user19"]
+        self.assertEqual(game.users.cache_stats()['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()